@@ -0,0 +1,37 @@
+from inspect import signature
+
+
+# Canonicalizes analyzers across the strategies of a sweep, so each distinct (class, parameters, timeframe)
+# series is computed once and strategies hold references to the shared analyzer
+class AnalyzerRegistry:
+    def __init__(self):
+        # {
+        #    (window_size, class, ((param, value), ...)): analyzer
+        # }
+        self.analyzers = {}
+
+    def get(self, window_size, analyzer_class, *args, **kwargs):
+        # Bind against the constructor so that positional, keyword and default arguments give the same key
+        bound = signature(analyzer_class).bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (window_size, analyzer_class, tuple(bound.arguments.items()))
+
+        if key not in self.analyzers:
+            self.analyzers[key] = analyzer_class(*bound.args, **bound.kwargs)
+
+        return self.analyzers[key]
+
+    # {
+    #    window_size: [list analyzers]
+    # }
+    # Analyzers are listed in registration order, so shared inputs are updated before the analyzers using them
+    def get_sim_analyzers(self):
+        sim_analyzers = {}
+        for key, analyzer in self.analyzers.items():
+            window = key[0]
+            if window not in sim_analyzers:
+                sim_analyzers[window] = []
+
+            sim_analyzers[window].append(analyzer)
+
+        return sim_analyzers
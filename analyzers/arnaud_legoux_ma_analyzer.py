@@ -1,5 +1,6 @@
-from math import exp
 from analyzers.base_analyzer import BaseAnalyzer
+from analyzers.kernels import alma_weights
+from analyzers.series import window_dot
 
 
 # Arnaud Legoux Moving Average Analyzer
@@ -9,24 +10,20 @@ class ALMAAnalyzer(BaseAnalyzer):
         self.sigma = sigma
         self.offset = offset
         self.averages = []
+        self.weights = alma_weights(self.length, self.sigma, self.offset)
 
-    # See below for math
-    # https://www.prorealcode.com/prorealtime-indicators/alma-arnaud-legoux-moving-average/
     def update_values(self, period_aggregator):
+        if self.series is not None:
+            return self.replay_values(period_aggregator)
+
         if period_aggregator.num_periods() >= self.length:
             closes = period_aggregator.get_last_closes(self.length)
+            alma = closes.dot(self.weights)
 
-            m = (self.offset * (self.length - 1))
-            s = self.length / self.sigma
-
-            wtd_sum = 0
-            cum_wt = 0
-
-            for k in range(self.length):
-                wtd = exp(-((k - m) * (k - m)) / (2 * s * s))
-                wtd_sum += wtd * closes[-(self.length - k)]
-                cum_wt += wtd
+            self.averages.append(alma)
 
-            alma = wtd_sum / cum_wt
+    def periods_needed(self):
+        return self.length
 
-            self.averages.append(alma)
+    def compute_series(self, columns):
+        return window_dot(columns["close"], self.weights)
@@ -1,7 +1,58 @@
+from collections import deque
+from math import isnan
+import numpy as np
+
+
 class BaseAnalyzer:
+    # Precomputed values for every period of the day, set by load_series when running in batch mode
+    series = None
+    # The series as Python lists, replay_values reads these since indexing a list is cheaper than indexing an array
+    # and the strategies then compare floats rather than numpy scalars
+    replay_series = None
+    # False when compute_series only runs the update recursion over the day, replaying it would cost more than
+    # updating, so the batch period loop keeps updating these and only the GridEvaluator loads their series
+    vectorized = True
+    # Lists holding the analyzer's values, bounded by retain
+    history_fields = ("averages",)
+    # Number of values kept in each history list, None keeps everything
+    retention = None
+
+    # Number of trailing periods update_values reads from the aggregator
+    def periods_needed(self):
+        return self.length + 1
+
+    # Turns the history lists into ring buffers of the latest depth values, consumers call this with the longest
+    # lookback they read, e.g. 2 for averages[-2]. The retention only ever grows, so analyzers can be shared
+    # between consumers
+    def retain(self, depth):
+        self.retention = max(depth, self.min_retention(), self.retention or 0)
+        for field in self.history_fields:
+            setattr(self, field, deque(getattr(self, field), self.retention))
+
+    # Lookback the analyzer itself needs on its history
+    def min_retention(self):
+        return 1
+
     def update_values(self, period_aggregator):
         raise NotImplementedError
 
+    # Returns the analyzer's values for every period in the given {source: np.array} columns
+    def compute_series(self, columns):
+        raise NotImplementedError
+
+    def load_series(self, columns):
+        self.series = self.compute_series(columns)
+        if isinstance(self.series, dict):
+            self.replay_series = {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in self.series.items()}
+        else:
+            self.replay_series = self.series.tolist()
+
+    # Batch mode equivalent of update_values, appends the precomputed value for the latest period
+    def replay_values(self, period_aggregator):
+        value = self.replay_series[period_aggregator.num_periods() - 1]
+        if not isnan(value):
+            self.averages.append(value)
+
     def name(self):
         raise NotImplementedError
 
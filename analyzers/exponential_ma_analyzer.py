@@ -1,4 +1,5 @@
 from analyzers.base_analyzer import BaseAnalyzer
+from analyzers.series import ema_series
 
 
 # Exponential Moving Average Analyzer
@@ -12,6 +13,9 @@ class EMAAnalyzer(BaseAnalyzer):
     # See below for math
     # https://www.investopedia.com/terms/e/ema.asp
     def update_values(self, period_aggregator):
+        if self.series is not None:
+            return self.replay_values(period_aggregator)
+
         if period_aggregator.num_periods() >= self.length:
             if len(self.averages) == 0:
                 avg = sum(period_aggregator.get_last_closes(self.length)) / self.length
@@ -19,3 +23,9 @@ class EMAAnalyzer(BaseAnalyzer):
                 avg = (period_aggregator.get_last_close() * self.multiplier) + (self.averages[-1] * (1 - self.multiplier))
 
             self.averages.append(avg)
+
+    def periods_needed(self):
+        return self.length
+
+    def compute_series(self, columns):
+        return ema_series(columns["close"], self.length, self.multiplier)
@@ -0,0 +1,38 @@
+from functools import lru_cache
+import numpy as np
+
+
+# Process wide cache of the constant weights used by the weighted MA analyzers.
+# Sweeps build thousands of analyzers from a handful of distinct parameters, so every instance shares these.
+# Returned arrays are read only, weights[0] applies to the oldest value of the window
+
+
+def shared(values):
+    values.setflags(write=False)
+    return values
+
+
+# See below for math
+# https://www.prorealcode.com/prorealtime-indicators/alma-arnaud-legoux-moving-average/
+@lru_cache(maxsize=None)
+def alma_weights(length, sigma, offset):
+    m = (offset * (length - 1))
+    s = length / sigma
+
+    k = np.arange(length)
+    weights = np.exp(-((k - m) * (k - m)) / (2 * s * s))
+
+    return shared(weights / weights.sum())
+
+
+# Sum of x_i and sum of x_i squared for x_i running from 1 to length
+@lru_cache(maxsize=None)
+def lsma_sums(length):
+    xs = np.arange(1, length + 1)
+    return float(xs.sum()), float((xs * xs).sum())
+
+
+# x_i of each close of the window, oldest first, x_i is 1 for the newest close
+@lru_cache(maxsize=None)
+def lsma_x_weights(length):
+    return shared(np.arange(length, 0, -1, dtype=float))
@@ -1,4 +1,7 @@
 from analyzers.base_analyzer import BaseAnalyzer
+from analyzers.rolling_sums import RollingLinearSum
+from analyzers.kernels import lsma_sums, lsma_x_weights
+from analyzers.series import window_sum, window_dot
 
 
 # Least Squares Moving Average Analyzer
@@ -6,17 +9,25 @@ class LSMAAnalyzer(BaseAnalyzer):
     def __init__(self, length=10):
         self.length = length  # Number of periods to average
         self.averages = []
+        self.close_sums = RollingLinearSum(self.length)
+        self.sum_x, self.sum_x_squared = lsma_sums(self.length)
 
     # See below for math
     # https://botrader.org/useful/least-squares-moving-average-indicator-lsma/
     def update_values(self, period_aggregator):
-        if period_aggregator.num_periods() >= self.length:
-            closes = period_aggregator.get_last_closes(self.length)
+        if self.series is not None:
+            return self.replay_values(period_aggregator)
+
+        num_periods = period_aggregator.num_periods()
+        if num_periods >= self.length:
+            closes = period_aggregator.get_last_closes(self.length + 1)
+            self.close_sums.update(num_periods, closes)
 
             # sum_x_i         -> c
             # sum_y_i         -> d
             # sum_x_i_squared -> e
             # sum_x_i_y_i     -> f
+            # x_i is 1 for the newest close, y_i is the close
 
             # System of equations:
             # ae + bc = f
@@ -29,23 +40,18 @@ class LSMAAnalyzer(BaseAnalyzer):
             # Solved equations:
             # a = (fn - cd) / (ne - c^2)
             # b = (d - ac) / n
-            c = 0
-            d = 0
-            e = 0
-            f = 0
-            for i, close in enumerate(closes[::-1]):
-                x_i = i + 1
-                y_i = close
-                x_i_squared = x_i * x_i
-                x_i_y_i = x_i * y_i
-
-                c += x_i
-                d += y_i
-                e += x_i_squared
-                f += x_i_y_i
-
-            n = self.length
-            a = ((f * n) - (c * d)) / ((n * e) - (c * c))
-            b = (d - (a * c)) / n
-
-            self.averages.append(b)
+            self.averages.append(self.prediction(self.close_sums.total, self.close_sums.weighted_total))
+
+    # Works on the sums of one window or on arrays of them, the arithmetic is the same either way
+    def prediction(self, d, f):
+        c = self.sum_x
+        e = self.sum_x_squared
+
+        n = self.length
+        a = ((f * n) - (c * d)) / ((n * e) - (c * c))
+        b = (d - (a * c)) / n
+        return b
+
+    def compute_series(self, columns):
+        closes = columns["close"]
+        return self.prediction(window_sum(closes, self.length), window_dot(closes, lsma_x_weights(self.length)))
@@ -1,36 +1,86 @@
+from itertools import islice
+from math import isnan
 from analyzers.base_analyzer import BaseAnalyzer
+from analyzers.exponential_ma_analyzer import EMAAnalyzer
+from analyzers.series import ema_series
 
 
-# Exponential Moving Average Analyzer
+# Moving Average Convergence Divergence Analyzer
 class MACDAnalyzer(BaseAnalyzer):
-    def __init__(self, fast_length=12, slow_length=26, signal_length=9, smoothing=2):
-        self.slow_averages = []
-        self.fast_averages = []
+    history_fields = ("macd_values", "signal_values")
+
+    # fast_ema and slow_ema can be EMAAnalyzers shared with other analyzers, e.g. through an AnalyzerRegistry.
+    # Shared EMAs have to be updated before this analyzer. Either EMA that isn't given is created and updated by it
+    def __init__(self, fast_length=12, slow_length=26, signal_length=9, smoothing=2, fast_ema=None, slow_ema=None):
         self.macd_values = []
         self.signal_values = []
         self.smoothing = smoothing
         self.fast_length = fast_length
         self.slow_length = slow_length
         self.signal_length = signal_length
-        self.per12_mult = self.smoothing / (1 + self.fast_length)
-        self.per26_mult = self.smoothing / (1 + self.slow_length)
         self.signal_mult = self.smoothing / (1 + self.signal_length)
+        self.owned_emas = []
+        if fast_ema is None:
+            fast_ema = EMAAnalyzer(self.fast_length, self.smoothing)
+            self.owned_emas.append(fast_ema)
+        if slow_ema is None:
+            slow_ema = EMAAnalyzer(self.slow_length, self.smoothing)
+            self.owned_emas.append(slow_ema)
+        self.fast_ema = fast_ema
+        self.slow_ema = slow_ema
 
     def update_ema(self, data_source, averages, multiplier, length):
         if len(data_source) >= length:
             if averages[-1] is None:
-                averages.append(sum(data_source[-length:]) / length)
+                averages.append(sum(islice(data_source, len(data_source) - length, None)) / length)
             else:
                 averages.append((data_source[-1] * multiplier) + (averages[-1] * (1 - multiplier)))
         else:
             averages.append(None)
 
     def update_values(self, period_aggregator):
-        closes = period_aggregator.get_last_closes(self.slow_length)
-        self.update_ema(closes, self.fast_averages, self.per12_mult, self.fast_length)
-        self.update_ema(closes, self.slow_averages, self.per26_mult, self.slow_length)
+        for ema in self.owned_emas:
+            ema.update_values(period_aggregator)
+
+        if self.series is not None:
+            return self.replay_values(period_aggregator)
 
-        if self.fast_averages[-1] is not None and self.slow_averages[-1] is not None:
-            self.macd_values.append(self.fast_averages[-1] - self.slow_averages[-1])
+        if len(self.fast_ema.averages) > 0 and len(self.slow_ema.averages) > 0:
+            self.macd_values.append(self.fast_ema.averages[-1] - self.slow_ema.averages[-1])
 
         self.update_ema(self.macd_values, self.signal_values, self.signal_mult, self.signal_length)
+
+    def periods_needed(self):
+        return max(self.fast_ema.periods_needed(), self.slow_ema.periods_needed())
+
+    def retain(self, depth):
+        super().retain(depth)
+        self.fast_ema.retain(1)
+        self.slow_ema.retain(1)
+
+    # The signal EMA is seeded from the last signal_length MACD values
+    def min_retention(self):
+        return self.signal_length
+
+    def load_series(self, columns):
+        for ema in self.owned_emas:
+            ema.load_series(columns)
+
+        super().load_series(columns)
+
+    def compute_series(self, columns):
+        # Reuse the EMA series when they were already loaded
+        fast = self.fast_ema.series if self.fast_ema.series is not None else self.fast_ema.compute_series(columns)
+        slow = self.slow_ema.series if self.slow_ema.series is not None else self.slow_ema.compute_series(columns)
+        macd = fast - slow
+        signal = ema_series(macd, self.signal_length, self.signal_mult)
+        return {"macd": macd, "signal": signal}
+
+    def replay_values(self, period_aggregator):
+        index = period_aggregator.num_periods() - 1
+        signal_value = self.replay_series["signal"][index]
+        self.signal_values.append(None if isnan(signal_value) else signal_value)
+
+        macd_value = self.replay_series["macd"][index]
+        if not isnan(macd_value):
+            self.macd_values.append(macd_value)
@@ -1,9 +1,14 @@
+from math import isnan
+import numpy as np
 from analyzers.base_analyzer import BaseAnalyzer
 from utils.constants import PSAR_TRACE
 
 
 # Parabolic Stop And Reverse Analyzer
 class PSARAnalyzer(BaseAnalyzer):
+    history_fields = ("sars",)
+    vectorized = False
+
     def __init__(self, step=0.02, max_step=0.2):
         self.accel_factor = 0.02
         self.cur_accel_factor = self.accel_factor
@@ -30,20 +35,28 @@ class PSARAnalyzer(BaseAnalyzer):
     # See below for math
     # https://school.stockcharts.com/doku.php?id=technical_indicators:parabolic_sar
     def update_values(self, period_aggregator):
-        if period_aggregator.num_periods() < self.wait_length:
-            return
-        elif len(self.sars) == 0:
-            last_two_closes = period_aggregator.get_last_values("close", 2)
-            self.is_rising = last_two_closes[-1] > last_two_closes[-2]
+        if self.series is not None:
+            return self.replay_values(period_aggregator)
+
+        if period_aggregator.num_periods() >= self.wait_length:
+            self.advance(period_aggregator.columns, period_aggregator.size)
 
-            self.high_ep = max(period_aggregator.get_last_values("high", self.wait_length))
-            self.low_ep = max(period_aggregator.get_last_values("low", self.wait_length))
+    # Takes the recursion one period further, to the last of the first size values of the columns
+    def advance(self, columns, size):
+        highs = columns["high"]
+        lows = columns["low"]
+        if len(self.sars) == 0:
+            closes = columns["close"]
+            self.is_rising = closes[size - 1] > closes[size - 2]
+
+            self.high_ep = max(highs[size - self.wait_length:size])
+            self.low_ep = max(lows[size - self.wait_length:size])
 
             start_sars = self.low_ep if self.is_rising else self.high_ep
             self.sars.append(start_sars)
 
-        last_low = period_aggregator.get_last_value("low")
-        last_high = period_aggregator.get_last_value("high")
+        last_low = lows[size - 1]
+        last_high = highs[size - 1]
         flip = (self.is_rising and last_low < self.sars[-1]) or \
                (not self.is_rising and last_high > self.sars[-1])
 
@@ -75,6 +88,39 @@ class PSARAnalyzer(BaseAnalyzer):
 
         self.sars.append(cur_sars)
 
+    def periods_needed(self):
+        return self.wait_length
+
     def increment_accel(self):
         if self.cur_accel_factor < self.max_step:
             self.cur_accel_factor += self.step
+
+    # The SAR is path dependent, so there's no vectorized form, this runs the recursion over the columns
+    # once so the result can be replayed and shared. The recursion indexes lists, which is cheaper than arrays
+    def compute_series(self, columns):
+        num_periods = len(columns["close"])
+        columns = {source: columns[source].tolist() for source in ["high", "low", "close"]}
+        sars = np.full(num_periods, np.nan)
+        is_rising = np.zeros(num_periods, dtype=bool)
+
+        psar = PSARAnalyzer(self.step, self.max_step)
+        psar.retain(2)
+        start_sar = None
+        for i in range(self.wait_length - 1, num_periods):
+            psar.advance(columns, i + 1)
+            # The first update also appends the starting SAR
+            if start_sar is None:
+                start_sar = psar.sars[0]
+            sars[i] = psar.sars[-1]
+            is_rising[i] = psar.is_rising
+
+        return {"sar": sars, "is_rising": is_rising, "start_sar": start_sar}
+
+    def replay_values(self, period_aggregator):
+        index = period_aggregator.num_periods() - 1
+        sar = self.replay_series["sar"][index]
+        if not isnan(sar):
+            if len(self.sars) == 0:
+                self.sars.append(self.replay_series["start_sar"])
+            self.sars.append(sar)
+            self.is_rising = self.replay_series["is_rising"][index]
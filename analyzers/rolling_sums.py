@@ -0,0 +1,71 @@
+import numpy as np
+
+# Number of constant time updates before a sum is recomputed from the full window, bounds floating point drift
+RESYNC_INTERVAL = 500
+
+
+# Running sum over the trailing window of an aggregator, updated in constant time per period
+# by adding the newest term and subtracting the one leaving the window.
+# Each term is the product of the given sources, e.g. (close,) for Σy or (hlc3, volume) for Σvol·src
+class RollingSum:
+    def __init__(self, length, resync_interval=RESYNC_INTERVAL):
+        self.length = length
+        self.resync_interval = resync_interval
+        self.total = 0.0
+        self.last_num_periods = None
+        self.updates_since_resync = 0
+
+    # windows are trailing views holding the last length + 1 values, the first being the expiring one
+    def update(self, num_periods, *windows):
+        if self.needs_resync(num_periods, windows[0]):
+            self.resync(windows)
+            self.updates_since_resync = 0
+        else:
+            self.slide(term(windows, -1), term(windows, 0))
+            self.updates_since_resync += 1
+
+        self.last_num_periods = num_periods
+        return self.total
+
+    def needs_resync(self, num_periods, window):
+        # Missing an update (or the window not having an expiring value yet) means the sum can't be slid
+        return self.last_num_periods != num_periods - 1 or \
+            len(window) <= self.length or \
+            self.updates_since_resync >= self.resync_interval
+
+    def resync(self, windows):
+        self.total = float(window_terms(windows, self.length).sum())
+
+    def slide(self, entering, expiring):
+        self.total += entering - expiring
+
+
+# Tracks Σy along with Σx·y, where x is 1 for the newest value and length for the oldest
+class RollingLinearSum(RollingSum):
+    def __init__(self, length, resync_interval=RESYNC_INTERVAL):
+        super().__init__(length, resync_interval)
+        self.weighted_total = 0.0
+
+    def resync(self, windows):
+        terms = window_terms(windows, self.length)
+        self.total = float(terms.sum())
+        self.weighted_total = float(terms.dot(np.arange(self.length, 0, -1)))
+
+    def slide(self, entering, expiring):
+        # Every remaining value moves one x further back, adding Σy once more
+        self.weighted_total += self.total - ((self.length + 1) * expiring) + entering
+        self.total += entering - expiring
+
+
+def term(windows, index):
+    value = 1.0
+    for window in windows:
+        value *= window[index]
+    return value
+
+
+def window_terms(windows, length):
+    terms = windows[0][-length:]
+    for window in windows[1:]:
+        terms = terms * window[-length:]
+    return terms
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+# Helpers for computing whole indicator series in one pass over a day's columns.
+# Every series has one value per period, NaN where the analyzer would not have produced a value yet.
+
+
+def pad_front(values, total_length):
+    out = np.full(total_length, np.nan)
+    if len(values) > 0:
+        out[total_length - len(values):] = values
+    return out
+
+
+# Weighted sum of each trailing window, weights[0] applies to the oldest value of the window
+def window_dot(values, weights):
+    if len(values) < len(weights):
+        return pad_front([], len(values))
+    return pad_front(np.convolve(values, weights[::-1], "valid"), len(values))
+
+
+# Sum of each trailing window, every window is summed on its own like the analyzers' resyncs do
+def window_sum(values, length):
+    return window_dot(values, np.ones(length))
+
+
+# EMA seeded with the simple average of the first length valid values, values may start with NaNs
+def ema_series(values, length, multiplier):
+    out = pad_front([], len(values))
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) < length:
+        return out
+
+    start = valid[0] + length - 1
+    seed = values[valid[0]:start + 1].sum() / length
+    out[start] = seed
+    if start + 1 == len(values):
+        return out
+
+    # scipy.signal takes over a second to import, so only pay for it when a series is actually computed
+    from scipy.signal import lfilter
+
+    # y[n] = multiplier * x[n] + (1 - multiplier) * y[n - 1]
+    out[start + 1:] = lfilter([multiplier], [1, multiplier - 1], values[start + 1:], zi=[(1 - multiplier) * seed])[0]
+    return out
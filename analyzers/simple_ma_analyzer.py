@@ -1,4 +1,6 @@
 from analyzers.base_analyzer import BaseAnalyzer
+from analyzers.rolling_sums import RollingSum
+from analyzers.series import window_sum
 
 
 # Simple Moving Average Analyzer
@@ -6,9 +8,16 @@ class SMAAnalyzer(BaseAnalyzer):
     def __init__(self, length=10):
         self.length = length  # Number of periods to average
         self.averages = []
+        self.close_sum = RollingSum(self.length)
 
     def update_values(self, period_aggregator):
+        if self.series is not None:
+            return self.replay_values(period_aggregator)
+
         if period_aggregator.num_periods() >= self.length:
-            period_closes = period_aggregator.get_last_closes(self.length)
-            avg = sum(period_closes) / self.length
+            period_closes = period_aggregator.get_last_closes(self.length + 1)
+            avg = self.close_sum.update(period_aggregator.num_periods(), period_closes) / self.length
             self.averages.append(avg)
+
+    def compute_series(self, columns):
+        return window_sum(columns["close"], self.length) / self.length
@@ -1,3 +1,6 @@
+from utils.period_aggregator import MultiTimeframeAggregator, period_columns
+
+
 class SimulationAnalyzerManager:
     def __init__(self, analyzers, period_aggregators):
         # {
@@ -8,13 +11,51 @@ class SimulationAnalyzerManager:
         #    window_size: aggregator
         # }
         self.period_aggregators = period_aggregators
+        self.multi_timeframe_aggregator = MultiTimeframeAggregator(period_aggregators)
+        for window_size, per_agg in period_aggregators.items():
+            if len(analyzers.get(window_size, [])) > 0:
+                per_agg.retain(max(a.periods_needed() for a in analyzers[window_size]))
+        # {
+        #    window_size: [strategies using the window's analyzers]
+        # }
+        self.subscribers = {window_size: [] for window_size in period_aggregators}
 
+    # Returns the window sizes whose period closed on this quote, only their analyzers changed
     def process_quote(self, quote):
-        for window_size, per_agg in self.period_aggregators.items():
-            finished_period = per_agg.process_quote(quote)
-            if finished_period:
-                for analyzer in self.analyzers[window_size]:
-                    analyzer.update_values(per_agg)
+        closed_window_sizes = self.multi_timeframe_aggregator.process_quote(quote)
+        for window_size in closed_window_sizes:
+            per_agg = self.period_aggregators[window_size]
+            for analyzer in self.analyzers[window_size]:
+                analyzer.update_values(per_agg)
+
+        return closed_window_sizes
+
+    # Pipeline stage, yields each quote along with the window sizes it closed once the aggregators and
+    # analyzers have processed it
+    def process_quotes(self, quotes):
+        for quote in quotes:
+            yield quote, self.process_quote(quote)
+
+    # Subscribes each strategy to the window sizes of the analyzers it holds. Strategies without
+    # analyzers aren't subscribed to anything
+    def subscribe_strategies(self, strategies):
+        analyzer_windows = {id(a): window_size for window_size, window in self.analyzers.items() for a in window}
+        for strategy in strategies:
+            window_sizes = {analyzer_windows[id(v)] for v in vars(strategy).values() if id(v) in analyzer_windows}
+            for window_size in window_sizes:
+                self.subscribers[window_size].append(strategy)
+
+    # Strategies whose inputs may have changed after the given windows closed
+    def get_subscribers(self, closed_window_sizes):
+        if len(closed_window_sizes) == 1:
+            return self.subscribers[closed_window_sizes[0]]
+
+        subscribers = {}
+        for window_size in closed_window_sizes:
+            for strategy in self.subscribers[window_size]:
+                subscribers[id(strategy)] = strategy
+
+        return subscribers.values()
 
     def process_period(self, period):
         per_agg = self.period_aggregators[period.timeframe]
@@ -23,5 +64,19 @@ class SimulationAnalyzerManager:
         for analyzer in self.analyzers[period.timeframe]:
             analyzer.update_values(per_agg)
 
+    # Batch mode, computes each analyzer's values for all of the periods up front so that
+    # process_period only has to replay them. Periods must then be processed in the same order.
+    # vectorized_only leaves the analyzers without a vectorized form updating a period at a time
+    def precompute_series(self, window_size, periods, vectorized_only=False):
+        columns = period_columns(periods)
+        for analyzer in self.analyzers[window_size]:
+            if vectorized_only and not analyzer.vectorized:
+                continue
+            try:
+                analyzer.load_series(columns)
+            except NotImplementedError:
+                # Analyzers without a vectorized form keep updating one period at a time
+                pass
+
     def get_period_sizes(self):
         return self.period_aggregators.keys()
@@ -1,4 +1,6 @@
 from analyzers.base_analyzer import BaseAnalyzer
+from analyzers.rolling_sums import RollingSum
+from analyzers.series import window_sum
 from utils.constants import MA_TRACE
 
 
@@ -8,6 +10,8 @@ class VWMAAnalyzer(BaseAnalyzer):
         self.length = length  # Number of periods to average
         self.averages = []
         self.source = source
+        self.vol_value_sum = RollingSum(self.length)
+        self.vol_sum = RollingSum(self.length)
 
     def name(self):
         return f"vwma_{self.length}_{self.source}"
@@ -24,14 +28,20 @@ class VWMAAnalyzer(BaseAnalyzer):
     # See below for math
     # https://www.tradingsetupsreview.com/volume-weighted-moving-average-vwma/
     def update_values(self, period_aggregator):
-        if period_aggregator.num_periods() >= self.length:
-            vol_close_sum = 0
-            vol_sum = 0
-            for i in range(self.length):
-                index = i + 1
-                period = period_aggregator.periods[-index]
-                vol_close_sum += (period.get_value(self.source) * period.volume)
-                vol_sum += period.volume
-
-            avg = vol_close_sum / vol_sum
+        if self.series is not None:
+            return self.replay_values(period_aggregator)
+
+        num_periods = period_aggregator.num_periods()
+        if num_periods >= self.length:
+            values = period_aggregator.get_last_values(self.source, self.length + 1)
+            volumes = period_aggregator.get_last_values("volume", self.length + 1)
+
+            vol_value_sum = self.vol_value_sum.update(num_periods, values, volumes)
+            vol_sum = self.vol_sum.update(num_periods, volumes)
+
+            avg = vol_value_sum / vol_sum
             self.averages.append(avg)
+
+    def compute_series(self, columns):
+        volumes = columns["volume"]
+        return window_sum(columns[self.source] * volumes, self.length) / window_sum(volumes, self.length)
@@ -0,0 +1,105 @@
+import json
+from datetime import datetime, timedelta
+from queue import SimpleQueue
+from random import Random
+from time import perf_counter
+from plotly.utils import PlotlyJSONEncoder
+from dash_server.webserver import TradeMonitorWebServer, DEFAULT_VIEW_WIDTH
+from utils.constants import COST_TRACE, MA_TRACE, PSAR_TRACE
+
+# Cost of dashboard updates as a session of 5 second periods grows. Each interval's incremental update goes
+# through the Dash callback, and the figures a page load would get are built downsampled to the view width and,
+# at the end, at full resolution the way every update used to build them
+# python -m benchmarks.bench_dashboard_updates
+
+SYMBOLS = ["AAPL", "TSLA", "DIS", "GE", "HD", "BRK.B", "JPM", "NFLX", "BA", "JNJ", "PFE", "T", "WMT", "XOM", "CVX", "CAT"]
+PERIOD_SECONDS = 5
+UPDATE_INTERVAL = 10
+# A day from the pre market to the close
+NUM_PERIODS = 17 * 60 * 60 // PERIOD_SECONDS
+NUM_SAMPLES = 6
+
+
+def trace_points(rand, price):
+    return {
+        'cost': {'point': price, 'trace_type': COST_TRACE},
+        'vwma_fast': {'point': price + rand.gauss(0, 0.1), 'trace_type': MA_TRACE},
+        'vwma_slow': {'point': price + rand.gauss(0, 0.2), 'trace_type': MA_TRACE},
+        'psar': {'point': price + rand.gauss(0, 0.5), 'trace_type': PSAR_TRACE}
+    }
+
+
+def callback_request(dependency, n, cursor, symbols):
+    graph_outputs = [{'id': {'symbol': s, 'type': 'symbol_graph'}, 'property': p} for s in symbols
+                     for p in ['figure', 'extendData']]
+    return {
+        'output': dependency['output'],
+        'outputs': [
+            {'id': 'graphs', 'property': 'children'},
+            {'id': 'cursor', 'property': 'data'},
+            graph_outputs[0::2],
+            graph_outputs[1::2]
+        ],
+        'inputs': [
+            {'id': 'update_interval', 'property': 'n_intervals', 'value': n},
+            [{'id': {'symbol': s, 'type': 'symbol_graph'}, 'property': 'relayoutData', 'value': None} for s in symbols]
+        ],
+        'state': [
+            {'id': 'cursor', 'property': 'data', 'value': cursor},
+            {'id': 'view_width', 'property': 'data', 'value': DEFAULT_VIEW_WIDTH}
+        ],
+        'changedPropIds': ['update_interval.n_intervals']
+    }
+
+
+def measure_page_load(server, view_width):
+    start = perf_counter()
+    graphs, _ = server.build_graphs(view_width)
+    size = len(json.dumps(graphs, cls=PlotlyJSONEncoder))
+    return perf_counter() - start, size
+
+
+def run_benchmark():
+    update_queue = SimpleQueue()
+    server = TradeMonitorWebServer(update_queue)
+    client = server.app.server.test_client()
+    dependency = [d for d in client.get('/_dash-dependencies').get_json() if d['output'].startswith('..graphs')][0]
+
+    rand = Random(0)
+    prices = {s: 100.0 for s in SYMBOLS}
+    start = datetime(2021, 12, 1, 4, 0)
+    cursor = None
+    symbols = []
+    periods_per_update = UPDATE_INTERVAL // PERIOD_SECONDS
+    num_updates = NUM_PERIODS // periods_per_update
+
+    print(f"{len(SYMBOLS)} symbols, {NUM_PERIODS} periods of {PERIOD_SECONDS}s, a view {DEFAULT_VIEW_WIDTH} pixels wide")
+    for i in range(num_updates):
+        for j in range(periods_per_update):
+            for symbol in SYMBOLS:
+                prices[symbol] += rand.gauss(0, 0.1)
+                update_queue.put({
+                    'symbol': symbol,
+                    'timestamp': start + timedelta(seconds=(i * periods_per_update + j) * PERIOD_SECONDS),
+                    'trace_points': trace_points(rand, prices[symbol])
+                })
+
+        request_start = perf_counter()
+        response = client.post('/_dash-update-component', json=callback_request(dependency, i, cursor, symbols))
+        incremental_time = perf_counter() - request_start
+        body = response.get_json()['response']
+        cursor = body['cursor']['data']
+        if 'graphs' in body:
+            symbols = [graph['props']['id']['symbol'] for graph in body['graphs']['children']]
+
+        if (i + 1) % (num_updates // NUM_SAMPLES) == 0:
+            load_time, load_size = measure_page_load(server, DEFAULT_VIEW_WIDTH)
+            print(f"{(i + 1) * periods_per_update:6} periods  update {incremental_time * 1000:7.2f}ms "
+                  f"{len(response.data) / 1024:8.1f} KiB  page load {load_time * 1000:7.2f}ms {load_size / 1024:8.1f} KiB")
+
+    load_time, load_size = measure_page_load(server, NUM_PERIODS)
+    print(f"full resolution page load {load_time * 1000:.2f}ms {load_size / 1024:.1f} KiB")
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from queue import SimpleQueue
+from random import Random
+from statistics import mean, quantiles
+from time import perf_counter, time
+from types import SimpleNamespace
+from live_trader.trade_manager import LiveTradeManager
+from run_trade_manager import create_strats_and_aggs
+from utils.constants import PAPER
+from utils.period_aggregator import PeriodAggregator
+
+# Quote to signal latency of the live trader with the stream listener in its own process, split across shards and
+# running on the manager's event loop. A local fake stream replaces the alpaca Stream, nothing touches the network.
+# Also counts periods that reached the strategies out of end time order
+# python -m benchmarks.bench_listener_latency
+
+SYMBOLS = ["AAPL", "TSLA", "DIS", "GE", "HD", "BRK.B", "JPM", "NFLX", "BA", "JNJ", "PFE", "T", "WMT", "XOM", "CVX", "CAT"]
+TIMEFRAME = 1
+QUOTES_PER_PERIOD = 10
+NUM_PERIODS = 100
+# Real time between quote rounds, quotes for every symbol are sent each round
+QUOTE_INTERVAL = 0.001
+# Quote times follow the wall clock sped up so a period lasts QUOTES_PER_PERIOD rounds, which keeps the streams
+# of separate listener shards on the same market time the way real streams are
+SPEED_UP = TIMEFRAME / (QUOTES_PER_PERIOD * QUOTE_INTERVAL)
+START = datetime(2021, 12, 1, 14, 30)
+# Forked listener processes inherit the same origin
+TIME_ORIGIN = time()
+
+
+class FakeStream:
+    def __init__(self, account_type):
+        self.quote_handlers = {}
+        self.running = True
+
+    def subscribe_trade_updates(self, handler):
+        pass
+
+    def subscribe_quotes(self, handler, symbol):
+        self.quote_handlers[symbol] = handler
+
+    def run(self):
+        asyncio.run(self._run_forever())
+
+    async def _run_forever(self):
+        rand = Random(0)
+        price = 100.0
+        while self.running:
+            price = max(price + rand.gauss(0, 0.05), 1.0)
+            ts = START + timedelta(seconds=(time() - TIME_ORIGIN) * SPEED_UP)
+            quote = SimpleNamespace(timestamp=ts, ask_price=price + 0.01, ask_size=1, bid_price=price, bid_size=1)
+            for handler in self.quote_handlers.values():
+                await handler(quote)
+            await asyncio.sleep(QUOTE_INTERVAL)
+
+    async def stop_ws(self):
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+
+# Stands in for the AlpacaBrokerage, the benchmark never trades
+class NoOrderBrokerage:
+    def record_quote(self, symbol, quote, timestamp):
+        pass
+
+    def set_quote_source(self, quote_source):
+        pass
+
+    def set_instrumentation(self, instrumentation):
+        pass
+
+    async def reconcile_async(self):
+        pass
+
+
+def fake_stream(account_type):
+    return FakeStream(account_type)
+
+
+def create_fast_strats_and_aggs(symbols):
+    strategies, _ = create_strats_and_aggs(symbols)
+    return strategies, {s: PeriodAggregator(TIMEFRAME) for s in symbols}
+
+
+class LatencyTradeManager(LiveTradeManager):
+    def __init__(self, single_process, listener_shards):
+        super().__init__(PAPER, SYMBOLS, create_fast_strats_and_aggs, single_process=single_process,
+                         brokerage=NoOrderBrokerage(), listener_shards=listener_shards)
+        self.stream_factory = fake_stream
+        self.webserver_queue = SimpleQueue()
+        self.latencies = []
+        self.last_end_time = None
+        self.out_of_order = 0
+        self.all_periods_seen = None
+
+    async def process_periods(self, period_messages):
+        await super().process_periods(period_messages)
+        done = perf_counter()
+        self.latencies.extend(done - msg["received"] for msg in period_messages)
+        for msg in period_messages:
+            end_time = msg["period"].end_time
+            if self.last_end_time is not None and end_time < self.last_end_time:
+                self.out_of_order += 1
+            self.last_end_time = max(end_time, self.last_end_time or end_time)
+
+        if len(self.latencies) >= NUM_PERIODS * len(SYMBOLS):
+            self.all_periods_seen.set()
+
+
+async def measure(single_process, listener_shards):
+    manager = LatencyTradeManager(single_process, listener_shards)
+    manager.order_lock = asyncio.Lock()
+    manager.all_periods_seen = asyncio.Event()
+
+    manager.start_listener()
+    await manager.all_periods_seen.wait()
+    await manager.stop_listener()
+    return manager.latencies, manager.out_of_order
+
+
+def run_benchmark():
+    for name in ["stream_listener", "live_trade_manager"]:
+        logging.getLogger(name).disabled = True
+
+    print(f"{len(SYMBOLS)} symbols, {NUM_PERIODS} periods each")
+    modes = [("listener process", False, 1), ("4 listener shards", False, 4), ("single process", True, 1)]
+    for name, single_process, listener_shards in modes:
+        latencies, out_of_order = asyncio.run(measure(single_process, listener_shards))
+        latencies = [s * 1000 for s in latencies]
+        percentiles = quantiles(latencies, n=100)
+        print(f"{name:18} mean {mean(latencies):7.3f}ms  p50 {percentiles[49]:7.3f}ms  p99 {percentiles[98]:7.3f}ms"
+              f"  out of order {out_of_order}")
+
+
+if __name__ == '__main__':
+    run_benchmark()
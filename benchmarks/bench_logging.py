@@ -0,0 +1,76 @@
+import logging
+import os
+import sys
+from contextlib import redirect_stdout
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from utils.utils import get_logger, stop_log_listeners, reduce_log_record_overhead
+
+# Cost to the caller of a brokerage style log call, with the handlers writing on the calling thread the way every
+# logger used to and with the queue handler, whose listener thread writes the records. Shown for f-string messages
+# and lazy %-style arguments, and for records that are never written
+# python -m benchmarks.bench_logging [num_calls]
+
+NUM_CALLS = 20_000
+SYMBOL = "AAPL"
+
+
+def sync_logger(log_file_name):
+    log = logging.getLogger("bench_sync")
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    formatter = logging.Formatter(fmt="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    for handler in [logging.StreamHandler(sys.stdout), logging.FileHandler(log_file_name, "a")]:
+        handler.setFormatter(formatter)
+        log.addHandler(handler)
+    return log
+
+
+def fstring_calls(log, num_calls):
+    for i in range(num_calls):
+        log.debug(f"Latest bid price for {SYMBOL}: {100.0 + i / 1000} at {i}")
+
+
+def lazy_calls(log, num_calls):
+    for i in range(num_calls):
+        log.debug("Latest bid price for %s: %s at %s", SYMBOL, 100.0 + i / 1000, i)
+
+
+def measure(calls, log, num_calls):
+    start = perf_counter()
+    calls(log, num_calls)
+    return (perf_counter() - start) / num_calls
+
+
+def run_benchmark(num_calls):
+    with TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        loggers = [
+            ("handlers on the caller", sync_logger(os.path.join(log_dir, "sync.log"))),
+            ("queue handler", get_logger("bench_queue", os.path.join(log_dir, "queue.log")))
+        ]
+
+        results = []
+        for name, log in loggers:
+            log.propagate = False
+            for calls in [fstring_calls, lazy_calls]:
+                results.append((name, calls.__name__, measure(calls, log, num_calls)))
+
+            log.setLevel(logging.INFO)
+            results.append((name, "debug below the level", measure(lazy_calls, log, num_calls)))
+            log.disabled = True
+            results.append((name, "disabled", measure(lazy_calls, log, num_calls)))
+
+        start = perf_counter()
+        stop_log_listeners()
+        drain_time = perf_counter() - start
+
+    print(f"{num_calls} calls each")
+    for name, calls, per_call in results:
+        print(f"{name:22} {calls:22} {per_call * 1e6:7.2f}us per call")
+    print(f"queue drained at exit in {drain_time * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    # Logs the way the entry points do
+    reduce_log_record_overhead()
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CALLS)
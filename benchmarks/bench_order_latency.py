@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import mean
+from threading import Thread
+from time import perf_counter, sleep
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+from alpaca_trade_api.common import URL
+from alpaca_trade_api.rest import REST
+from brokerages.brokerage import AlpacaBrokerage
+from utils.constants import PAPER, PAPER_KEY_ENV_VAR, PAPER_SECRET_ENV_VAR
+
+# Order latency of the brokerage asking REST for the positions, account and latest quote before every order against
+# sizing orders from its account cache. A local mock of the Alpaca REST API adds REQUEST_LATENCY to every request
+# to stand in for the network round trip
+# python -m benchmarks.bench_order_latency
+
+SYMBOL = "AAPL"
+PRICE = 100.0
+NUM_ORDERS = 20
+REQUEST_LATENCY = 0.02
+
+
+class MockAlpaca:
+    def __init__(self):
+        self.cash = 100_000.0
+        # {
+        #   symbol: quantity
+        # }
+        self.positions = {}
+        self.requests = 0
+        self.next_order_id = 0
+
+    def handle(self, method, path, body):
+        self.requests += 1
+        sleep(REQUEST_LATENCY)
+
+        if method == "GET" and path == "/v2/account":
+            return {"cash": str(self.cash)}
+        elif method == "GET" and path == "/v2/positions":
+            return [position_json(s, q) for s, q in self.positions.items()]
+        elif method == "GET" and path.startswith("/v2/positions/"):
+            symbol = path.split("/")[-1]
+            if symbol not in self.positions:
+                return 404, {"code": 40410000, "message": "position does not exist"}
+            return position_json(symbol, self.positions[symbol])
+        elif method == "GET" and path.endswith("/quotes/latest"):
+            symbol = path.split("/")[-3]
+            return {"symbol": symbol, "quote": {"ap": PRICE + 0.01, "as": 1, "bp": PRICE, "bs": 1}}
+        elif method == "POST" and path == "/v2/orders":
+            return self.fill(body["symbol"], "buy", int(body["qty"]))
+        elif method == "DELETE" and path.startswith("/v2/positions/"):
+            return self.fill(path.split("/")[-1], "sell", int(body["qty"]))
+
+        return 404, {"code": 40400000, "message": "not found"}
+
+    # Orders fill immediately at PRICE
+    def fill(self, symbol, side, qty):
+        sign = 1 if side == "buy" else -1
+        self.cash -= sign * qty * PRICE
+        quantity = self.positions.get(symbol, 0) + sign * qty
+        if quantity == 0:
+            self.positions.pop(symbol)
+        else:
+            self.positions[symbol] = quantity
+
+        self.next_order_id += 1
+        return {"id": str(self.next_order_id), "symbol": symbol, "side": side, "qty": str(qty), "status": "filled"}
+
+
+def position_json(symbol, quantity):
+    return {"symbol": symbol, "qty": str(quantity), "side": "long"}
+
+
+def start_mock_server(mock):
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            url = urlsplit(self.path)
+            # The REST client sends DELETE parameters in the query string
+            body = json.loads(self.rfile.read(length)) if length > 0 else dict(parse_qsl(url.query))
+            result = mock.handle(method, url.path, body)
+            status, result = result if isinstance(result, tuple) else (200, result)
+
+            content = json.dumps(result).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            self.respond("GET")
+
+        def do_POST(self):
+            self.respond("POST")
+
+        def do_DELETE(self):
+            self.respond("DELETE")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# The trade update the stream would send for an order the mock filled
+def fill_update(order, mock):
+    return {
+        "event": "fill",
+        "order": {"symbol": order.symbol, "side": order.side},
+        "qty": order.qty,
+        "price": str(PRICE),
+        "position_qty": str(mock.positions.get(order.symbol, 0))
+    }
+
+
+def measure(mock, submit):
+    requests = mock.requests
+    start = perf_counter()
+    submit()
+    return perf_counter() - start, mock.requests - requests
+
+
+def run_benchmark():
+    mock = MockAlpaca()
+    server = start_mock_server(mock)
+    url = f"http://127.0.0.1:{server.server_port}"
+    os.environ[PAPER_KEY_ENV_VAR] = "key"
+    os.environ[PAPER_SECRET_ENV_VAR] = "secret"
+    os.environ["APCA_API_DATA_URL"] = url
+
+    brokerage = AlpacaBrokerage(PAPER, num_stocks=4, dry_run=False)
+    brokerage.api = REST("key", "secret", base_url=URL(url))
+    brokerage.logger.disabled = True
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(brokerage.reconcile_async())
+    brokerage.record_quote(SYMBOL, SimpleNamespace(bp=PRICE), None)
+
+    def cached_buy():
+        order = loop.run_until_complete(brokerage.buy_stock_async(SYMBOL))
+        brokerage.apply_trade_update(fill_update(order, mock))
+
+    def cached_sell():
+        order = loop.run_until_complete(brokerage.sell_stock_async(SYMBOL))
+        brokerage.apply_trade_update(fill_update(order, mock))
+
+    print(f"{REQUEST_LATENCY * 1000:.0f}ms per request, {NUM_ORDERS} orders each")
+    # Buys and sells alternate, so one of each is measured per round
+    for name, buy, sell in [("REST", lambda: brokerage.buy_stock(SYMBOL), lambda: brokerage.sell_stock(SYMBOL)),
+                            ("account cache", cached_buy, cached_sell)]:
+        buy_latencies, sell_latencies = [], []
+        buy_requests, sell_requests = 0, 0
+        for _ in range(NUM_ORDERS):
+            latencies, requests = measure(mock, buy)
+            buy_latencies.append(latencies)
+            buy_requests += requests
+            latencies, requests = measure(mock, sell)
+            sell_latencies.append(latencies)
+            sell_requests += requests
+
+        print(f"{name:14} buy mean {mean(buy_latencies) * 1000:7.2f}ms {buy_requests / NUM_ORDERS:.1f} requests  "
+              f"sell mean {mean(sell_latencies) * 1000:7.2f}ms {sell_requests / NUM_ORDERS:.1f} requests")
+
+    # The fills kept the cache in step with the account, so reconciling should find nothing to correct
+    differences = brokerage.cache.reconcile(brokerage.api.get("/positions"), brokerage.api.get_account())
+    print(f"account cache differences found by reconciling: {differences}")
+    loop.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    run_benchmark()
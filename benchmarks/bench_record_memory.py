@@ -0,0 +1,51 @@
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from utils.quote import Quote
+from utils.utils import iter_quotes_from_file
+
+# Per-quote memory of the slotted Quote against the previous __dict__ backed class
+# python -m benchmarks.bench_record_memory [quote_file.csv]
+
+NUM_SYNTHETIC_QUOTES = 200_000
+
+
+class DictQuote:
+    def __init__(self, t, ap, as_, bp, bs):
+        self.t = t
+        self.ap = ap
+        self.as_ = as_
+        self.bp = bp
+        self.bs = bs
+
+
+def synthetic_quotes():
+    start = datetime(2021, 12, 1, 14, 30)
+    for i in range(NUM_SYNTHETIC_QUOTES):
+        yield Quote(start + timedelta(microseconds=i * 1000), 150.01 + (i % 100) / 100, 1 + i % 7, 150.0 + (i % 100) / 100, 1 + i % 5)
+
+
+# Only the record objects are measured, the field values are shared between both runs
+def bytes_per_record(record_class, fields):
+    tracemalloc.start()
+    records = [record_class(*f) for f in fields]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated / len(records)
+
+
+def run_benchmark(quotes):
+    fields = [(q.t, q.ap, q.as_, q.bp, q.bs) for q in quotes]
+    print(f"{len(fields)} quotes")
+
+    before = bytes_per_record(DictQuote, fields)
+    after = bytes_per_record(Quote, fields)
+    print(f"__dict__ quote: {before:6.1f} bytes/quote")
+    print(f"slotted quote:  {after:6.1f} bytes/quote ({before / after:.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run_benchmark(iter_quotes_from_file(sys.argv[1]))
+    else:
+        run_benchmark(synthetic_quotes())
@@ -0,0 +1,50 @@
+import sys
+import tracemalloc
+from benchmarks.synthetic import synthetic_periods
+from run_trade_manager import create_strats_and_aggs
+from live_trader.trade_manager import retain_period_history
+
+# Soak test of the live trader's per symbol state, feeds a long session of synthetic periods through the
+# aggregators and strategies the same way LiveTradeManager.process_periods does and samples the traced memory.
+# With bounded histories the memory should stay flat however many periods are processed
+# python -m benchmarks.bench_soak_memory [num_periods_per_symbol]
+
+SYMBOLS = ["AAPL", "TSLA", "DIS", "GE", "HD", "BRK.B", "JPM", "NFLX", "BA", "JNJ", "PFE", "T", "WMT", "XOM", "CVX", "CAT"]
+NUM_PERIODS = 50_000
+NUM_SAMPLES = 10
+
+
+def run_benchmark(num_periods):
+    tracemalloc.start()
+    strategies, per_aggs = create_strats_and_aggs(SYMBOLS)
+    retain_period_history(strategies, per_aggs)
+
+    timeframe = list(per_aggs.values())[0].timeframe
+    period_gens = [synthetic_periods(timeframe, num_periods, seed) for seed in range(len(SYMBOLS))]
+    sample_every = num_periods // NUM_SAMPLES
+
+    samples = []
+    for i, periods in enumerate(zip(*period_gens)):
+        for symbol, period in zip(SYMBOLS, periods):
+            per_aggs[symbol].process_period(period)
+            strategies[symbol].update_analyzer_vals(per_aggs[symbol])
+            strategies[symbol].get_last_trace_points()
+            strategies[symbol].generate_signal()
+
+        if (i + 1) % sample_every == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            samples.append((i + 1, current))
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{len(SYMBOLS)} symbols, {num_periods} periods each")
+    for periods_done, current in samples:
+        print(f"{periods_done:10} periods {current / 1024:10.1f} KiB")
+
+    first, last = samples[0][1], samples[-1][1]
+    print(f"growth from first to last sample: {(last - first) / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB")
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_PERIODS)
@@ -0,0 +1,302 @@
+import json
+import os
+import platform
+import subprocess
+from argparse import ArgumentParser
+from datetime import datetime, time
+from multiprocessing import get_context
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import run_simulation
+from analyzers.arnaud_legoux_ma_analyzer import ALMAAnalyzer
+from analyzers.exponential_ma_analyzer import EMAAnalyzer
+from analyzers.least_squares_ma_analyzer import LSMAAnalyzer
+from analyzers.macd_analyzer import MACDAnalyzer
+from analyzers.parabolic_sar_analyzer import PSARAnalyzer
+from analyzers.simple_ma_analyzer import SMAAnalyzer
+from analyzers.weighted_volume_ma_analyzer import VWMAAnalyzer
+from benchmarks.synthetic import synthetic_quotes, synthetic_periods, write_period_files
+from utils.period_aggregator import PeriodAggregator, MultiTimeframeAggregator
+from utils.utils import periods_from_file, reduce_log_record_overhead
+
+# Throughput of quote aggregation, analyzer updates and simulation sweeps on synthetic data (see
+# benchmarks/synthetic.py), so it needs no network or data_sets files, along with the peak memory of each case.
+# Every case runs in a forked process of its own and builds its inputs there, the fastest of its repeats is kept.
+# Peak memory is how far the process's resident memory rose above where it was when the case started, it needs
+# Linux to reset the peak. Results are saved to benchmarks/results and compared with the latest saved result of
+# each case, or with the given results file
+# python -m benchmarks.bench_suite [--only aggregation analyzers simulation] [--repeat 3] [--compare results.json]
+
+GROUPS = ["aggregation", "analyzers", "simulation"]
+NUM_QUOTES = 400_000
+NUM_PERIODS = 20_000
+ANALYZER_LENGTHS = [5, 25, 45]
+MACD_LENGTHS = [(12, 26, 9), (25, 45, 15)]
+PSAR_STEPS = [(0.02, 0.2)]
+# Every window size the generate_*_strats grids use
+SIM_WINDOW_SIZES = [240, 180, 120, 60, 30, 15, 10, 5]
+SYMBOL = "AAPL"
+DATE = "2021-12-01"
+INITIAL_CASH = "30000.00"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# A case is flagged when its rate fell by more than this fraction since the compared run
+REGRESSION_THRESHOLD = 0.1
+
+
+class BenchmarkCase:
+    # prepare builds the case's inputs and returns a function that runs it once and returns the number of units
+    # processed and the seconds the measured part took
+    def __init__(self, name, unit, prepare):
+        self.name = name
+        self.unit = unit
+        self.prepare = prepare
+
+
+def aggregation_cases():
+    def period_aggregator(timeframe):
+        def prepare():
+            quotes = synthetic_quotes(NUM_QUOTES)
+            period_aggregator = PeriodAggregator(timeframe)
+
+            def run():
+                start = perf_counter()
+                for quote in quotes:
+                    period_aggregator.process_quote(quote)
+                return len(quotes), perf_counter() - start
+
+            return run
+
+        return prepare
+
+    def multi_timeframe_prepare():
+        quotes = synthetic_quotes(NUM_QUOTES)
+        aggregator = MultiTimeframeAggregator({n: PeriodAggregator(n) for n in SIM_WINDOW_SIZES})
+
+        def run():
+            start = perf_counter()
+            for quote in quotes:
+                aggregator.process_quote(quote)
+            return len(quotes), perf_counter() - start
+
+        return run
+
+    return [
+        BenchmarkCase("aggregation/PeriodAggregator 5s", "quotes/sec", period_aggregator(5)),
+        BenchmarkCase("aggregation/PeriodAggregator 240s", "quotes/sec", period_aggregator(240)),
+        BenchmarkCase(f"aggregation/MultiTimeframeAggregator {len(SIM_WINDOW_SIZES)} windows", "quotes/sec",
+                      multi_timeframe_prepare)
+    ]
+
+
+# Only update_values is timed, the periods are appended to the aggregator between updates the way
+# the live trader and the simulation's period loop do
+def analyzer_cases():
+    def prepare_analyzer(analyzer_class, args):
+        def prepare():
+            periods = list(synthetic_periods(5, NUM_PERIODS, 0))
+            analyzer = analyzer_class(*args)
+            analyzer.retain(2)
+            period_aggregator = PeriodAggregator(5)
+            period_aggregator.retain(analyzer.periods_needed())
+
+            def run():
+                seconds = 0
+                for period in periods:
+                    period_aggregator.process_period(period)
+                    start = perf_counter()
+                    analyzer.update_values(period_aggregator)
+                    seconds += perf_counter() - start
+                return len(periods), seconds
+
+            return run
+
+        return prepare
+
+    analyzers = [(c, (length,)) for c in [SMAAnalyzer, EMAAnalyzer, LSMAAnalyzer, VWMAAnalyzer, ALMAAnalyzer]
+                 for length in ANALYZER_LENGTHS]
+    analyzers += [(MACDAnalyzer, lengths) for lengths in MACD_LENGTHS]
+    analyzers += [(PSARAnalyzer, steps) for steps in PSAR_STEPS]
+
+    return [BenchmarkCase(f"analyzers/{c.__name__} {', '.join(map(str, args))}", "updates/sec",
+                          prepare_analyzer(c, args)) for c, args in analyzers]
+
+
+# A day of each generate_*_strats grid through run_simulation's period loop, updating the analyzers a period at a
+# time and with batch indicators the way sweeps are run, and through the GridEvaluator. A strategy period is a
+# period of the window a strategy's analyzers use, processed for that strategy. Reads the period files
+# write_period_files wrote to the working directory
+def simulation_cases():
+    def prepare_simulation(strategy_gen_function, batch_indicators, grid_signals):
+        def prepare():
+            if batch_indicators:
+                # Batch EMAs import scipy.signal on first use, a second that a sweep only pays once per worker
+                import scipy.signal
+
+            strategies, _, sim_analyzer_manager = strategy_gen_function(SYMBOL, INITIAL_CASH)
+            sim_analyzer_manager.subscribe_strategies(strategies.values())
+            strategy_periods = 0
+            for window_size, subscribers in sim_analyzer_manager.subscribers.items():
+                periods = periods_from_file(run_simulation.periods_file_name(SYMBOL, DATE, window_size))
+                strategy_periods += len(subscribers) * sum(p.end_time.time() < time(hour=21) for p in periods)
+
+            def run():
+                start = perf_counter()
+                run_simulation.sim_date_from_periods(SYMBOL, DATE, strategy_gen_function, True, INITIAL_CASH,
+                                                     batch_indicators=batch_indicators, grid_signals=grid_signals)
+                return strategy_periods, perf_counter() - start
+
+            return run
+
+        return prepare
+
+    grid_names = sorted(name for name in dir(run_simulation)
+                        if name.startswith("generate_") and name.endswith("_strats") and "generic" not in name)
+    cases = []
+    for grid_name in grid_names:
+        short_name = grid_name[len("generate_"):-len("_strats")]
+        strategy_gen_function = getattr(run_simulation, grid_name)
+        for mode, batch_indicators, grid_signals in [("per period", False, False), ("batch", True, False),
+                                                     ("grid", True, True)]:
+            cases.append(BenchmarkCase(f"simulation/{short_name} {mode}", "strategy periods/sec",
+                                       prepare_simulation(strategy_gen_function, batch_indicators, grid_signals)))
+
+    return cases
+
+
+# Resets the peak resident memory and returns the current, None if the kernel can't reset it
+def reset_peak_memory():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return read_memory_status("VmRSS")
+    except OSError:
+        return None
+
+
+# Bytes of a VmRSS or VmHWM line of /proc/self/status
+def read_memory_status(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+
+
+def measure_case(case, repeat, writer):
+    try:
+        best, units, peak = None, None, None
+        for i in range(repeat):
+            run = case.prepare()
+            memory = reset_peak_memory()
+            units, seconds = run()
+            if i == 0 and memory is not None:
+                peak = read_memory_status("VmHWM") - memory
+            best = seconds if best is None else min(best, seconds)
+
+        writer.send({"unit": case.unit, "rate": units / best, "seconds": best, "units": units, "peak_bytes": peak})
+    except Exception as e:
+        writer.send({"error": repr(e)})
+
+
+def run_case(case, repeat):
+    context = get_context("fork")
+    reader, writer = context.Pipe(duplex=False)
+    process = context.Process(target=measure_case, args=(case, repeat, writer))
+    process.start()
+    writer.close()
+    try:
+        return reader.recv()
+    except EOFError:
+        return {"error": f"exited with code {process.exitcode}"}
+    finally:
+        process.join()
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(RESULTS_DIR)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# The latest saved result of every case, so a run of only some groups doesn't hide the others
+def load_latest_results():
+    latest = {}
+    if not os.path.isdir(RESULTS_DIR):
+        return latest
+    for file_name in sorted(f for f in os.listdir(RESULTS_DIR) if f.endswith(".json")):
+        with open(os.path.join(RESULTS_DIR, file_name)) as results_file:
+            latest.update(json.load(results_file)["results"])
+    return latest
+
+
+def save_results(run):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    file_name = os.path.join(RESULTS_DIR, f"{datetime.now():%Y-%m-%dT%H-%M-%S}.json")
+    with open(file_name, "w") as results_file:
+        json.dump(run, results_file, indent=2)
+    return file_name
+
+
+def format_result(name, result, previous):
+    if "error" in result:
+        return f"{name:52} failed: {result['error']}"
+
+    peak = f"{result['peak_bytes'] / 2 ** 20:8.1f} MiB" if result["peak_bytes"] is not None else "         n/a"
+    line = f"{name:52} {result['rate']:14,.0f} {result['unit']:20} peak {peak}"
+    if previous is not None and "rate" in previous:
+        change = result["rate"] / previous["rate"] - 1
+        line += f"  {change:+7.1%}"
+        if change < -REGRESSION_THRESHOLD:
+            line += " regressed"
+    return line
+
+
+def run_suite(groups, repeat, compare_file_name):
+    if compare_file_name is not None:
+        with open(compare_file_name) as compare_file:
+            compared_results = json.load(compare_file)["results"]
+    else:
+        compared_results = load_latest_results()
+
+    group_cases = {"aggregation": aggregation_cases, "analyzers": analyzer_cases, "simulation": simulation_cases}
+    cases = [case for group in groups for case in group_cases[group]()]
+
+    print(f"{len(cases)} cases, best of {repeat}, compared with " +
+          (compare_file_name if compare_file_name is not None else "the latest saved results"))
+    results = {}
+    # The simulation reads its periods and writes its log relative to the working directory
+    working_dir = os.getcwd()
+    with TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        try:
+            os.makedirs("logs")
+            if "simulation" in groups:
+                write_period_files(synthetic_quotes(NUM_QUOTES), SYMBOL, DATE, SIM_WINDOW_SIZES)
+
+            for case in cases:
+                results[case.name] = run_case(case, repeat)
+                print(format_result(case.name, results[case.name], compared_results.get(case.name)))
+        finally:
+            os.chdir(working_dir)
+
+    file_name = save_results({
+        "time": datetime.now().isoformat(),
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"num_quotes": NUM_QUOTES, "num_periods": NUM_PERIODS, "repeat": repeat},
+        "results": results
+    })
+    print(f"Saved results to {file_name}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=GROUPS, help="Groups of cases to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each case, the fastest is kept")
+    parser.add_argument("--compare", help="Results file to compare with, by default the latest saved results")
+    args = parser.parse_args()
+
+    reduce_log_record_overhead()
+    run_suite(args.only, args.repeat, args.compare)
@@ -0,0 +1,38 @@
+from timeit import timeit
+from utils.timestamps import parse_timestamp, parse_timestamp_ns, parse_timestamp_strptime, parse_timestamps_ns
+
+# Micro-benchmark of the quote timestamp parsers
+# python -m benchmarks.bench_timestamps
+
+SAMPLES = [
+    "2021-12-01T14:30:00.123456789Z",
+    "2021-12-01T14:30:00.1234Z",
+    "2021-12-01T14:30:01Z",
+]
+NUM_TIMESTAMPS = 100_000
+
+
+def check_equivalent():
+    for ts in SAMPLES:
+        assert parse_timestamp(ts) == parse_timestamp_strptime(ts), ts
+        assert parse_timestamp_ns(ts) == int(parse_timestamps_ns([ts])[0]), ts
+
+
+def run_benchmarks():
+    check_equivalent()
+    timestamps = (SAMPLES * (NUM_TIMESTAMPS // len(SAMPLES) + 1))[:NUM_TIMESTAMPS]
+
+    results = {
+        "strptime (previous parse_timestamp)": timeit(lambda: [parse_timestamp_strptime(ts) for ts in timestamps], number=1),
+        "parse_timestamp": timeit(lambda: [parse_timestamp(ts) for ts in timestamps], number=1),
+        "parse_timestamp_ns": timeit(lambda: [parse_timestamp_ns(ts) for ts in timestamps], number=1),
+        "parse_timestamps_ns (column)": timeit(lambda: parse_timestamps_ns(timestamps), number=1),
+    }
+
+    baseline = results["strptime (previous parse_timestamp)"]
+    for name, seconds in results.items():
+        print(f"{name:40} {NUM_TIMESTAMPS / seconds:12,.0f} timestamps/sec {baseline / seconds:6.1f}x")
+
+
+if __name__ == '__main__':
+    run_benchmarks()
@@ -0,0 +1,100 @@
+import numpy as np
+import os
+from datetime import datetime, timedelta
+from random import Random
+from run_simulation import periods_file_name
+from utils.binary_store import PERIOD_DTYPE, binary_file_name, ns_to_datetimes
+from utils.period_aggregator import Period, PeriodAggregator
+from utils.quote import Quote
+from utils.shared_period_ring import to_ns
+from utils.timestamps import EPOCH
+
+# Synthetic market data for the benchmarks, so they need no network or data_sets files.
+# Quotes cover a day from the pre market to the close. They arrive at random, far more often in regular hours than
+# in the pre market and most often around the open and the close. The bid follows a random walk in cents with a
+# spread of a cent or more. Periods of every window size are aggregated from a day's quotes with PeriodAggregator
+
+PRE_MARKET_OPEN = timedelta(hours=9)
+MARKET_OPEN = timedelta(hours=14, minutes=30)
+MARKET_CLOSE = timedelta(hours=21)
+# Quotes per second in the pre market, in regular hours, and added at the open and close decaying over half an hour
+PRE_MARKET_RATE = 2
+MARKET_RATE = 15
+OPEN_CLOSE_BURST = 30
+
+
+# Relative quote rate of every second of the day from the pre market to the close
+def quote_rates():
+    seconds = np.arange(int((MARKET_CLOSE - PRE_MARKET_OPEN).total_seconds()))
+    since_open = seconds - (MARKET_OPEN - PRE_MARKET_OPEN).total_seconds()
+    until_close = (MARKET_CLOSE - PRE_MARKET_OPEN).total_seconds() - seconds
+    burst = OPEN_CLOSE_BURST * (np.exp(-np.abs(since_open) / 1800) + np.exp(-until_close / 1800))
+    return np.where(since_open < 0, PRE_MARKET_RATE, MARKET_RATE + burst)
+
+
+def synthetic_quotes(num_quotes, date=datetime(2021, 12, 1), seed=0, price=150.0):
+    rng = np.random.default_rng(seed)
+
+    # Every quote picks a second of the day in proportion to its rate, then a time within the second
+    rates = quote_rates()
+    seconds = np.sort(rng.choice(len(rates), size=num_quotes, p=rates / rates.sum()) + rng.random(num_quotes))
+    start_ns = (date + PRE_MARKET_OPEN - EPOCH) // timedelta(microseconds=1) * 1000
+    timestamps = ns_to_datetimes(start_ns + (seconds * 1e9).astype(np.int64))
+
+    steps = rng.choice([-1, 0, 1], size=num_quotes, p=[0.3, 0.4, 0.3])
+    bid_cents = np.maximum(np.round(price * 100) + np.cumsum(steps), 1)
+    bids = (bid_cents / 100).tolist()
+    asks = ((bid_cents + 1 + rng.geometric(0.7, size=num_quotes) - 1) / 100).tolist()
+    bid_sizes = (1 + rng.poisson(3, size=num_quotes)).tolist()
+    ask_sizes = (1 + rng.poisson(3, size=num_quotes)).tolist()
+
+    return [Quote(*fields) for fields in zip(timestamps, asks, ask_sizes, bids, bid_sizes)]
+
+
+# Closed periods of the quotes in one timeframe
+def aggregate_periods(quotes, timeframe):
+    period_aggregator = PeriodAggregator(timeframe)
+    for quote in quotes:
+        period_aggregator.process_quote(quote)
+    return list(period_aggregator.get_periods())
+
+
+# An endless looking session of periods, for benchmarks that need more periods than a day has
+def synthetic_periods(timeframe, num_periods, seed):
+    rand = Random(seed)
+    start = datetime(2021, 12, 1, 9, 0)
+    price = 100.0
+    for i in range(num_periods):
+        open_price = price
+        price = max(price + rand.gauss(0, 0.2), 1.0)
+        start_time = start + timedelta(seconds=i * timeframe)
+        yield Period(
+            timeframe,
+            start_time,
+            start_time + timedelta(seconds=timeframe),
+            open_price,
+            price,
+            max(open_price, price) + rand.random() * 0.1,
+            min(open_price, price) - rand.random() * 0.1,
+            rand.randint(100, 10_000)
+        )
+
+
+# Writes the periods of the quotes in every window size where run_simulation reads them from, relative to the
+# working directory, as binary files so loading them isn't what gets measured.
+# Returns {window_size: number of periods}
+def write_period_files(quotes, symbol, date, window_sizes):
+    num_periods = {}
+    for window_size in window_sizes:
+        periods = aggregate_periods(quotes, window_size)
+        out = np.empty(len(periods), dtype=PERIOD_DTYPE)
+        for i, period in enumerate(periods):
+            out[i] = (window_size, to_ns(period.start_time), to_ns(period.end_time), period.open, period.close,
+                      period.high, period.low, period.volume)
+
+        file_name = periods_file_name(symbol, date, window_size)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        np.save(binary_file_name(file_name), out)
+        num_periods[window_size] = len(periods)
+
+    return num_periods
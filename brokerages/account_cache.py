@@ -0,0 +1,74 @@
+from time import monotonic
+
+
+# Local view of the account's cash, positions and latest bids, so an order doesn't need REST requests to size it.
+# Fills from the trade update stream and quotes from the stream listener keep it current, and it is reconciled
+# against the account's REST state periodically
+class AccountCache:
+    def __init__(self):
+        self.cash = None
+        # {
+        #   symbol: quantity
+        # }
+        self.positions = {}
+        # {
+        #   symbol: bid price
+        # }
+        self.bids = {}
+        # Called with a symbol for its latest bid when the quotes are kept elsewhere, e.g. in the listener's
+        # shared memory, bids is used otherwise
+        self.quote_source = None
+        self.reconciled_at = None
+
+    def is_reconciled(self):
+        return self.reconciled_at is not None
+
+    # Replaces the cached account with the REST state, returns how the cache differed from it
+    def reconcile(self, open_positions, acct):
+        positions = {p["symbol"]: int(float(p["qty"])) for p in open_positions}
+        cash = float(acct.cash)
+
+        differences = []
+        if self.is_reconciled():
+            if round(cash, 2) != round(self.cash, 2):
+                differences.append(f"cash {self.cash} != {cash}")
+            for symbol in set(positions) | set(self.positions):
+                if positions.get(symbol) != self.positions.get(symbol):
+                    differences.append(f"{symbol} quantity {self.positions.get(symbol)} != {positions.get(symbol)}")
+
+        self.cash = cash
+        self.positions = positions
+        self.reconciled_at = monotonic()
+        return differences
+
+    def apply_trade_update(self, trade_update):
+        if trade_update["event"] not in ["fill", "partial_fill"]:
+            return
+
+        order = trade_update["order"]
+        symbol = order["symbol"]
+        qty = float(trade_update["qty"])
+        sign = 1 if order["side"] == "buy" else -1
+
+        if self.cash is not None:
+            self.cash -= sign * qty * float(trade_update["price"])
+
+        # position_qty is the position after the fill
+        if "position_qty" in trade_update:
+            quantity = int(float(trade_update["position_qty"]))
+        else:
+            quantity = self.positions.get(symbol, 0) + int(sign * qty)
+
+        if quantity == 0:
+            self.positions.pop(symbol, None)
+        else:
+            self.positions[symbol] = quantity
+
+    # Same signature as the stream listener's record_quote
+    def record_quote(self, symbol, quote, timestamp):
+        self.bids[symbol] = quote.bp
+
+    def get_latest_bid(self, symbol):
+        if self.quote_source is not None:
+            return self.quote_source(symbol)
+        return self.bids.get(symbol)
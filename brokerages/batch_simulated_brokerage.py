@@ -0,0 +1,215 @@
+import numpy as np
+from utils.utils import get_logger
+from exceptions import MissingPositionError, PositionAlreadyExistsError, TooManyPositionsError, NotEnoughCashError
+
+TRADE_DTYPE = np.dtype([
+    ("strategy", "<i8"),
+    ("quantity", "<i8"),
+    ("enter_value", "<f8"),
+    ("enter_time", "datetime64[us]"),
+    ("sell_value", "<f8"),
+    ("sell_time", "datetime64[us]"),
+    ("pct_profit", "<f8"),
+])
+
+
+# Simulated brokerage for every strategy of a sweep trading a single symbol. Cash, position and entry price are
+# held in arrays indexed by strategy, so marking every strategy to market is one operation per quote.
+# Strategies trade through the view returned by get_brokerage, which behaves like a SimulatedBrokerage
+class BatchSimulatedBrokerage:
+    def __init__(self, symbol, num_strategies, initial_cash, num_stocks=1, trade_capacity=1024):
+        self.symbol = symbol
+        self.initial_cash = float(initial_cash)
+        self.num_stocks = num_stocks
+        self.cash = np.full(num_strategies, self.initial_cash)
+        self.quantities = np.zeros(num_strategies, dtype=np.int64)
+        self.enter_values = np.zeros(num_strategies)
+        self.enter_times = np.empty(num_strategies, dtype="datetime64[us]")
+        self.num_buys = np.zeros(num_strategies, dtype=np.int64)
+        self.num_sells = np.zeros(num_strategies, dtype=np.int64)
+
+        # Every closed trade of every strategy, preallocated and doubled when full
+        self.trades = np.empty(trade_capacity, dtype=TRADE_DTYPE)
+        self.num_trades = 0
+
+        self.value = None
+        self.timestamp = None
+        self.logger = get_logger("sim_broker")
+
+    def get_brokerage(self, strategy_index):
+        return BatchBrokerageView(self, strategy_index)
+
+    def update_value(self, symb, value, timestamp):
+        self.value = value
+        self.timestamp = timestamp
+
+    def sell_stock(self, strategy_index, symb):
+        quantity = self.quantities[strategy_index]
+        if symb != self.symbol or quantity == 0:
+            self.logger.error("Attempted to sell position which does not exist: %s", symb)
+            raise MissingPositionError(symb)
+
+        self.logger.info("Selling quantity %s of position %s", quantity, symb)
+
+        enter_value = self.enter_values[strategy_index]
+        prof_value = (self.value * quantity) - (enter_value * quantity)
+        prof_percent = (self.value - enter_value) / enter_value * 100
+        self.logger.info("Profit value: %.2f, Profit percent: %.2f%%", prof_value, prof_percent)
+
+        self.quantities[strategy_index] = 0
+        self.cash[strategy_index] += self.value * quantity
+        self.num_sells[strategy_index] += 1
+        self.record_trade(strategy_index, quantity, enter_value, prof_percent)
+
+    # Open positions of each strategy, a strategy of the batch only ever holds its one symbol
+    def num_positions(self, strategy_indices):
+        return (self.quantities[strategy_indices] > 0).astype(np.int64)
+
+    def buy_stock(self, strategy_index, symb):
+        self.logger.debug("Starting stock buy for %s", symb)
+        num_positions = self.num_positions(strategy_index)
+        self.logger.debug("%s positions open", num_positions)
+
+        if symb == self.symbol and num_positions > 0:
+            self.logger.error("Attempted to buy position that was already open: %s", symb)
+            raise PositionAlreadyExistsError(symb)
+
+        if num_positions >= self.num_stocks:
+            self.logger.error("Number of open positions (%s) >= num stocks configured (%s)", num_positions, self.num_stocks)
+            raise TooManyPositionsError()
+
+        avail_cash = self.cash[strategy_index] / (self.num_stocks - num_positions)
+        self.logger.debug("Available cash for %s buy: %s", symb, avail_cash)
+        self.logger.debug("Latest bid price for %s: %s at %s", symb, self.value, self.timestamp)
+        quantity = int(avail_cash // self.value)
+
+        if quantity < 1:
+            self.logger.error("Not enough cash to buy stock: %s", symb)
+            raise NotEnoughCashError()
+
+        self.logger.info("Buying quantity %s of stock %s", quantity, symb)
+        self.quantities[strategy_index] = quantity
+        self.enter_values[strategy_index] = self.value
+        self.enter_times[strategy_index] = self.timestamp
+        self.cash[strategy_index] -= quantity * self.value
+        self.num_buys[strategy_index] += 1
+
+    # Vectorized buy_stock for several strategies at once, at the current value
+    def buy_stocks(self, strategy_indices):
+        num_positions = self.num_positions(strategy_indices)
+        if np.any(num_positions > 0):
+            self.logger.error("Attempted to buy position that was already open: %s", self.symbol)
+            raise PositionAlreadyExistsError(self.symbol)
+
+        if np.any(num_positions >= self.num_stocks):
+            self.logger.error("Number of open positions >= num stocks configured (%s)", self.num_stocks)
+            raise TooManyPositionsError()
+
+        avail_cash = self.cash[strategy_indices] / (self.num_stocks - num_positions)
+        quantities = (avail_cash // self.value).astype(np.int64)
+
+        if np.any(quantities < 1):
+            self.logger.error("Not enough cash to buy stock: %s", self.symbol)
+            raise NotEnoughCashError()
+
+        self.logger.info("Buying %s for %s strategies at %s", self.symbol, len(strategy_indices), self.value)
+        self.quantities[strategy_indices] = quantities
+        self.enter_values[strategy_indices] = self.value
+        self.enter_times[strategy_indices] = self.timestamp
+        self.cash[strategy_indices] -= quantities * self.value
+        self.num_buys[strategy_indices] += 1
+
+    # Vectorized sell_stock for several strategies at once, at the current value
+    def sell_stocks(self, strategy_indices):
+        quantities = self.quantities[strategy_indices]
+        if np.any(quantities == 0):
+            self.logger.error("Attempted to sell position which does not exist: %s", self.symbol)
+            raise MissingPositionError(self.symbol)
+
+        self.logger.info("Selling %s for %s strategies at %s", self.symbol, len(strategy_indices), self.value)
+        enter_values = self.enter_values[strategy_indices]
+        prof_percents = (self.value - enter_values) / enter_values * 100
+
+        self.quantities[strategy_indices] = 0
+        self.cash[strategy_indices] += self.value * quantities
+        self.num_sells[strategy_indices] += 1
+
+        while self.num_trades + len(strategy_indices) > len(self.trades):
+            self.trades = np.resize(self.trades, 2 * len(self.trades))
+
+        new_trades = self.trades[self.num_trades:self.num_trades + len(strategy_indices)]
+        new_trades["strategy"] = strategy_indices
+        new_trades["quantity"] = quantities
+        new_trades["enter_value"] = enter_values
+        new_trades["enter_time"] = self.enter_times[strategy_indices]
+        new_trades["sell_value"] = self.value
+        new_trades["sell_time"] = self.timestamp
+        new_trades["pct_profit"] = prof_percents
+        self.num_trades += len(strategy_indices)
+
+    def record_trade(self, strategy_index, quantity, enter_value, prof_percent):
+        if self.num_trades == len(self.trades):
+            self.trades = np.resize(self.trades, 2 * len(self.trades))
+
+        self.trades[self.num_trades] = (
+            strategy_index,
+            quantity,
+            enter_value,
+            self.enter_times[strategy_index],
+            self.value,
+            self.timestamp,
+            prof_percent
+        )
+        self.num_trades += 1
+
+    def get_equities(self):
+        return self.cash + (self.quantities * self.value)
+
+    # Same rounding to cents as SimulatedBrokerage.get_equity
+    def get_profit_pcts(self):
+        return (np.round(self.get_equities(), 2) - self.initial_cash) / self.initial_cash * 100
+
+    # Trades in the format of SimulatedBrokerage.trades
+    def get_trades(self, strategy_index):
+        trades = self.trades[:self.num_trades]
+        return [{
+            "symbol": self.symbol,
+            "quantity": quantity,
+            "enter_value": enter_value,
+            "enter_time": enter_time,
+            "sell_value": sell_value,
+            "sell_time": sell_time,
+            "pct_profit": f"{pct_profit:.3f}"
+        } for _, quantity, enter_value, enter_time, sell_value, sell_time, pct_profit
+            in trades[trades["strategy"] == strategy_index].tolist()]
+
+
+class BatchBrokerageView:
+    def __init__(self, batch_brokerage, strategy_index):
+        self.batch_brokerage = batch_brokerage
+        self.strategy_index = strategy_index
+
+    @property
+    def num_buys(self):
+        return int(self.batch_brokerage.num_buys[self.strategy_index])
+
+    @property
+    def num_sells(self):
+        return int(self.batch_brokerage.num_sells[self.strategy_index])
+
+    @property
+    def trades(self):
+        return self.batch_brokerage.get_trades(self.strategy_index)
+
+    def sell_stock(self, symb):
+        self.batch_brokerage.sell_stock(self.strategy_index, symb)
+
+    def buy_stock(self, symb):
+        self.batch_brokerage.buy_stock(self.strategy_index, symb)
+
+    def get_equity(self):
+        equity = self.batch_brokerage.get_equities()[self.strategy_index]
+        return f"{equity:.2f}"
+
+    def update_value(self, symb, value, timestamp):
+        self.batch_brokerage.update_value(symb, value, timestamp)
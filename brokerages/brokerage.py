@@ -1,5 +1,9 @@
+import asyncio
+from time import perf_counter
 from alpaca_trade_api.rest import APIError
+from brokerages.account_cache import AccountCache
 from exceptions import MissingPositionError, PositionAlreadyExistsError, TooManyPositionsError, NotEnoughCashError
+from utils.instrumentation import ORDER_SUBMIT
 from utils.utils import get_logger, get_alpaca_rest_api
 
 
@@ -9,6 +13,10 @@ class AlpacaBrokerage:
         self.num_stocks = num_stocks
         self.dry_run = dry_run
         self.api = get_alpaca_rest_api(self.account_type)
+        # Only used by the async order methods, the others always ask REST
+        self.cache = AccountCache()
+        # Records the ORDER_SUBMIT span of the async order methods if set
+        self.instrumentation = None
         self.logger = get_logger("broker")
 
     def get_position(self, symbol):
@@ -25,38 +33,87 @@ class AlpacaBrokerage:
         position = self.get_position(symb)
 
         if position is None:
-            self.logger.error(f"Attempted to sell position which does not exist: {symb}")
+            self.logger.error("Attempted to sell position which does not exist: %s", symb)
             raise MissingPositionError(symb)
 
-        self.logger.info(f"Selling quantity {position.qty} of position {symb}")
-        if not self.dry_run:
-            return self.api.close_position(symb, qty=position.qty)
+        return self.submit_sell(symb, position.qty)
 
     def buy_stock(self, symb):
-        self.logger.debug(f"Starting stock buy for {symb}")
+        self.logger.debug("Starting stock buy for %s", symb)
         open_positions = self.api.get("/positions")
-        self.logger.debug(f"{len(open_positions)} positions open")
+        acct = self.api.get_account()
+        latest_quote = self.api.get_latest_quote(symb)
+        open_symbols = [p["symbol"] for p in open_positions]
+        quantity = self.get_buy_quantity(symb, open_symbols, float(acct.cash), latest_quote.bp)
+        return self.submit_buy(symb, quantity, latest_quote.bp)
+
+    # buy_stock for an event loop, sized from the account cache so submitting the order is the only request.
+    # The latest quote is only requested if the listener hasn't seen one for the symbol yet
+    async def buy_stock_async(self, symb):
+        self.logger.debug("Starting stock buy for %s", symb)
+        if not self.cache.is_reconciled():
+            await self.reconcile_async()
+
+        bid = self.cache.get_latest_bid(symb)
+        if bid is None:
+            bid = (await asyncio.to_thread(self.api.get_latest_quote, symb)).bp
+
+        try:
+            quantity = self.get_buy_quantity(symb, list(self.cache.positions), self.cache.cash, bid)
+        except (PositionAlreadyExistsError, TooManyPositionsError):
+            # The cache may be behind the account, check against REST before giving up
+            await self.reconcile_async()
+            quantity = self.get_buy_quantity(symb, list(self.cache.positions), self.cache.cash, bid)
+
+        return await self.submit_async(self.submit_buy, symb, quantity, bid)
 
-        if any([p["symbol"] == symb for p in open_positions]):
-            self.logger.error(f"Attempted to buy position that was already open: {symb}")
+    async def sell_stock_async(self, symb):
+        if not self.cache.is_reconciled() or symb not in self.cache.positions:
+            await self.reconcile_async()
+
+        if symb not in self.cache.positions:
+            self.logger.error("Attempted to sell position which does not exist: %s", symb)
+            raise MissingPositionError(symb)
+
+        return await self.submit_async(self.submit_sell, symb, self.cache.positions[symb])
+
+    # Runs submit in a worker thread, timing only the request that submits the order
+    async def submit_async(self, submit, symb, *args):
+        submit_start = perf_counter()
+        order = await asyncio.to_thread(submit, symb, *args)
+        if self.instrumentation is not None:
+            self.instrumentation.record(ORDER_SUBMIT, symb, perf_counter() - submit_start)
+        return order
+
+    def get_buy_quantity(self, symb, open_symbols, cash, bid):
+        self.logger.debug("%s positions open", len(open_symbols))
+
+        if symb in open_symbols:
+            self.logger.error("Attempted to buy position that was already open: %s", symb)
             raise PositionAlreadyExistsError(symb)
 
-        if len(open_positions) >= self.num_stocks:
-            self.logger.error(f"Number of open positions ({len(open_positions)}) >= num stocks configured ({self.num_stocks})")
+        if len(open_symbols) >= self.num_stocks:
+            self.logger.error("Number of open positions (%s) >= num stocks configured (%s)", len(open_symbols), self.num_stocks)
             raise TooManyPositionsError()
 
-        acct = self.api.get_account()
-        avail_cash = float(acct.cash) / (self.num_stocks - len(open_positions))
-        self.logger.debug(f"Available cash for {symb} buy: {avail_cash}")
-        latest_quote = self.api.get_latest_quote(symb)
-        self.logger.debug(f"Latest bid price for {symb}: {latest_quote.bp}")
-        quantity = int(avail_cash // latest_quote.bp)
+        avail_cash = cash / (self.num_stocks - len(open_symbols))
+        self.logger.debug("Available cash for %s buy: %s", symb, avail_cash)
+        self.logger.debug("Latest bid price for %s: %s", symb, bid)
+        quantity = int(avail_cash // bid)
 
         if quantity < 1:
-            self.logger.error(f"Not enough cash to buy stock: {symb}")
+            self.logger.error("Not enough cash to buy stock: %s", symb)
             raise NotEnoughCashError()
 
-        self.logger.info(f"Buying quantity {quantity} of stock {symb}")
+        return quantity
+
+    def submit_sell(self, symb, quantity):
+        self.logger.info("Selling quantity %s of position %s", quantity, symb)
+        if not self.dry_run:
+            return self.api.close_position(symb, qty=quantity)
+
+    def submit_buy(self, symb, quantity, bid):
+        self.logger.info("Buying quantity %s of stock %s", quantity, symb)
         if not self.dry_run:
             # return self.api.submit_order(symb, qty=quantity, side="buy", type="market", time_in_force="day")
             return self.api.submit_order(
@@ -67,13 +124,48 @@ class AlpacaBrokerage:
                 order_class="oto",
                 time_in_force="day",
                 stop_loss={
-                    "stop_price": latest_quote.bp * 0.999
+                    "stop_price": bid * 0.999
                 }
             )
 
+    # Resets the account cache to the account's REST state, logging anything the cache had wrong
+    def reconcile(self):
+        open_positions = self.api.get("/positions")
+        acct = self.api.get_account()
+        self.log_differences(self.cache.reconcile(open_positions, acct))
+
+    async def reconcile_async(self):
+        open_positions, acct = await asyncio.gather(
+            asyncio.to_thread(self.api.get, "/positions"),
+            asyncio.to_thread(self.api.get_account)
+        )
+        self.log_differences(self.cache.reconcile(open_positions, acct))
+
+    def log_differences(self, differences):
+        for difference in differences:
+            self.logger.warning("Account cache was out of date: %s", difference)
+
+    def apply_trade_update(self, trade_update):
+        self.cache.apply_trade_update(trade_update)
+
+    def record_quote(self, symbol, quote, timestamp):
+        self.cache.record_quote(symbol, quote, timestamp)
+
+    def set_quote_source(self, quote_source):
+        self.cache.quote_source = quote_source
+
+    def set_instrumentation(self, instrumentation):
+        self.instrumentation = instrumentation
+
     def liquidate_and_cancel_all(self):
         self.logger.warn("Cancelling all open orders and liquidating all positions")
         return self.api.delete("/positions", data={"cancel_orders": True})
 
     def get_clock(self):
         return self.api.get_clock()
+
+    async def liquidate_and_cancel_all_async(self):
+        return await asyncio.to_thread(self.liquidate_and_cancel_all)
+
+    async def get_clock_async(self):
+        return await asyncio.to_thread(self.get_clock)
@@ -32,12 +32,12 @@ class SimulatedBrokerage:
 
     def sell_stock(self, symb):
         if symb not in self.positions:
-            self.logger.error(f"Attempted to sell position which does not exist: {symb}")
+            self.logger.error("Attempted to sell position which does not exist: %s", symb)
             raise MissingPositionError(symb)
 
         position = self.get_position(symb)
 
-        self.logger.info(f"Selling quantity {position['quantity']} of position {symb}")
+        self.logger.info("Selling quantity %s of position %s", position['quantity'], symb)
 
         last_quote = self.stock_values[symb]
         cur_val = last_quote["value"]
@@ -45,7 +45,7 @@ class SimulatedBrokerage:
 
         prof_value = (float(cur_val) * position["quantity"]) - (float(position["enter_value"]) * position["quantity"])
         prof_percent = (float(cur_val) - float(position["enter_value"])) / float(position["enter_value"]) * 100
-        self.logger.info(f"Profit value: {prof_value:.2f}, Profit percent: {prof_percent:.2f}%")
+        self.logger.info("Profit value: %.2f, Profit percent: %.2f%%", prof_value, prof_percent)
 
         del self.positions[symb]
         self.cash = str(float(self.cash) + (float(cur_val) * position["quantity"]))
@@ -62,31 +62,31 @@ class SimulatedBrokerage:
         self.trades.append(trade)
 
     def buy_stock(self, symb):
-        self.logger.debug(f"Starting stock buy for {symb}")
-        self.logger.debug(f"{len(self.positions)} positions open")
+        self.logger.debug("Starting stock buy for %s", symb)
+        self.logger.debug("%s positions open", len(self.positions))
 
         if symb in self.positions:
-            self.logger.error(f"Attempted to buy position that was already open: {symb}")
+            self.logger.error("Attempted to buy position that was already open: %s", symb)
             raise PositionAlreadyExistsError(symb)
 
         if len(self.positions) >= self.num_stocks:
-            self.logger.error(f"Number of open positions ({len(self.positions)}) >= num stocks configured ({self.num_stocks})")
+            self.logger.error("Number of open positions (%s) >= num stocks configured (%s)", len(self.positions), self.num_stocks)
             raise TooManyPositionsError()
 
         avail_cash = float(self.cash) / (self.num_stocks - len(self.positions))
-        self.logger.debug(f"Available cash for {symb} buy: {avail_cash}")
+        self.logger.debug("Available cash for %s buy: %s", symb, avail_cash)
 
         last_quote = self.stock_values[symb]
         cur_val = last_quote["value"]
         last_quote_timestamp = last_quote["timestamp"]
-        self.logger.debug(f"Latest bid price for {symb}: {cur_val} at {last_quote_timestamp}")
+        self.logger.debug("Latest bid price for %s: %s at %s", symb, cur_val, last_quote_timestamp)
         quantity = int(avail_cash // float(cur_val))
 
         if quantity < 1:
-            self.logger.error(f"Not enough cash to buy stock: {symb}")
+            self.logger.error("Not enough cash to buy stock: %s", symb)
             raise NotEnoughCashError()
 
-        self.logger.info(f"Buying quantity {quantity} of stock {symb}")
+        self.logger.info("Buying quantity %s of stock %s", quantity, symb)
         self.positions[symb] = {"quantity": quantity, "enter_value": cur_val, "enter_time": last_quote_timestamp}
         self.cash = str(float(self.cash) - (quantity * float(cur_val)))
         self.num_buys += 1
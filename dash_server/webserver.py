@@ -1,14 +1,32 @@
-from dash import dcc, html, Dash
-from dash.dependencies import Input, Output
+import numpy as np
+from collections import deque
+from dash import dcc, html, Dash, no_update, callback_context
+from dash.dependencies import Input, Output, State, ALL
 from datetime import datetime
+from flask import jsonify
+from itertools import islice
 from numpy import nan
+from threading import Lock
 import plotly.graph_objects as go
 from utils.utils import get_queue_items
 from utils.constants import TRACE_MODES
+from utils.downsample import minmax_indices
+from utils.latency_histogram import PERCENTILES
 
+DEFAULT_UPDATE_INTERVAL = 10
+# Points kept per symbol at full resolution, a day of 5 second periods from the pre market to the close
+DEFAULT_MAX_POINTS = 20_000
+# Width in pixels assumed for the graphs until the browser reports its own
+DEFAULT_VIEW_WIDTH = 1500
 
+
+# Figures are only built when the page loads, a symbol or trace is added, a graph is zoomed or has been extended
+# to twice the points its width can show. Every other update extends the figures with the points the browser
+# hasn't seen yet, so an update costs the same however long the session is.
+# Figures get a downsampled view of the full resolution history in the zoomed range, about one point per pixel.
+# The latest metrics snapshot of the trade manager is shown above the graphs and served as JSON at /metrics
 class TradeMonitorWebServer:
-    def __init__(self, update_queue):
+    def __init__(self, update_queue, update_interval=DEFAULT_UPDATE_INTERVAL, max_points=DEFAULT_MAX_POINTS):
         # {
         #   symbol: '',
         #   timestamp: '',
@@ -17,79 +35,244 @@ class TradeMonitorWebServer:
         #     ...
         #   }
         # }
+        # or {metrics: snapshot}, see LiveTradeManager.get_metrics_snapshot
         self.update_queue = update_queue
+        self.update_interval = update_interval
+        self.max_points = max_points
         # {
         #   symbol: {
-        #     timestamps: []
+        #     num_points: int,  # every point received, including those no longer kept
+        #     timestamps: deque
         #     traces: {
         #       trace_name: {
         #         trace_type: 'vwma'/'cost'/'psar'/etc,
-        #         data: []
+        #         data: deque
         #       }
         #     }
         #   }
         # }
         self.stock_data = {}
         self.buy_sell_points = {}
+        self.metrics = None
+        # Page loads and interval callbacks can run on different threads
+        self.lock = Lock()
 
         self.app = Dash(__name__)
-        self.app.layout = html.Div(children=[
+        # A function, so every page load gets figures of everything received so far
+        self.app.layout = self.build_layout
+
+        # The cursor store is the browser's view of the data:
+        # {
+        #   symbol: {
+        #     num_points: int,  # points received that the figure has seen
+        #     traces: [trace_name],
+        #     served: int,  # points in the figure's longest trace
+        #     x_range: [start, end]  # None unless zoomed
+        #   }
+        # }
+        @self.app.callback(
+            Output('graphs', 'children'),
+            Output('cursor', 'data'),
+            Output({'type': 'symbol_graph', 'symbol': ALL}, 'figure'),
+            Output({'type': 'symbol_graph', 'symbol': ALL}, 'extendData'),
+            Input('update_interval', 'n_intervals'),
+            Input({'type': 'symbol_graph', 'symbol': ALL}, 'relayoutData'),
+            State('cursor', 'data'),
+            State('view_width', 'data')
+        )
+        def _(n, relayouts, cursor, view_width):
+            graph_ids = [output['id'] for output in callback_context.outputs_list[2]]
+            triggered_id = callback_context.triggered_id
+            with self.lock:
+                self.pull_new_data()
+                if isinstance(triggered_id, dict) and cursor is not None and triggered_id['symbol'] in cursor:
+                    relayout = relayouts[graph_ids.index(triggered_id)]
+                    return self.zoom_graph(cursor, graph_ids, triggered_id['symbol'], relayout, view_width)
+                return self.update_graph_live(cursor, graph_ids, view_width)
+
+        @self.app.callback(
+            Output('metrics', 'children'),
+            Input('update_interval', 'n_intervals')
+        )
+        def _(n):
+            with self.lock:
+                self.pull_new_data()
+                return self.build_metrics_tables()
+
+        self.app.server.add_url_rule('/metrics', view_func=self.get_metrics)
+
+        # Graphs take the page's width
+        self.app.clientside_callback(
+            "function(n) { return window.innerWidth; }",
+            Output('view_width', 'data'),
+            Input('update_interval', 'n_intervals')
+        )
+
+    def build_layout(self):
+        with self.lock:
+            self.pull_new_data()
+            graphs, cursor = self.build_graphs(DEFAULT_VIEW_WIDTH)
+
+        return html.Div(children=[
             html.H1(children='Stock Trader Bot Monitor'),
             dcc.Interval(
                 id='update_interval',
-                interval=10 * 1000,  # Check for updates every 10 seconds
+                interval=self.update_interval * 1000,
                 n_intervals=0
             ),
-            html.Div(id='graphs', children=[])
+            dcc.Store(id='cursor', data=cursor),
+            dcc.Store(id='view_width', data=DEFAULT_VIEW_WIDTH),
+            html.Div(id='metrics', children=self.build_metrics_tables()),
+            html.Div(id='graphs', children=graphs)
         ])
 
-        @self.app.callback(Output('graphs', 'children'), Input('update_interval', 'n_intervals'))
-        def _(n):
-            self.pull_new_data()
-            return self.update_graph_live(n)
-
     def pull_new_data(self):
         for update in get_queue_items(self.update_queue):
+            if 'metrics' in update:
+                self.metrics = update['metrics']
+                continue
+
             symbol = update['symbol']
             if symbol not in self.stock_data:
                 self.stock_data[symbol] = {
-                    'timestamps': [],
+                    'num_points': 0,
+                    'timestamps': deque(maxlen=self.max_points),
                     'traces': {}
                 }
 
-            self.stock_data[symbol]['timestamps'].append(update['timestamp'])
+            data = self.stock_data[symbol]
+            data['num_points'] += 1
+            data['timestamps'].append(update['timestamp'])
 
             for trace_name, trace_data in update['trace_points'].items():
-                if trace_name not in self.stock_data[symbol]['traces']:
-                    self.stock_data[symbol]['traces'][trace_name] = {
+                if trace_name not in data['traces']:
+                    # Padded so every trace lines up with the timestamps
+                    data['traces'][trace_name] = {
                         'trace_type': trace_data['trace_type'],
-                        'data': []
+                        'data': deque([nan] * (len(data['timestamps']) - 1), maxlen=self.max_points)
                     }
 
-                self.stock_data[symbol]['traces'][trace_name]['data'].append(trace_data['point'])
+                data['traces'][trace_name]['data'].append(trace_data['point'])
+
+            for trace_name, trace in data['traces'].items():
+                if trace_name not in update['trace_points']:
+                    trace['data'].append(nan)
+
+    # Rebuilds the graphs if the browser is missing a symbol or trace, otherwise extends the figures or rebuilds
+    # those that have been extended too far
+    def update_graph_live(self, cursor, graph_ids, view_width):
+        if self.needs_rebuild(cursor, graph_ids):
+            graphs, cursor = self.build_graphs(view_width)
+            return graphs, cursor, [no_update] * len(graph_ids), [no_update] * len(graph_ids)
+
+        figures = []
+        extensions = []
+        for graph_id in graph_ids:
+            symbol = graph_id['symbol']
+            symbol_cursor = cursor[symbol]
+            num_new = self.stock_data[symbol]['num_points'] - symbol_cursor['num_points']
+
+            # A zoomed graph isn't extended, its figure is rebuilt when it is zoomed out
+            if num_new == 0 or symbol_cursor['x_range'] is not None:
+                figures.append(no_update)
+                extensions.append(no_update)
+            elif symbol_cursor['served'] + num_new > 2 * view_width:
+                figure, symbol_cursor['served'] = self.build_figure(symbol, self.stock_data[symbol], None, view_width)
+                figures.append(figure)
+                extensions.append(no_update)
+            else:
+                figures.append(no_update)
+                extensions.append(self.get_extension(symbol, symbol_cursor['num_points']))
+                symbol_cursor['served'] += min(num_new, len(self.stock_data[symbol]['timestamps']))
+
+            symbol_cursor['num_points'] = self.stock_data[symbol]['num_points']
 
-    def update_graph_live(self, num_intervals):
-        out_figures = []
+        return no_update, cursor, figures, extensions
+
+    # Rebuilds the figure of a graph the user zoomed or zoomed out of
+    def zoom_graph(self, cursor, graph_ids, symbol, relayout, view_width):
+        no_updates = [no_update] * len(graph_ids)
+        x_range = get_x_range(relayout, cursor[symbol]['x_range'])
+        if x_range == cursor[symbol]['x_range']:
+            return no_update, no_update, no_updates, no_updates
+
+        figure, served = self.build_figure(symbol, self.stock_data[symbol], x_range, view_width)
+        cursor[symbol].update({
+            'num_points': self.stock_data[symbol]['num_points'],
+            'served': served,
+            'x_range': x_range
+        })
+
+        figures = list(no_updates)
+        figures[graph_ids.index({'type': 'symbol_graph', 'symbol': symbol})] = figure
+        return no_update, cursor, figures, no_updates
+
+    def needs_rebuild(self, cursor, graph_ids):
+        if cursor is None or set(cursor) != set(self.stock_data) or len(graph_ids) != len(self.stock_data):
+            return True
+
+        return any(cursor[symbol]['traces'] != list(data['traces']) for symbol, data in self.stock_data.items())
+
+    # extendData for the points after num_points
+    def get_extension(self, symbol, num_points):
+        data = self.stock_data[symbol]
+        num_new = min(data['num_points'] - num_points, len(data['timestamps']))
+        if num_new <= 0:
+            return no_update
+
+        timestamps = last_items(data['timestamps'], num_new)
+        traces = list(data['traces'].values())
+        return (
+            {
+                'x': [timestamps] * len(traces),
+                'y': [last_items(trace['data'], num_new) for trace in traces]
+            },
+            list(range(len(traces)))
+        )
+
+    def build_graphs(self, view_width):
+        graphs = []
+        cursor = {}
         for symbol, data in self.stock_data.items():
-            figure = self.build_figure(symbol, data)
-            out_figures.append(
+            figure, served = self.build_figure(symbol, data, None, view_width)
+            graphs.append(
                 dcc.Graph(
-                    id=f"graph_{symbol}",
+                    id={'type': 'symbol_graph', 'symbol': symbol},
                     figure=figure
                 )
             )
-        return out_figures
+            cursor[symbol] = {
+                'num_points': data['num_points'],
+                'traces': list(data['traces']),
+                'served': served,
+                'x_range': None
+            }
+
+        return graphs, cursor
 
-    def build_figure(self, symbol, data):
+    # Returns the figure and the number of points in its longest trace
+    def build_figure(self, symbol, data, x_range, view_width):
         font = go.layout.title.Font(size=36)
         title = go.layout.Title(text=symbol, xanchor="center", xref="paper", x=0.5, font=font)
-        layout = go.Layout(title=title, titlefont=font)
+        # uirevision keeps the user's zoom when the figure is replaced
+        layout = go.Layout(title=title, titlefont=font, uirevision=symbol)
         fig = go.Figure(layout=layout)
 
+        timestamps = np.array(data['timestamps'], dtype="datetime64[us]")
+        start, end = 0, len(timestamps)
+        if x_range is not None:
+            # Along with the points either side, so the lines reach the edges of the graph
+            start = max(np.searchsorted(timestamps, np.datetime64(x_range[0], "us")) - 1, 0)
+            end = np.searchsorted(timestamps, np.datetime64(x_range[1], "us"), side="right") + 1
+
+        served = 0
         for trace_name, trace in data['traces'].items():
+            values = np.array(list(islice(trace['data'], start, end)), dtype=float)
+            indices = minmax_indices(values, max(view_width // 2, 1))
+            served = max(served, len(indices))
             fig.add_trace(go.Scatter(
-                x=data['timestamps'],
-                y=trace['data'],
+                x=timestamps[start:end][indices],
+                y=values[indices],
                 mode=TRACE_MODES[trace['trace_type']],
                 name=trace_name)
             )
@@ -107,12 +290,70 @@ class TradeMonitorWebServer:
             annotation_text="close"
         )
 
-        return fig
+        return fig, served
+
+    def get_metrics(self):
+        with self.lock:
+            self.pull_new_data()
+            return jsonify(self.metrics)
+
+    # Latency of every span across all symbols, then every symbol's quote rate, dropped periods and 99th percentile
+    # of each span
+    def build_metrics_tables(self):
+        if self.metrics is None:
+            return []
+
+        spans = self.metrics['spans']
+        stat_names = ['count', 'mean_ms'] + [f"p{p}_ms" for p in PERCENTILES] + ['max_ms']
+        span_rows = [[span] + [stats['all'][name] for name in stat_names] for span, stats in spans.items()]
+        dropped = self.metrics['dropped_periods']
+        symbol_rows = [[symbol, rate, dropped[symbol]] + [spans[span][symbol]['p99_ms'] for span in spans]
+                       for symbol, rate in self.metrics['quote_rates'].items()]
+
+        return [
+            html.H2(children=f"Latency at {self.metrics['time']}"),
+            build_table(['span'] + stat_names, span_rows),
+            build_table(['symbol', 'quotes/s', 'dropped'] + [f"{span} p99_ms" for span in spans], symbol_rows)
+        ]
 
     def start_server(self):
         self.app.run_server()
 
 
-def start_webserver_process(update_queue):
-    server = TradeMonitorWebServer(update_queue)
+def build_table(header, rows):
+    return html.Table([
+        html.Tr([html.Th(name) for name in header]),
+        *[html.Tr([html.Td(format_metric(value)) for value in row]) for row in rows]
+    ])
+
+
+def format_metric(value):
+    if value is None:
+        return ""
+    elif isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+# Walks from the end of the deque, islice would walk the whole history to reach the new points
+def last_items(items, num_items):
+    return list(islice(reversed(items), num_items))[::-1]
+
+
+# The x axis range of a graph's relayoutData, None once it is zoomed out and x_range if the x axis didn't change
+def get_x_range(relayout, x_range):
+    if relayout is None:
+        return x_range
+    elif relayout.get('xaxis.autorange'):
+        return None
+    elif 'xaxis.range[0]' in relayout:
+        return [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']]
+    elif 'xaxis.range' in relayout:
+        return relayout['xaxis.range']
+
+    return x_range
+
+
+def start_webserver_process(update_queue, update_interval=DEFAULT_UPDATE_INTERVAL, max_points=DEFAULT_MAX_POINTS):
+    server = TradeMonitorWebServer(update_queue, update_interval, max_points)
     server.start_server()
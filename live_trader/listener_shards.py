@@ -0,0 +1,145 @@
+import heapq
+from multiprocessing import Pipe
+from time import perf_counter
+from utils.shared_period_ring import SharedPeriodRing, WAKE_UP_TIMEOUT, wait_for_wake_up, to_ns
+
+# Splits the symbols across several listener processes, each with its own stream, aggregators and SharedPeriodRing,
+# and merges their periods back into end time order for the trade manager.
+# A shard's watermark is the time of the latest quote it processed. A period is released once every shard's
+# watermark has reached its end time, since no shard can then publish a period that ended earlier.
+# A shard that falls behind or goes quiet only holds the others' periods back for max_merge_delay seconds
+
+DEFAULT_MAX_MERGE_DELAY = 0.25
+
+
+# Round robin, so a symbol list ordered by activity spreads the busiest symbols across the shards
+def shard_symbols(symbols, num_shards):
+    shards = [symbols[i::num_shards] for i in range(num_shards)]
+    return [shard for shard in shards if len(shard) > 0]
+
+
+class ShardedPeriodReader:
+    def __init__(self, symbol_shards, max_merge_delay=DEFAULT_MAX_MERGE_DELAY):
+        # Every shard's ring wakes the same pipe, so the reader can wait on all of them at once
+        self.wake_reader, self.wake_writer = Pipe(duplex=False)
+        self.rings = [SharedPeriodRing(symbols, wake_pipe=(self.wake_reader, self.wake_writer))
+                      for symbols in symbol_shards]
+        self.symbol_rings = {symbol: ring for ring in self.rings for symbol in ring.symbols}
+        self.max_merge_delay = max_merge_delay
+        # Heap of (end time in ns, sequence, perf_counter when read, period message)
+        self.held = []
+        self.sequence = 0
+        self.last_released = 0
+        # Periods released after a period that ended later, because their shard was more than max_merge_delay behind
+        self.late = 0
+        # Local to the consumer, cleared by stop_reading to stop get_batch
+        self.reading = True
+        self.last_sample = (perf_counter(), [0] * len(self.rings))
+
+    # Same interface as SharedPeriodRing.get_batch, returns the periods that can be released in end time order
+    async def get_batch(self):
+        while self.reading:
+            ready = self.read_and_release()
+            if len(ready) > 0:
+                return ready
+
+            # Checked again after asking to be woken, in case a period or quote came in just before
+            self.set_wake_ups()
+            ready = self.read_and_release()
+            if len(ready) > 0:
+                self.clear_wake_ups()
+                return ready
+
+            await wait_for_wake_up(self.wake_reader, self.next_timeout())
+            self.clear_wake_ups()
+
+        self.hold()
+        return self.release(everything=True) + [None]
+
+    def read_and_release(self):
+        self.hold()
+        return self.release()
+
+    def hold(self):
+        now = perf_counter()
+        for ring in self.rings:
+            for msg in ring.get_all():
+                heapq.heappush(self.held, (to_ns(msg["period"].end_time), self.sequence, now, msg))
+                self.sequence += 1
+
+    def release(self, everything=False):
+        watermark = min(ring.get_watermark() for ring in self.rings)
+        expired = perf_counter() - self.max_merge_delay
+
+        ready = []
+        while len(self.held) > 0:
+            end_ns, _, read_time, msg = self.held[0]
+            if not (everything or end_ns <= watermark or read_time <= expired):
+                break
+
+            heapq.heappop(self.held)
+            if end_ns < self.last_released:
+                self.late += 1
+            else:
+                self.last_released = end_ns
+            ready.append(msg)
+
+        return ready
+
+    # Any new period wakes the reader, while periods are held it also wants to know when the shards
+    # behind them catch up. A missed wake up is bounded the same way as in SharedPeriodRing, and for held
+    # periods by max_merge_delay
+    def set_wake_ups(self):
+        for ring in self.rings:
+            ring.set_waiting(True)
+
+        if len(self.held) > 0:
+            end_ns = self.held[0][0]
+            for ring in self.rings:
+                if ring.get_watermark() < end_ns:
+                    ring.set_wake_at(end_ns)
+
+    def clear_wake_ups(self):
+        for ring in self.rings:
+            ring.set_waiting(False)
+            ring.set_wake_at(0)
+
+    def next_timeout(self):
+        if len(self.held) == 0:
+            return WAKE_UP_TIMEOUT
+
+        expires_in = self.held[0][2] + self.max_merge_delay - perf_counter()
+        return max(min(expires_in, WAKE_UP_TIMEOUT), 0)
+
+    def get_latest_bid(self, symbol):
+        return self.symbol_rings[symbol].get_latest_bid(symbol)
+
+    def stop_reading(self):
+        self.reading = False
+        self.wake_writer.send_bytes(b"")
+
+    # Per shard ring stats with the quote rate since the last call, how many periods the shards dropped in all,
+    # and how many periods are held or were late
+    def get_stats(self):
+        now = perf_counter()
+        last_time, last_quotes = self.last_sample
+        shards = []
+        for ring, previous_quotes in zip(self.rings, last_quotes):
+            stats = ring.get_stats()
+            stats["symbols"] = len(ring.symbols)
+            stats["quote_rate"] = (stats["quotes"] - previous_quotes) / (now - last_time)
+            shards.append(stats)
+
+        self.last_sample = (now, [stats["quotes"] for stats in shards])
+        return {
+            "shards": shards,
+            "dropped": sum(stats["dropped"] for stats in shards),
+            "held": len(self.held),
+            "late": self.late
+        }
+
+    def close(self):
+        for ring in self.rings:
+            ring.close()
+        self.wake_reader.close()
+        self.wake_writer.close()
@@ -1,22 +1,40 @@
+import asyncio
 from utils.utils import get_logger, get_alpaca_stream
 from datetime import datetime
+from time import perf_counter, time
 from utils.quote import Quote
 from utils.period_aggregator import PeriodAggregator
+from utils.instrumentation import QUOTE_RECEIVE, PERIOD_CLOSE
 
 
+# Aggregates the quote stream into periods and hands every finished period to publish_period, and every trade
+# update to publish_trade_update. In its own process periods go into a SharedPeriodRing and trade updates onto a
+# multiprocessing queue, in the same process as the LiveTradeManager the stream's thread hands them to the manager's
+# event loop, which puts them on its asyncio queues.
+# With several listener shards only one subscribes to trade updates, the others are given None for publish_trade_update.
+# record_quote, if given, is called with every quote after its periods are published.
+# instrumentation, if given, records the listener's spans and counts the quotes
 class StreamListener:
-    def __init__(self, account_type, period_queue, trade_update_queue, symbols, timeframe):
+    def __init__(self, account_type, publish_period, publish_trade_update, symbols, timeframe,
+                 stream_factory=get_alpaca_stream, record_quote=None, instrumentation=None):
         self.account_type = account_type
-        self.period_queue = period_queue
-        self.trade_update_queue = trade_update_queue
+        self.publish_period = publish_period
+        self.publish_trade_update = publish_trade_update
+        self.record_quote = record_quote
+        self.instrumentation = instrumentation
         self.symbols = symbols
+        self.stream_factory = stream_factory
+        self.stream = None
         self.period_aggregators = {s: PeriodAggregator(timeframe) for s in symbols}
+        # Only last_period is read
+        for period_aggregator in self.period_aggregators.values():
+            period_aggregator.retain(1)
         self.quote_counts = {}
         self.period_counts = {}
         self.logger = get_logger("stream_listener")
 
     async def trade_update_callback(self, trade_update):
-        self.trade_update_queue.put(trade_update._raw)
+        self.publish_trade_update(trade_update._raw)
 
     def get_quote_call_back(self, symbol):
         async def quote_callback(q):
@@ -25,12 +43,18 @@ class StreamListener:
         return quote_callback
 
     def process_quote(self, api_q, symbol):
+        received = perf_counter()
         self.quote_counts[symbol] = self.quote_counts.get(symbol, 0) + 1
 
         if symbol not in self.period_counts:
             self.period_counts[symbol] = 0
 
-        dt = datetime.utcfromtimestamp(api_q.timestamp.timestamp())
+        timestamp = api_q.timestamp.timestamp()
+        if self.instrumentation is not None:
+            self.instrumentation.count_quote(symbol)
+            self.instrumentation.record(QUOTE_RECEIVE, symbol, time() - timestamp)
+
+        dt = datetime.utcfromtimestamp(timestamp)
         quote = Quote(dt, float(api_q.ask_price), int(api_q.ask_size), float(api_q.bid_price), int(api_q.bid_size))
 
         period_aggregator = self.period_aggregators[symbol]
@@ -38,24 +62,55 @@ class StreamListener:
         finished_period = period_aggregator.process_quote(quote)
         if finished_period:
             self.period_counts[symbol] = self.period_counts.get(symbol, 0) + 1
-            self.logger.info(f"FINISHED {symbol} PERIOD {self.period_counts[symbol]}, {self.quote_counts[symbol]} QUOTES")
+            self.logger.info("FINISHED %s PERIOD %s, %s QUOTES", symbol, self.period_counts[symbol], self.quote_counts[symbol])
             self.quote_counts[symbol] = 0
 
-            period = period_aggregator.periods[-1]
+            period = period_aggregator.last_period
             msg = {
                 "symbol": symbol,
-                "period": period
+                "period": period,
+                # perf_counter of the quote that closed the period, for measuring latency downstream
+                "received": received
             }
-            self.period_queue.put(msg)
+            # Only a shared memory ring can be full, the period is dropped rather than holding up the stream
+            if self.publish_period(msg) is False:
+                self.logger.warning("Dropped %s period, the period ring is full", symbol)
+                if self.instrumentation is not None:
+                    self.instrumentation.count_dropped(symbol)
+            elif self.instrumentation is not None:
+                self.instrumentation.record(PERIOD_CLOSE, symbol, perf_counter() - received)
 
-    def start(self):
-        stream = get_alpaca_stream(self.account_type)
-        stream.subscribe_trade_updates(self.trade_update_callback)
+        if self.record_quote is not None:
+            self.record_quote(symbol, quote, timestamp)
+
+    def create_stream(self):
+        stream = self.stream_factory(self.account_type)
+        if self.publish_trade_update is not None:
+            stream.subscribe_trade_updates(self.trade_update_callback)
         for symbol in self.symbols:
             stream.subscribe_quotes(self.get_quote_call_back(symbol), symbol)
-        stream.run()
+        return stream
+
+    # Runs the stream on its own event loop, blocks until the stream stops
+    def start(self):
+        self.stream = self.create_stream()
+        self.stream.run()
+
+    # start for an event loop, the stream runs on its own event loop in a worker thread, so the callbacks and the
+    # publish functions are called from that thread. Returns once the stream stops
+    async def run(self):
+        self.stream = self.create_stream()
+        await asyncio.to_thread(self.stream.run)
+
+    # Stream.stop waits for the stream's event loop to take the stop
+    async def stop(self):
+        if self.stream is not None:
+            await asyncio.to_thread(self.stream.stop)
 
 
-def start_listener_process(account_type, signal_queue, trade_update_queue, symbols, timeframe):
-    stream_listener = StreamListener(account_type, signal_queue, trade_update_queue, symbols, timeframe)
+def start_listener_process(account_type, period_ring, trade_update_queue, symbols, timeframe,
+                           stream_factory=get_alpaca_stream):
+    publish_trade_update = trade_update_queue.put if trade_update_queue is not None else None
+    stream_listener = StreamListener(account_type, period_ring.put, publish_trade_update, symbols, timeframe,
+                                     stream_factory, period_ring.record_quote, period_ring.instrumentation)
     stream_listener.start()
@@ -1,26 +1,44 @@
+import asyncio
+import json
+from functools import partial
 from brokerages.brokerage import AlpacaBrokerage
-from live_trader.stream_listener import start_listener_process
+from live_trader.stream_listener import StreamListener, start_listener_process
 from multiprocessing import Process, Queue
-from time import sleep
 from datetime import datetime, timedelta
-from utils.utils import get_queue_items, get_logger
+from time import perf_counter
+from utils.utils import get_queue_items, get_logger, get_alpaca_stream
+from live_trader.listener_shards import ShardedPeriodReader, shard_symbols
 from exceptions import *
-from dash_server.webserver import start_webserver_process
+from dash_server.webserver import start_webserver_process, DEFAULT_UPDATE_INTERVAL
 from utils.constants import COST_TRACE
+from utils.instrumentation import Instrumentation, combine_instrumentations, LISTENER_SPANS, MANAGER_SPANS, \
+    QUEUE_TRANSIT, ANALYZER_UPDATE, SIGNAL, FILL, QUOTE_TO_ORDER
 
 
 class LiveTradeManager:
+    # single_process runs the stream listener on a thread of the manager's process instead of in a process of its own,
+    # periods then go straight to the strategies without being pickled through multiprocessing queues.
+    # Otherwise the symbols are split across listener_shards processes, each opening its own stream connection.
+    # dashboard_update_interval is the seconds between the dashboard's updates
     def __init__(self, account_type, symbols, strat_agg_gen_func, max_positions=1,
-                 dry_run=True, allow_margin=False, allow_shorting=False):
+                 dry_run=True, allow_margin=False, allow_shorting=False, single_process=False, brokerage=None,
+                 listener_shards=1, dashboard_update_interval=DEFAULT_UPDATE_INTERVAL):
         self.account_type = account_type
         self.symbols = symbols
         self.strat_agg_gen_func = strat_agg_gen_func
         self.max_positions = max_positions
-        self.brokerage = AlpacaBrokerage(self.account_type, max_positions, dry_run)
+        self.brokerage = brokerage if brokerage is not None else AlpacaBrokerage(self.account_type, max_positions, dry_run)
+        self.single_process = single_process
+        self.listener_shards = listener_shards
+        self.dashboard_update_interval = dashboard_update_interval
+        self.stream_factory = get_alpaca_stream
         self.period_queue = None
         self.trade_update_queue = None
         self.webserver_queue = None
-        self.listener_process = None
+        self.listener_processes = []
+        # Listener and the task running its stream in single process mode
+        self.listener = None
+        self.listener_task = None
         self.webserver_process = None
         self.period_aggregators = None
         self.strategies = None
@@ -37,6 +55,7 @@ class LiveTradeManager:
         #       order_id: str,
         #       state: str,
         #       side: str,  # e.g. buy or sell
+        #       submitted: float  # perf_counter when the order was submitted
         #   }
         # }
         self.open_orders = {}
@@ -47,92 +66,325 @@ class LiveTradeManager:
         self.next_close_utc = None
         self.next_clean_up_utc = None
         self.market_open = False
-        self.loop_time = 5
+        # Longest time between clock checks, the checks are otherwise scheduled for the next open, close or clean up
+        self.max_check_interval = 15 * 60
+        # Tasks waiting on the listener's queues
+        self.queue_readers = []
+        # Seconds between reconciling the brokerage's account cache with REST while the listener runs
+        self.reconcile_interval = 60
+        self.reconcile_task = None
+        # Held while orders are submitted, so trade updates are only applied once the order is being tracked
+        self.order_lock = None
+        # Latency histograms of the manager's spans, and of the listener's in single process mode, the listener
+        # processes record theirs in their period rings. Both are replaced every day
+        self.instrumentation = None
+        self.listener_instrumentation = None
+        # Sends a metrics snapshot to the dashboard every dashboard_update_interval while the listener runs
+        self.metrics_task = None
+        # perf_counter and quote counts of the last metrics snapshot, for the quote rates
+        self.last_metrics_sample = None
+        # Set by shutdown, ends the main loop
+        self.shutdown_requested = None
         self.logger = get_logger("live_trade_manager")
 
     def start_trading(self):
-        self.update_times()
         self.logger.debug("Starting main loop")
         self.start_webserver()
-        self.main_loop()
+        try:
+            asyncio.run(self.main_loop())
+        finally:
+            self.stop_webserver()
 
     def start_listener(self):
-        self.logger.info("Starting listener process")
-        self.trade_update_queue = Queue()
-        self.period_queue = Queue()
         strategies, per_aggs = self.strat_agg_gen_func(self.symbols)
         timeframe = list(per_aggs.values())[0].timeframe
         self.strategies = strategies
         self.period_aggregators = per_aggs
-        p_args = (self.account_type, self.period_queue, self.trade_update_queue, self.symbols, timeframe)
-        self.listener_process = Process(target=start_listener_process, args=p_args)
-        self.listener_process.start()
+        retain_period_history(strategies, per_aggs)
+        self.instrumentation = Instrumentation(self.symbols, MANAGER_SPANS)
+        self.brokerage.set_instrumentation(self.instrumentation)
+        self.last_metrics_sample = (perf_counter(), {})
+
+        if self.single_process:
+            self.logger.info("Starting listener")
+            self.trade_update_queue = asyncio.Queue()
+            self.period_queue = asyncio.Queue()
+            self.listener_instrumentation = Instrumentation(self.symbols, LISTENER_SPANS)
+            # The listener calls back from its stream's thread, the asyncio queues and the brokerage's account cache
+            # are only used from the loop. The quote is recorded after the periods it closed, as the loop runs
+            # callbacks in order
+            loop = asyncio.get_running_loop()
+            self.listener = StreamListener(self.account_type,
+                                           partial(loop.call_soon_threadsafe, self.period_queue.put_nowait),
+                                           partial(loop.call_soon_threadsafe, self.trade_update_queue.put_nowait),
+                                           self.symbols, timeframe, self.stream_factory,
+                                           partial(loop.call_soon_threadsafe, self.brokerage.record_quote),
+                                           self.listener_instrumentation)
+            self.listener_task = asyncio.create_task(self.listener.run())
+        else:
+            symbol_shards = shard_symbols(self.symbols, self.listener_shards)
+            self.logger.info("Starting %s listener processes", len(symbol_shards))
+            self.trade_update_queue = Queue()
+            # Periods come back through shared memory, trade updates are rare enough for a queue
+            self.period_queue = ShardedPeriodReader(symbol_shards)
+            for i, (symbols, period_ring) in enumerate(zip(symbol_shards, self.period_queue.rings)):
+                # Only the first shard subscribes to trade updates
+                trade_update_queue = self.trade_update_queue if i == 0 else None
+                p_args = (self.account_type, period_ring, trade_update_queue, symbols, timeframe, self.stream_factory)
+                listener_process = Process(target=start_listener_process, args=p_args)
+                listener_process.start()
+                self.listener_processes.append(listener_process)
+            # The listener processes keep the latest bids in the shared memory
+            self.brokerage.set_quote_source(self.period_queue.get_latest_bid)
+
+        self.queue_readers = [
+            asyncio.create_task(self.read_queue(self.period_queue, self.process_periods)),
+            asyncio.create_task(self.read_queue(self.trade_update_queue, self.update_position_states))
+        ]
+        self.reconcile_task = asyncio.create_task(self.reconcile_periodically())
+        self.metrics_task = asyncio.create_task(self.publish_metrics_periodically())
 
     def start_webserver(self):
         self.logger.info("Starting webserver process")
         self.webserver_queue = Queue()
-        p_args = (self.webserver_queue,)
+        p_args = (self.webserver_queue, self.dashboard_update_interval)
         self.webserver_process = Process(target=start_webserver_process, args=p_args)
         self.webserver_process.start()
 
-    def main_loop(self):
-        while True:
-            self.check_time()
+    def stop_webserver(self):
+        if self.webserver_process is not None:
+            self.webserver_process.terminate()
+            self.webserver_process.join()
+            self.webserver_process.close()
+            self.webserver_process = None
+
+    # Periods and trade updates are handled as soon as they arrive by the queue readers, this only wakes up
+    # when the market clock says something has to start or stop, or to shut down
+    async def main_loop(self):
+        self.order_lock = asyncio.Lock()
+        self.shutdown_requested = asyncio.Event()
+        await self.update_times()
+
+        while not self.shutdown_requested.is_set():
+            await self.check_time()
+            try:
+                await asyncio.wait_for(self.shutdown_requested.wait(), self.seconds_until_next_check())
+            except asyncio.TimeoutError:
+                pass
+
+        if self.listener_running():
+            await self.stop_listener()
 
-            if self.trade_update_queue is not None:
-                self.update_position_states()
+    def seconds_until_next_check(self):
+        cur_dt = datetime.utcnow()
+        check_times = [self.next_open_utc - timedelta(hours=4), self.next_open_utc, self.next_clean_up_utc,
+                       self.next_close_utc]
+        upcoming = [(t - cur_dt).total_seconds() for t in check_times if t > cur_dt]
+        # A second late so the comparisons in check_time have passed when it runs
+        return min(upcoming + [self.max_check_interval]) + 1
+
+    # Hands each batch of items to handler as soon as it arrives, along with anything else already queued.
+    # Multiprocessing queues are waited on from a worker thread. A None item stops the reader. Nothing is handled
+    # once a shutdown has been requested
+    async def read_queue(self, queue, handler):
+        while True:
+            if isinstance(queue, asyncio.Queue):
+                items = [await queue.get()]
+                while not queue.empty():
+                    items.append(queue.get_nowait())
+            elif isinstance(queue, ShardedPeriodReader):
+                items = await queue.get_batch()
+            else:
+                items = [await asyncio.to_thread(queue.get)]
+                items.extend(get_queue_items(queue))
+
+            stopped = None in items
+            if stopped:
+                items = items[:items.index(None)]
+
+            if len(items) > 0 and not self.shutting_down():
+                try:
+                    await handler(items)
+                except Exception:
+                    # The reader has to outlive a bad batch, or periods or trade updates stop for the rest of the day
+                    self.logger.exception("Failed to handle %s", handler.__name__)
+
+            if stopped:
+                return
+
+    # Under the order lock, so a reconcile can't overwrite fills applied while its requests were in flight
+    async def reconcile_periodically(self):
+        while True:
+            try:
+                async with self.order_lock:
+                    await self.brokerage.reconcile_async()
+            except Exception as e:
+                self.logger.error("Failed to reconcile account cache: %s", e)
 
-            if self.period_queue is not None:
-                self.process_periods()
+            await asyncio.sleep(self.reconcile_interval)
 
-            sleep(self.loop_time)
+    # A snapshot reads every histogram, so it's taken in a worker thread to keep the event loop free for periods.
+    # Cancelling waits for a snapshot in progress, it reads the period rings stopping the listener closes
+    async def publish_metrics_periodically(self):
+        while True:
+            await asyncio.sleep(self.dashboard_update_interval)
+            snapshot = asyncio.ensure_future(asyncio.to_thread(self.get_metrics_snapshot, update_sample=True))
+            try:
+                await asyncio.shield(snapshot)
+            except asyncio.CancelledError:
+                await snapshot
+                raise
+            self.webserver_queue.put({'metrics': snapshot.result()})
+
+    def get_listener_instrumentations(self):
+        if self.single_process:
+            return [self.listener_instrumentation]
+        return [ring.instrumentation for ring in self.period_queue.rings]
+
+    # Latency stats of every span across all symbols and per symbol, each symbol's quotes and quotes per second
+    # since the last published snapshot, and its periods the listener dropped because the period ring was full. buckets adds the recorded buckets of the spans across all symbols,
+    # update_sample starts the next snapshot's quote rates from this one
+    # {
+    #   time: '',
+    #   quotes: {symbol: int},
+    #   quote_rates: {symbol: float},
+    #   dropped_periods: {symbol: int},
+    #   spans: {
+    #     span: {
+    #       all: {count: int, mean_ms: float, p50_ms: float, ..., max_ms: float},
+    #       symbol: {...},
+    #       ...
+    #     }
+    #   }
+    # }
+    def get_metrics_snapshot(self, buckets=False, update_sample=False):
+        combined = combine_instrumentations([self.instrumentation] + self.get_listener_instrumentations())
+        now = perf_counter()
+        quotes = combined.get_quote_counts()
+        last_time, last_quotes = self.last_metrics_sample
+        if update_sample:
+            self.last_metrics_sample = (now, quotes)
+
+        return {
+            'time': datetime.utcnow().isoformat(),
+            'quotes': quotes,
+            'quote_rates': {s: (q - last_quotes.get(s, 0)) / (now - last_time) for s, q in quotes.items()},
+            'dropped_periods': combined.get_dropped_counts(),
+            'spans': combined.get_span_stats(buckets)
+        }
+
+    def dump_metrics(self):
+        file_name = f"logs/metrics_{datetime.utcnow():%Y-%m-%d}.json"
+        try:
+            with open(file_name, "w") as metrics_file:
+                json.dump(self.get_metrics_snapshot(buckets=True), metrics_file, indent=2)
+            self.logger.info("Wrote metrics to %s", file_name)
+        except OSError as e:
+            self.logger.error("Failed to write metrics: %s", e)
 
-    def check_time(self):
+    async def check_time(self):
         cur_dt = datetime.utcnow()
         if cur_dt > self.next_open_utc or cur_dt > self.next_close_utc:
-            self.update_times()
+            await self.update_times()
 
-        if self.listener_process is not None and self.next_clean_up_utc < cur_dt < self.next_close_utc:
-            self.stop_for_day()
-        elif self.listener_process is None and ((self.market_open and cur_dt < self.next_clean_up_utc) or cur_dt > self.next_open_utc - timedelta(hours=4)):
+        listener_stats = self.get_listener_stats()
+        if listener_stats is not None:
+            self.logger.info("Listener stats: %s", listener_stats)
+
+        if self.listener_running() and self.next_clean_up_utc < cur_dt < self.next_close_utc:
+            await self.stop_for_day()
+        elif not self.listener_running() and ((self.market_open and cur_dt < self.next_clean_up_utc) or cur_dt > self.next_open_utc - timedelta(hours=4)):
             self.start_listener()
 
-    def update_times(self):
-        clock = self.brokerage.get_clock()
+    async def update_times(self):
+        clock = await self.brokerage.get_clock_async()
         self.next_open_utc = datetime.utcfromtimestamp(clock.next_open.timestamp())
         self.next_close_utc = datetime.utcfromtimestamp(clock.next_close.timestamp())
         self.next_clean_up_utc = self.next_close_utc - timedelta(minutes=5)
         self.market_open = clock.is_open
-        self.logger.info(f"Market is {'open' if self.market_open else 'closed'}")
+        self.logger.info("Market is %s", 'open' if self.market_open else 'closed')
 
-    def stop_for_day(self):
+    async def stop_for_day(self):
         self.logger.info("Ending trading for the day")
-        self.brokerage.liquidate_and_cancel_all()
+        await self.brokerage.liquidate_and_cancel_all_async()
 
-        if self.listener_process is None or self.period_queue is None or self.trade_update_queue is None:
+        if not self.listener_running() or self.period_queue is None or self.trade_update_queue is None:
             self.logger.error("Attempting to shut down process and queues that don't exist")
             self.shutdown()
+            return
 
-        self.listener_process.terminate()
-        self.listener_process.join()
-        self.listener_process.close()
-        self.listener_process = None
+        self.dump_metrics()
 
-        self.trade_update_queue.close()
-        self.period_queue.close()
+        await self.stop_listener()
+        self.strategies = None
+
+    def listener_running(self):
+        return len(self.listener_processes) > 0 or self.listener_task is not None
+
+    async def stop_listener(self):
+        if self.listener_task is not None:
+            await self.listener.stop()
+            self.listener_task.cancel()
+            self.listener_task = None
+            self.listener = None
+        else:
+            self.stop_listener_processes()
+
+        self.reconcile_task.cancel()
+        self.reconcile_task = None
+        self.metrics_task.cancel()
+        await asyncio.gather(self.metrics_task, return_exceptions=True)
+        self.metrics_task = None
+        await self.stop_queue_readers()
+        if not self.single_process:
+            self.brokerage.set_quote_source(None)
+            self.logger.info("Listener stats: %s", self.period_queue.get_stats())
+            self.trade_update_queue.close()
+            self.period_queue.close()
         self.trade_update_queue = None
         self.period_queue = None
 
-        self.strategies = None
-
-    def update_position_states(self):
-        for trade_update in get_queue_items(self.trade_update_queue):
+    def stop_listener_processes(self):
+        for listener_process in self.listener_processes:
+            listener_process.terminate()
+            listener_process.join()
+            listener_process.close()
+        self.listener_processes = []
+
+    # Per shard quote rates, lag behind the market and period ring stats, None in single process mode
+    def get_listener_stats(self):
+        if self.single_process or self.period_queue is None:
+            return None
+        return self.period_queue.get_stats()
+
+    async def stop_queue_readers(self):
+        self.wake_queue_readers()
+        await asyncio.gather(*self.queue_readers)
+        self.queue_readers = []
+
+    # The readers block in queue.get, a None wakes them up and stops them
+    def wake_queue_readers(self):
+        for queue in [self.period_queue, self.trade_update_queue]:
+            if isinstance(queue, asyncio.Queue):
+                queue.put_nowait(None)
+            elif isinstance(queue, ShardedPeriodReader):
+                queue.stop_reading()
+            elif queue is not None:
+                queue.put(None)
+
+    async def update_position_states(self, trade_updates):
+        async with self.order_lock:
+            self.apply_trade_updates(trade_updates)
+
+    def apply_trade_updates(self, trade_updates):
+        for trade_update in trade_updates:
             do_nothing_events = ["new", "partial_fill", "pending_new", "stopped", "pending_cancel", "pending_replace",
                                  "calculated", "order_replace_rejected", "order_cancel_rejected", "done_for_day"]
             event = trade_update['event']
             order = trade_update['order']
+            self.brokerage.apply_trade_update(trade_update)
 
-            self.logger.info(f"Trade updated, symbol: {order['symbol']}, event: {event}, order id: {order['id']}")
+            self.logger.info("Trade updated, symbol: %s, event: %s, order id: %s", order['symbol'], event, order['id'])
             self.logger.debug(order)
 
             if event in do_nothing_events:
@@ -141,36 +393,48 @@ class LiveTradeManager:
                 self.fill_order(trade_update)
             elif event in ["cancelled", "rejected", "suspended", "replaced", "expired"]:
                 # TODO should probably deal with this more gracefully
-                self.logger.error(f"Order was killed with event: {event}, symbol: {order['symbol']}, order id: {order['id']}")
+                self.logger.error("Order was killed with event: %s, symbol: %s, order id: %s", event, order['symbol'], order['id'])
                 self.shutdown()
+                return
 
     def fill_order(self, trade_update):
         order = trade_update['order']
         symbol = order["symbol"]
         side = order["side"]
-        self.logger.info(f"Filling {order['side']} order for {symbol} of class {order['order_class']} and type {order['order_type']}")
+        self.logger.info("Filling %s order for %s of class %s and type %s", order['side'], symbol, order['order_class'], order['order_type'])
 
         # TODO shouldn't happen if I dont manually place any orders
         # open_order = self.open_orders[symbol]
         # if symbol not in self.open_orders or open_order['order_id'] != order['id']:
-        #     self.logger.error(f"Received update for non-tracked order: {symbol}, {order['id']}")
+        #     self.logger.error("Received update for non-tracked order: %s, %s", symbol, order['id'])
         #     self.shutdown()
 
-        self.open_orders.pop(symbol, None)
+        open_order = self.open_orders.pop(symbol, None)
+        if open_order is not None:
+            self.instrumentation.record(FILL, symbol, perf_counter() - open_order["submitted"])
+
         if side == "buy":
             self.positions[symbol]["entrance_price"] = float(trade_update['price'])
         elif side == "sell":
             self.positions.pop(order['symbol'], None)
 
-    def process_periods(self):
-        updated_symbols = set()
-        for per_msg in get_queue_items(self.period_queue):
+    async def process_periods(self, period_messages):
+        read = perf_counter()
+        # {
+        #   symbol: perf_counter of the quote that closed its latest period
+        # }
+        received = {}
+        for per_msg in period_messages:
             symbol = per_msg["symbol"]
             period = per_msg["period"]
-            updated_symbols.add(symbol)
+            received[symbol] = per_msg["received"]
+            self.instrumentation.record(QUEUE_TRANSIT, symbol, read - per_msg["received"])
+
+            update_start = perf_counter()
             self.period_aggregators[symbol].process_period(period)
             strategy = self.strategies[symbol]
             strategy.update_analyzer_vals(self.period_aggregators[symbol])
+            self.instrumentation.record(ANALYZER_UPDATE, symbol, perf_counter() - update_start)
 
             trace_points = strategy.get_last_trace_points()
             trace_points['cost'] = {
@@ -185,29 +449,41 @@ class LiveTradeManager:
             })
 
         buys = []
-        for symbol in updated_symbols:
+        sells = []
+        for symbol in received:
+            signal_start = perf_counter()
             signal = self.strategies[symbol].generate_signal()
+            self.instrumentation.record(SIGNAL, symbol, perf_counter() - signal_start)
             if signal == "buy" and symbol not in self.positions:
                 buys.append(symbol)
             elif signal == "sell" and symbol in self.positions:
-                self.exit_position(symbol)
+                sells.append(symbol)
 
-        if not self.market_open or \
-                len(buys) == 0 or \
-                len(self.positions) >= self.max_positions:
-            return
+        # Orders for different symbols are submitted concurrently
+        async with self.order_lock:
+            await asyncio.gather(*[self.exit_position(symbol, received[symbol]) for symbol in sells])
+
+            if not self.market_open or \
+                    len(buys) == 0 or \
+                    len(self.positions) >= self.max_positions:
+                return
 
-        best_buy_symbol = self.get_best_signal(buys)
-        self.enter_position(best_buy_symbol)
+            best_buy_symbol = self.get_best_signal(buys)
+            await self.enter_position(best_buy_symbol, received[best_buy_symbol])
 
-    def enter_position(self, symbol):
+    # received is the perf_counter of the quote that led to the order, if there was one
+    async def enter_position(self, symbol, received=None):
         if symbol in self.positions or len(self.positions) >= self.max_positions:
             return
 
-        self.logger.info(f"Entering {symbol} position")
+        self.logger.info("Entering %s position", symbol)
 
         try:
-            order = self.brokerage.buy_stock(symbol)
+            order = await self.brokerage.buy_stock_async(symbol)
+            submitted = self.record_order_submit(symbol, received)
+            if order is None:
+                # A dry run submits nothing to track
+                return
             self.positions[symbol] = {
                 "quantity": order.qty,
                 "entrance_price": None
@@ -215,33 +491,46 @@ class LiveTradeManager:
             self.open_orders[symbol] = {
                 "order_id": order.id,
                 "state": order.status,
-                "side": "buy"
+                "side": "buy",
+                "submitted": submitted
             }
         except (PositionAlreadyExistsError, TooManyPositionsError):
             self.synchronize_account()
         except NotEnoughCashError:
             pass
 
-    def exit_position(self, symbol):
+    async def exit_position(self, symbol, received=None):
         if symbol not in self.positions:
             return
         elif symbol in self.open_orders:
             # TODO this is unlikely, but should probably be handled more gracefully
-            self.logger.error(f"Attempted to sell position before buy order was filled symbol: {symbol}")
+            self.logger.error("Attempted to sell position before buy order was filled symbol: %s", symbol)
             self.shutdown()
+            return
 
-        self.logger.info(f"Exiting {symbol} position")
+        self.logger.info("Exiting %s position", symbol)
 
         try:
-            order = self.brokerage.sell_stock(symbol)
+            order = await self.brokerage.sell_stock_async(symbol)
+            submitted = self.record_order_submit(symbol, received)
+            if order is None:
+                return
             self.open_orders[symbol] = {
                 "order_id": order.id,
                 "state": order.status,
-                "side": "sell"
+                "side": "sell",
+                "submitted": submitted
             }
         except MissingPositionError:
             self.synchronize_account()
 
+    # Returns the perf_counter the order was submitted at. The brokerage records the ORDER_SUBMIT span itself
+    def record_order_submit(self, symbol, received):
+        submitted = perf_counter()
+        if received is not None:
+            self.instrumentation.record(QUOTE_TO_ORDER, symbol, submitted - received)
+        return submitted
+
     def get_best_signal(self, signals):
         # TODO implement signal strength and use that to decide
         return signals[0]
@@ -251,19 +540,21 @@ class LiveTradeManager:
         # self.logger.warn("Synchronizing account")
         self.logger.error("Synchronize not implemented")
         self.shutdown()
-        pass
 
+    # Ends the main loop, which then stops the listener and start_trading returns. It's called from the loop's
+    # tasks, including the queue readers stopping the listener waits for, so it only asks for the stop and its
+    # callers return straight after
     def shutdown(self):
-        self.logger.warn("Shutting down system")
-        if self.listener_process is not None:
-            self.listener_process.terminate()
-            self.listener_process.join()
-            self.listener_process.close()
+        self.logger.warning("Shutting down system")
+        if self.shutdown_requested is not None:
+            self.shutdown_requested.set()
 
-        if self.trade_update_queue is not None:
-            self.trade_update_queue.close()
+    def shutting_down(self):
+        return self.shutdown_requested is not None and self.shutdown_requested.is_set()
 
-        if self.period_queue is not None:
-            self.period_queue.close()
 
-        exit(0)
+# Bounds each symbol's aggregator to the longest trailing window its strategy's analyzers read, so the
+# session's memory doesn't grow with the number of periods
+def retain_period_history(strategies, period_aggregators):
+    for symbol, strategy in strategies.items():
+        period_aggregators[symbol].retain(max(a.periods_needed() for a in strategy.get_analyzers()))
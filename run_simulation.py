@@ -1,7 +1,9 @@
 from analyzers.weighted_volume_ma_analyzer import VWMAAnalyzer
 from brokerages.simulated_brokerage import SimulatedBrokerage
+from brokerages.batch_simulated_brokerage import BatchSimulatedBrokerage
 from datetime import datetime, time
-from utils.utils import format_datetime, get_alpaca_rest_api, quotes_from_file, periods_from_file
+from utils.utils import format_datetime, get_alpaca_rest_api, iter_quotes_from_file, periods_from_file, \
+    reduce_log_record_overhead
 from utils.constants import PAPER
 from utils.period_aggregator import PeriodAggregator, Period
 from strategies.trivial_strategy import TrivialStrategy
@@ -10,6 +12,7 @@ from strategies.generic_ma_slope_strategy import GenericSlopeStrategy
 from strategies.macd_crossover_strategy import MACDCrossStrategy
 from strategies.psar_strategy import PSARStrategy
 from strategies.psar_ma_cross_strategy import PSARCrossStrategy
+from strategies.grid_evaluator import GridEvaluator
 from analyzers.least_squares_ma_analyzer import LSMAAnalyzer
 from analyzers.exponential_ma_analyzer import EMAAnalyzer
 from analyzers.simple_ma_analyzer import SMAAnalyzer
@@ -17,19 +20,15 @@ from analyzers.macd_analyzer import MACDAnalyzer
 from analyzers.arnaud_legoux_ma_analyzer import ALMAAnalyzer
 from analyzers.parabolic_sar_analyzer import PSARAnalyzer
 from analyzers.simulation_analyzer_manager import SimulationAnalyzerManager
+from analyzers.analyzer_registry import AnalyzerRegistry
 import logging
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 from csv import DictWriter
 from tqdm import tqdm
 from pathlib import Path
-
-
-class Quote:
-    def __init__(self, t, ap, as_, bp, bs):
-        self.t = t
-        self.ap = ap
-        self.as_ = as_
-        self.bp = bp
-        self.bs = bs
+from contextlib import closing
+from itertools import takewhile
 
 
 def quotes_from_api(symb, start_date_str, end_date_str):
@@ -43,7 +42,7 @@ def quotes_from_api(symb, start_date_str, end_date_str):
 
 def generate_generic_ma_slope_strats(symbol, init_cash, ma_analyzer_class, strat_prefix):
     strategies = {}
-    analyzers = {}
+    registry = AnalyzerRegistry()
     window_sizes = [180, 120, 60, 30, 15, 10, 5]
     roll_lengths = [5, 10, 15, 20, 25, 30, 35, 40, 45]
     aggregators = {n: PeriodAggregator(n) for n in window_sizes}
@@ -51,19 +50,10 @@ def generate_generic_ma_slope_strats(symbol, init_cash, ma_analyzer_class, strat
     for window_size in window_sizes:
         for roll_length in roll_lengths:
             name = f"{strat_prefix}_slope_{window_size}_{roll_length}"
-            analyzer = ma_analyzer_class(roll_length)
-            analyzers[(window_size, roll_length)] = analyzer
+            analyzer = registry.get(window_size, ma_analyzer_class, roll_length)
             strategies[name] = GenericSlopeStrategy(SimulatedBrokerage(init_cash), symbol, analyzer)
 
-    sim_analyzers = {}
-    for k, a in analyzers.items():
-        window = k[0]
-        if window not in sim_analyzers:
-            sim_analyzers[window] = []
-
-        sim_analyzers[window].append(a)
-
-    return strategies, analyzers, SimulationAnalyzerManager(sim_analyzers, aggregators)
+    return strategies, registry.analyzers, SimulationAnalyzerManager(registry.get_sim_analyzers(), aggregators)
 
 
 def generate_sma_slope_strats(symbol, init_cash):
@@ -88,7 +78,7 @@ def generate_alma_slope_strats(symbol, init_cash):
 
 def generate_generic_ma_crossing_strats(symbol, init_cash, ma_analyzer_class, strat_prefix):
     strategies = {}
-    analyzers = {}
+    registry = AnalyzerRegistry()
     window_sizes = [180, 120, 60, 30, 15, 10, 5]
     roll_lengths = [5, 10, 15, 20, 25, 30, 35, 40, 45]
     length_pairs = {(a, b) for a in roll_lengths for b in roll_lengths if a < b}
@@ -97,29 +87,15 @@ def generate_generic_ma_crossing_strats(symbol, init_cash, ma_analyzer_class, st
     for window_size in window_sizes:
         for pair in length_pairs:
             name = f"{strat_prefix}_cross_{window_size}_{pair[0]}_{pair[1]}"
-            if (window_size, pair[0]) not in analyzers:
-                analyzers[(window_size, pair[0])] = ma_analyzer_class(pair[0])
-
-            if (window_size, pair[1]) not in analyzers:
-                analyzers[(window_size, pair[1])] = ma_analyzer_class(pair[1])
-
             strategy = GenericMACrossStrategy(
                 SimulatedBrokerage(init_cash),
                 symbol,
-                analyzers[(window_size, pair[0])],
-                analyzers[(window_size, pair[1])]
+                registry.get(window_size, ma_analyzer_class, pair[0]),
+                registry.get(window_size, ma_analyzer_class, pair[1])
             )
             strategies[name] = strategy
 
-    sim_analyzers = {}
-    for k, a in analyzers.items():
-        window = k[0]
-        if window not in sim_analyzers:
-            sim_analyzers[window] = []
-
-        sim_analyzers[window].append(a)
-
-    return strategies, analyzers, SimulationAnalyzerManager(sim_analyzers, aggregators)
+    return strategies, registry.analyzers, SimulationAnalyzerManager(registry.get_sim_analyzers(), aggregators)
 
 
 def generate_sma_crossing_strats(symbol, init_cash):
@@ -144,7 +120,7 @@ def generate_alma_crossing_strats(symbol, init_cash):
 
 def generate_macd_cross_strats(symbol, init_cash):
     strategies = {}
-    analyzers = {}
+    registry = AnalyzerRegistry()
     window_sizes = [180, 120, 60, 30, 15, 10, 5]
     lengths = [5, 10, 15, 20, 25, 30, 35, 40, 45]
     length_triples = {(a, b, c) for a in lengths for b in lengths for c in lengths if a < b < c}
@@ -153,8 +129,16 @@ def generate_macd_cross_strats(symbol, init_cash):
     for window_size in window_sizes:
         for triplet in length_triples:
             name = f"macd_cross_{window_size}_{triplet[1]}_{triplet[2]}_{triplet[0]}"
-            analyzer = MACDAnalyzer(aggregators[window_size], triplet[1], triplet[2], triplet[0])
-            analyzers[(window_size, triplet[1], triplet[2], triplet[0])] = analyzer
+            # MACDs with the same fast or slow length share the EMA computing it
+            analyzer = registry.get(
+                window_size,
+                MACDAnalyzer,
+                triplet[1],
+                triplet[2],
+                triplet[0],
+                fast_ema=registry.get(window_size, EMAAnalyzer, triplet[1]),
+                slow_ema=registry.get(window_size, EMAAnalyzer, triplet[2])
+            )
 
             strategy = MACDCrossStrategy(
                 SimulatedBrokerage(init_cash),
@@ -163,20 +147,12 @@ def generate_macd_cross_strats(symbol, init_cash):
             )
             strategies[name] = strategy
 
-    sim_analyzers = {}
-    for k, a in analyzers.items():
-        window = k[0]
-        if window not in sim_analyzers:
-            sim_analyzers[window] = []
-
-        sim_analyzers[window].append(a)
-
-    return strategies, analyzers, SimulationAnalyzerManager(sim_analyzers, aggregators)
+    return strategies, registry.analyzers, SimulationAnalyzerManager(registry.get_sim_analyzers(), aggregators)
 
 
 def generate_psar_strats(symbol, init_cash):
     strategies = {}
-    analyzers = {}
+    registry = AnalyzerRegistry()
     window_sizes = [180, 120, 60, 30, 15, 10, 5]
     step_sizes = [0.005, 0.01, 0.02, 0.03, 0.04, 0.05]
     max_steps = [0.1, 0.2, 0.3, 0.4, 0.5]
@@ -186,8 +162,7 @@ def generate_psar_strats(symbol, init_cash):
         for step_size in step_sizes:
             for max_step in max_steps:
                 name = f"psar_{window_size}_{step_size}_{max_step}"
-                analyzer = PSARAnalyzer(step_size, max_step)
-                analyzers[(window_size, name)] = analyzer
+                analyzer = registry.get(window_size, PSARAnalyzer, step_size, max_step)
 
                 strategy = PSARStrategy(
                     SimulatedBrokerage(init_cash),
@@ -196,20 +171,12 @@ def generate_psar_strats(symbol, init_cash):
                 )
                 strategies[name] = strategy
 
-    sim_analyzers = {}
-    for k, a in analyzers.items():
-        window = k[0]
-        if window not in sim_analyzers:
-            sim_analyzers[window] = []
-
-        sim_analyzers[window].append(a)
-
-    return strategies, analyzers, SimulationAnalyzerManager(sim_analyzers, aggregators)
+    return strategies, registry.analyzers, SimulationAnalyzerManager(registry.get_sim_analyzers(), aggregators)
 
 
 def generate_psar_ma_cross_strats(symbol, init_cash):
     strategies = {}
-    analyzers = {}
+    registry = AnalyzerRegistry()
     window_sizes = [240, 180]
     lengths = [25, 30, 35, 40]  # [5, 10, 15, 20, 25, 30, 35, 40, 45]
     step_sizes = [0.01, 0.02]  # [0.005, 0.01, 0.02, 0.03, 0.04, 0.05]
@@ -225,33 +192,16 @@ def generate_psar_ma_cross_strats(symbol, init_cash):
                     for source in sources:
                         name = f"psar_ma_cross_{window_size}_{pair[0]}_{pair[1]}_{step_size}_{max_step}_{source}"
 
-                        if (window_size, "ma", pair[0], source) not in analyzers:
-                            analyzers[(window_size, "ma", pair[0], source)] = VWMAAnalyzer(pair[0], source=source)
-
-                        if (window_size, "ma", pair[1], source) not in analyzers:
-                            analyzers[(window_size, "ma", pair[1], source)] = VWMAAnalyzer(pair[1], source=source)
-
-                        if (window_size, f"psar_{step_size}_{max_step}") not in analyzers:
-                            analyzers[(window_size, f"psar_{step_size}_{max_step}")] = PSARAnalyzer(step_size, max_step)
-
                         strategy = PSARCrossStrategy(
                             SimulatedBrokerage(init_cash),
                             symbol,
-                            analyzers[(window_size, f"psar_{step_size}_{max_step}")],
-                            analyzers[(window_size, "ma", pair[0], source)],
-                            analyzers[(window_size, "ma", pair[1], source)]
+                            registry.get(window_size, PSARAnalyzer, step_size, max_step),
+                            registry.get(window_size, VWMAAnalyzer, pair[0], source=source),
+                            registry.get(window_size, VWMAAnalyzer, pair[1], source=source)
                         )
                         strategies[name] = strategy
 
-    sim_analyzers = {}
-    for k, a in analyzers.items():
-        window = k[0]
-        if window not in sim_analyzers:
-            sim_analyzers[window] = []
-
-        sim_analyzers[window].append(a)
-
-    return strategies, analyzers, SimulationAnalyzerManager(sim_analyzers, aggregators)
+    return strategies, registry.analyzers, SimulationAnalyzerManager(registry.get_sim_analyzers(), aggregators)
 
 
 def get_all_aapl_2021_12_dates():
@@ -327,6 +277,37 @@ def write_stats(out_stats, dates, record_trades):
     write_csv_dict(trade_count_filename, base_field_names + ['avg_trade_count'], trade_count_rows)
 
 
+# Moves every strategy onto one BatchSimulatedBrokerage, so the whole sweep is marked to market with a single update
+def attach_batch_brokerage(symbol, strategies, initial_cash):
+    batch_brokerage = BatchSimulatedBrokerage(symbol, len(strategies), initial_cash)
+    for index, strategy in enumerate(strategies.values()):
+        strategy.brokerage = batch_brokerage.get_brokerage(index)
+
+    return batch_brokerage
+
+
+# {strategy_name: stats} for one date
+def get_date_stats(strategies, batch_brokerage):
+    profit_pcts = batch_brokerage.get_profit_pcts()
+    date_stats = {}
+    for index, name in enumerate(strategies.keys()):
+        date_stats[name] = {
+            "profit_pct": float(profit_pcts[index]),
+            "num_buys": int(batch_brokerage.num_buys[index]),
+            "num_sells": int(batch_brokerage.num_sells[index]),
+            "trades": batch_brokerage.get_trades(index)
+        }
+
+    return date_stats
+
+
+# Moves every strategy out of tracking, from then on they can trade
+def start_trading(strategies):
+    for strategy in strategies:
+        if strategy.state == "tracking":
+            strategy.state = "buy"
+
+
 def run_simulation(symbol, data_source, dates, strategy_gen_function, record_trades, disable_logging, initial_cash):
     # {
     #   analyzer_name: {
@@ -351,100 +332,164 @@ def run_simulation(symbol, data_source, dates, strategy_gen_function, record_tra
 
         additional_strats, analyzers, sim_analyzer_manager = strategy_gen_function(symbol, initial_cash)
         strategies.update(additional_strats)
+        batch_brokerage = attach_batch_brokerage(symbol, strategies, initial_cash)
+        sim_analyzer_manager.subscribe_strategies(strategies.values())
 
         logging.getLogger('sim_broker').disabled = disable_logging
 
-        hist_quotes = quotes_from_file(input_file_name)
-        # hist_quotes = quotes_from_api('AAPL', '2021-12-17T14:30:00', '2021-12-17T21:00:00')
+        # Reader -> aggregators and analyzers -> strategies, chained as generators so only one chunk of quotes is
+        # held in memory. Stopping at the close stops the reader as well
+        with closing(iter_quotes_from_file(input_file_name)) as hist_quotes:
+            # hist_quotes = quotes_from_api('AAPL', '2021-12-17T14:30:00', '2021-12-17T21:00:00')
+            trading_quotes = takewhile(lambda q: q.t.time() < time(hour=21), hist_quotes)
+            trading = False
+            last_quote = None
+
+            for quote, closed_window_sizes in tqdm(sim_analyzer_manager.process_quotes(trading_quotes)):
+                last_quote = quote
+
+                # A strategy's decision only changes when its analyzers do, or when it leaves tracking
+                if not trading and quote.t.time() >= time(hour=14, minute=30):
+                    trading = True
+                    start_trading(strategies.values())
+                    deciding_strategies = strategies.values()
+                elif len(closed_window_sizes) > 0:
+                    deciding_strategies = sim_analyzer_manager.get_subscribers(closed_window_sizes)
+                else:
+                    continue
+
+                batch_brokerage.update_value(symbol, quote.bp, quote.t)
+                for strategy in deciding_strategies:
+                    strategy.make_decision()
 
-        for quote in tqdm(hist_quotes):
-            # ts_time = datetime.strptime(quote.t.split('.')[0].replace('Z', ''), '%Y-%m-%dT%H:%M:%S').time()
-            ts_time = quote.t
+            # Strategies are only marked to market when they trade, so mark the end of day value
+            if last_quote is not None:
+                batch_brokerage.update_value(symbol, last_quote.bp, last_quote.t)
 
-            if ts_time.time() >= time(hour=21):
-                break
+        for name, stats in get_date_stats(strategies, batch_brokerage).items():
+            if name not in out_stats:
+                out_stats[name] = {}
 
-            # for analyzer in analyzers.values():
-            #     analyzer.process_quote(quote)
-            sim_analyzer_manager.process_quote(quote)
+            out_stats[name][date] = stats
 
-            for strategy in strategies.values():
-                strategy.brokerage.update_value(symbol, quote.bp, quote.t)
+    write_stats(out_stats, dates, record_trades)
 
-                if ts_time.time() >= time(hour=14, minute=30) and strategy.state == "tracking":
-                    strategy.state = "buy"
 
-                strategy.make_decision()
+def sim_date_from_periods(symbol, date, strategy_gen_function, disable_logging, initial_cash, batch_indicators=False,
+                          grid_signals=False):
+    # Returns {strategy_name: stats} for the date, runs in a worker process for parallel sweeps
+    logging.getLogger('sim_broker').disabled = disable_logging
 
-        for name, strategy in strategies.items():
-            if name not in out_stats:
-                out_stats[name] = {}
+    strategies = {
+        "trivial": TrivialStrategy(SimulatedBrokerage(initial_cash), symbol)
+    }
 
-            profit_percent = (float(strategy.brokerage.get_equity()) - float(initial_cash)) / float(initial_cash) * 100
-            out_stats[name][date] = {
-                "profit_pct": profit_percent,
-                "num_buys": strategy.brokerage.num_buys,
-                "num_sells": strategy.brokerage.num_sells,
-                "trades": strategy.brokerage.trades
-            }
+    additional_strats, analyzers, sim_analyzer_manager = strategy_gen_function(symbol, initial_cash)
+    strategies.update(additional_strats)
+    batch_brokerage = attach_batch_brokerage(symbol, strategies, initial_cash)
 
-    write_stats(out_stats, dates, record_trades)
+    if grid_signals:
+        sim_date_grid(symbol, date, strategies, sim_analyzer_manager, batch_brokerage)
+        return get_date_stats(strategies, batch_brokerage)
 
+    sim_analyzer_manager.subscribe_strategies(strategies.values())
+    trading = False
 
-def run_sim_from_periods(symbol, dates, strategy_gen_function, record_trades, disable_logging, initial_cash):
-    out_stats = {}
-    logging.getLogger('sim_broker').disabled = disable_logging
+    for period_size in sim_analyzer_manager.get_period_sizes():
+        periods = periods_from_file(periods_file_name(symbol, date, period_size))
 
-    for date in tqdm(dates):
-        strategies = {
-            "trivial": TrivialStrategy(SimulatedBrokerage(initial_cash), symbol)
-        }
+        if batch_indicators:
+            sim_analyzer_manager.precompute_series(period_size, periods, vectorized_only=True)
 
-        additional_strats, analyzers, sim_analyzer_manager = strategy_gen_function(symbol, initial_cash)
-        strategies.update(additional_strats)
+        for period in periods:
+            if period.end_time.time() >= time(hour=21):
+                break
 
-        period_sizes = sim_analyzer_manager.get_period_sizes()
+            sim_analyzer_manager.process_period(period)
+            batch_brokerage.update_value(symbol, period.close, period.end_time)
 
-        for period_size in period_sizes:
-            input_file_name = f"data_sets/2021-12/{symbol}/periods/{period_size}/{date}_periods_{period_size}.csv"
+            if not trading and period.end_time.time() >= time(hour=14, minute=30):
+                trading = True
+                start_trading(strategies.values())
+                deciding_strategies = strategies.values()
+            else:
+                deciding_strategies = sim_analyzer_manager.get_subscribers([period_size])
 
-            periods = periods_from_file(input_file_name)
+            for strategy in deciding_strategies:
+                strategy.make_decision()
 
-            for period in periods:
-                if period.end_time.time() >= time(hour=21):
-                    break
+    return get_date_stats(strategies, batch_brokerage)
 
-                sim_analyzer_manager.process_period(period)
 
-                for strategy in strategies.values():
-                    strategy.brokerage.update_value(symbol, period.close, period.end_time)
+# Same trades as the period loop above with batch indicators, but every analyzer's series is computed up front and
+# the strategies are evaluated a whole group at a time by a GridEvaluator, so no analyzer or make_decision runs per
+# period
+def sim_date_grid(symbol, date, strategies, sim_analyzer_manager, batch_brokerage):
+    all_periods = {}
+    for period_size in sim_analyzer_manager.get_period_sizes():
+        all_periods[period_size] = periods_from_file(periods_file_name(symbol, date, period_size))
+        sim_analyzer_manager.precompute_series(period_size, all_periods[period_size])
 
-                    if period.end_time.time() >= time(hour=14, minute=30) and strategy.state == "tracking":
-                        strategy.state = "buy"
+    grid = GridEvaluator(strategies, sim_analyzer_manager.analyzers, batch_brokerage)
+    trading = False
 
-                    strategy.make_decision()
+    for period_size, periods in all_periods.items():
+        for index, period in enumerate(periods):
+            if period.end_time.time() >= time(hour=21):
+                break
+
+            batch_brokerage.update_value(symbol, period.close, period.end_time)
+
+            if not trading and period.end_time.time() >= time(hour=14, minute=30):
+                grid.start_trading()
+                trading = True
+
+            grid.evaluate(period_size, index)
 
-            for name, strategy in strategies.items():
-                if name not in out_stats:
-                    out_stats[name] = {}
 
-                profit_percent = (float(strategy.brokerage.get_equity()) - float(initial_cash)) / float(initial_cash) * 100
-                out_stats[name][date] = {
-                    "profit_pct": profit_percent,
-                    "num_buys": strategy.brokerage.num_buys,
-                    "num_sells": strategy.brokerage.num_sells,
-                    "trades": strategy.brokerage.trades
-                }
+def periods_file_name(symbol, date, period_size):
+    return f"data_sets/2021-12/{symbol}/periods/{period_size}/{date}_periods_{period_size}.csv"
+
+
+def run_sim_from_periods(symbol, dates, strategy_gen_function, record_trades, disable_logging, initial_cash,
+                         batch_indicators=False, workers=1, grid_signals=False):
+    out_stats = {}
+    sim_args = (strategy_gen_function, disable_logging, initial_cash, batch_indicators, grid_signals)
+
+    # Dates are independent, so they are sharded across processes. Results are merged back in date order
+    # so the output is the same whatever the number of workers
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(sim_date_from_periods, symbol, date, *sim_args) for date in dates]
+            all_date_stats = [f.result() for f in tqdm(futures)]
+    else:
+        all_date_stats = [sim_date_from_periods(symbol, date, *sim_args) for date in tqdm(dates)]
+
+    for date, date_stats in zip(dates, all_date_stats):
+        for name, stats in date_stats.items():
+            if name not in out_stats:
+                out_stats[name] = {}
+
+            out_stats[name][date] = stats
 
     write_stats(out_stats, dates, record_trades)
 
 
 if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to shard dates across")
+    parser.add_argument("--grid", action="store_true", help="Evaluate strategies as stacked grids of signals")
+    args = parser.parse_args()
+
+    reduce_log_record_overhead()
     run_sim_from_periods(
         symbol="AAPL",
         dates=get_all_aapl_2021_12_dates(),
         strategy_gen_function=generate_psar_ma_cross_strats,
         disable_logging=True,
         initial_cash="30000.00",
-        record_trades=False
+        record_trades=False,
+        batch_indicators=True,
+        workers=args.workers,
+        grid_signals=args.grid
     )
@@ -4,6 +4,8 @@ from analyzers.parabolic_sar_analyzer import PSARAnalyzer
 from strategies.psar_ma_cross_strategy import PSARCrossStrategy
 from utils.period_aggregator import PeriodAggregator
 from utils.constants import PAPER
+from utils.utils import reduce_log_record_overhead
+from argparse import ArgumentParser
 
 
 def create_strats_and_aggs(symbols):
@@ -24,6 +26,16 @@ def create_strats_and_aggs(symbols):
 
 
 if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("--single-process", action="store_true",
+                        help="Run the stream listener on a thread of the trade manager instead of in its own process")
+    parser.add_argument("--listener-shards", type=int, default=1,
+                        help="Number of listener processes to split the symbols across, each opens its own stream")
+    parser.add_argument("--dashboard-interval", type=float, default=10,
+                        help="Seconds between updates of the dashboard's graphs")
+    args = parser.parse_args()
+    reduce_log_record_overhead()
+
     tracking_symbols = [
         "AAPL",
         "TSLA",
@@ -50,7 +62,10 @@ if __name__ == '__main__':
         max_positions=4,
         dry_run=False,
         allow_margin=False,
-        allow_shorting=False
+        allow_shorting=False,
+        single_process=args.single_process,
+        listener_shards=args.listener_shards,
+        dashboard_update_interval=args.dashboard_interval
     )
 
     live_trader.start_trading()
@@ -6,6 +6,10 @@ class GenericMACrossStrategy:
         self.long_ma_analyzer = long_ma_analyzer
         self.state = "tracking"
 
+        # make_decision reads averages[-2]
+        short_ma_analyzer.retain(2)
+        long_ma_analyzer.retain(2)
+
     def make_decision(self):
         for a in [self.short_ma_analyzer, self.long_ma_analyzer]:
             if len(a.averages) < 2 or a.averages[-2] is None:
@@ -5,6 +5,9 @@ class GenericSlopeStrategy:
         self.ma_analyzer = ma_analyzer
         self.state = "tracking"
 
+        # make_decision reads averages[-2]
+        ma_analyzer.retain(2)
+
     def make_decision(self):
         if len(self.ma_analyzer.averages) < 2 or self.ma_analyzer.averages[-2] is None:
             return
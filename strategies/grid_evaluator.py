@@ -0,0 +1,190 @@
+import numpy as np
+from strategies.generic_ma_crossover_strategy import GenericMACrossStrategy
+from strategies.generic_ma_slope_strategy import GenericSlopeStrategy
+from strategies.macd_crossover_strategy import MACDCrossStrategy
+from strategies.psar_strategy import PSARStrategy
+from strategies.psar_ma_cross_strategy import PSARCrossStrategy
+from strategies.psar_ma_slope_strategy import PSARSlopeStrategy
+from strategies.trivial_strategy import TrivialStrategy
+
+# Evaluates a whole sweep of strategies from their analyzers' precomputed series instead of calling
+# make_decision on every strategy for every period. Strategies of the same type and window size are
+# stacked into (num_periods, num_strategies) arrays of "has enough info", "buy signal" and "sell signal",
+# so each period only steps the buy/sell state machine of the group whose window closed.
+# Analyzers must have their series loaded, see SimulationAnalyzerManager.precompute_series
+
+TRACKING = 0
+BUY = 1
+SELL = 2
+
+
+class GridEvaluator:
+    def __init__(self, strategies, analyzers, batch_brokerage):
+        self.batch_brokerage = batch_brokerage
+        self.states = np.full(len(strategies), TRACKING, dtype=np.int8)
+
+        # {
+        #    window_size: [(strategy_indices, can_trade, buy_signals, sell_signals)]
+        # }
+        # Strategies without analyzers are under None and evaluated for every period
+        self.groups = {}
+        # {
+        #    window_size: index of the window's latest period
+        # }
+        self.rows = {}
+        self.evaluate_all = False
+
+        analyzer_windows = {id(a): window_size for window_size, window in analyzers.items() for a in window}
+        by_type = {}
+        for index, strategy in enumerate(strategies.values()):
+            key = (type(strategy), get_window_size(strategy, analyzer_windows))
+            by_type.setdefault(key, []).append(index)
+
+        strategy_list = list(strategies.values())
+        for (strategy_type, window_size), indices in by_type.items():
+            if strategy_type not in GRID_SIGNALS:
+                raise ValueError(f"No grid signals for {strategy_type.__name__}")
+
+            signals = GRID_SIGNALS[strategy_type]([strategy_list[i] for i in indices])
+            self.groups.setdefault(window_size, []).append((np.array(indices), *signals))
+            self.rows[window_size] = 0 if window_size is None else -1
+
+    # Equivalent of moving every strategy out of tracking, the next evaluate also lets the strategies of
+    # the other windows act on their latest period
+    def start_trading(self):
+        self.states[self.states == TRACKING] = BUY
+        self.evaluate_all = True
+
+    # Called after the period at index of window_size closed, once the brokerage has its close
+    def evaluate(self, window_size, index):
+        self.rows[window_size] = index
+
+        if self.evaluate_all:
+            self.evaluate_all = False
+            window_sizes = self.groups.keys()
+        else:
+            window_sizes = [window_size, None]
+
+        for w in window_sizes:
+            row = self.rows.get(w, -1)
+            if row < 0:
+                continue
+
+            for group in self.groups.get(w, []):
+                self.step(row, *group)
+
+    def step(self, row, indices, can_trade, buy_signals, sell_signals):
+        states = self.states[indices]
+        can_trade = can_trade[row]
+
+        buying = indices[can_trade & buy_signals[row] & (states == BUY)]
+        selling = indices[can_trade & sell_signals[row] & (states == SELL)]
+
+        if len(buying) > 0:
+            self.batch_brokerage.buy_stocks(buying)
+            self.states[buying] = SELL
+
+        if len(selling) > 0:
+            self.batch_brokerage.sell_stocks(selling)
+            self.states[selling] = BUY
+
+
+def get_window_size(strategy, analyzer_windows):
+    for value in vars(strategy).values():
+        if id(value) in analyzer_windows:
+            return analyzer_windows[id(value)]
+
+    return None
+
+
+# Index of the last non NaN value at or before each position, -1 before the first one
+def last_valid_indices(values):
+    indices = np.where(np.isnan(values), -1, np.arange(len(values)))
+    return np.maximum.accumulate(indices) if len(indices) > 0 else indices
+
+
+def take(values, indices, fill):
+    return np.where(indices >= 0, values[np.maximum(indices, 0)], fill)
+
+
+# What averages, averages[-1] and averages[-2] hold after each period, given how replay_values appends
+def averages_view(series):
+    last = last_valid_indices(series)
+    prev = np.where(last > 0, last[np.maximum(last - 1, 0)], -1)
+    return np.cumsum(~np.isnan(series)), take(series, last, np.nan), take(series, prev, np.nan)
+
+
+# What psar_analyzer.sars and is_rising hold after each period
+def psar_view(series):
+    last = last_valid_indices(series["sar"])
+    return last >= 0, take(series["is_rising"], last, False)
+
+
+def stack_views(analyzers, view):
+    cache = {}
+    for analyzer in analyzers:
+        if id(analyzer) not in cache:
+            cache[id(analyzer)] = view(analyzer.series)
+
+    views = [cache[id(a)] for a in analyzers]
+    return [np.column_stack(column) for column in zip(*views)]
+
+
+def ma_cross_signals(strategies):
+    short_counts, short_vals, _ = stack_views([s.short_ma_analyzer for s in strategies], averages_view)
+    long_counts, long_vals, _ = stack_views([s.long_ma_analyzer for s in strategies], averages_view)
+
+    can_trade = (short_counts >= 2) & (long_counts >= 2)
+    return can_trade, short_vals > long_vals, short_vals < long_vals
+
+
+def slope_signals(strategies):
+    counts, last_vals, prev_vals = stack_views([s.ma_analyzer for s in strategies], averages_view)
+    slopes = last_vals - prev_vals
+    return counts >= 2, slopes > 0, slopes < 0
+
+
+def macd_signals(strategies):
+    analyzers = [s.macd_analyzer for s in strategies]
+    macd_vals = np.column_stack([take(a.series["macd"], last_valid_indices(a.series["macd"]), np.nan)
+                                 for a in analyzers])
+    signal_vals = np.column_stack([a.series["signal"] for a in analyzers])
+
+    # signal_values gets a value, possibly None, for every period
+    can_trade = ~np.isnan(signal_vals)
+    can_trade[0] = False
+    return can_trade, macd_vals > signal_vals, macd_vals < signal_vals
+
+
+def psar_signals(strategies):
+    has_sars, is_rising = stack_views([s.psar_analyzer for s in strategies], psar_view)
+    return has_sars, is_rising, ~is_rising
+
+
+def psar_cross_signals(strategies):
+    has_sars, is_rising = stack_views([s.psar_analyzer for s in strategies], psar_view)
+    can_trade, above, below = ma_cross_signals(strategies)
+    return has_sars & can_trade, is_rising & above, ~is_rising & below
+
+
+def psar_slope_signals(strategies):
+    has_sars, is_rising = stack_views([s.psar_analyzer for s in strategies], psar_view)
+    can_trade, rising_slope, falling_slope = slope_signals(strategies)
+    return has_sars & can_trade, is_rising & rising_slope, ~is_rising & falling_slope
+
+
+# Buys on the first period it can and never sells
+def trivial_signals(strategies):
+    shape = (1, len(strategies))
+    return np.ones(shape, dtype=bool), np.ones(shape, dtype=bool), np.zeros(shape, dtype=bool)
+
+
+GRID_SIGNALS = {
+    GenericMACrossStrategy: ma_cross_signals,
+    GenericSlopeStrategy: slope_signals,
+    MACDCrossStrategy: macd_signals,
+    PSARStrategy: psar_signals,
+    PSARCrossStrategy: psar_cross_signals,
+    PSARSlopeStrategy: psar_slope_signals,
+    TrivialStrategy: trivial_signals,
+}
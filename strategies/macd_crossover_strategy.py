@@ -5,6 +5,9 @@ class MACDCrossStrategy:
         self.macd_analyzer = macd_analyzer
         self.state = "tracking"
 
+        # make_decision needs at least two signal values
+        macd_analyzer.retain(2)
+
     def make_decision(self):
         if len(self.macd_analyzer.signal_values) < 2 or self.macd_analyzer.signal_values[-1] is None:
             return
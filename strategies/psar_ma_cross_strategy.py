@@ -10,6 +10,11 @@ class PSARCrossStrategy:
         self.long_ma_analyzer = long_ma_analyzer
         self.state = "tracking"
 
+        # Decisions read the latest SAR and averages[-2]
+        psar_analyzer.retain(1)
+        short_ma_analyzer.retain(2)
+        long_ma_analyzer.retain(2)
+
     def update_analyzer_vals(self, period_aggregator):
         self.psar_analyzer.update_values(period_aggregator)
         self.short_ma_analyzer.update_values(period_aggregator)
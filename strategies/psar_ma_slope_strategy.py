@@ -6,6 +6,10 @@ class PSARSlopeStrategy:
         self.ma_analyzer = ma_analyzer
         self.state = "tracking"
 
+        # make_decision reads the latest SAR and averages[-2]
+        psar_analyzer.retain(1)
+        ma_analyzer.retain(2)
+
     def make_decision(self):
         if len(self.psar_analyzer.sars) == 0 or \
                 len(self.ma_analyzer.averages) < 2 or \
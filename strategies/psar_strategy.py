@@ -5,6 +5,9 @@ class PSARStrategy:
         self.psar_analyzer = psar_analyzer
         self.state = "tracking"
 
+        # make_decision reads the latest SAR
+        psar_analyzer.retain(1)
+
     def make_decision(self):
         if len(self.psar_analyzer.sars) == 0:
             return
@@ -0,0 +1,25 @@
+import os
+import pytest
+from benchmarks.synthetic import synthetic_quotes, write_period_files
+
+SYMBOL = "AAPL"
+DATE = "2021-12-01"
+INITIAL_CASH = "30000.00"
+NUM_QUOTES = 100_000
+# Every window size the generate_*_strats grids use
+WINDOW_SIZES = [240, 180, 120, 60, 30, 15, 10, 5]
+
+
+# A working directory holding a synthetic day of periods where run_simulation reads them, and the logs directory
+# the brokerages log to
+@pytest.fixture(scope="session")
+def sim_data_dir(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("sim_data")
+    working_dir = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        os.makedirs("logs")
+        write_period_files(synthetic_quotes(NUM_QUOTES), SYMBOL, DATE, WINDOW_SIZES)
+        yield data_dir
+    finally:
+        os.chdir(working_dir)
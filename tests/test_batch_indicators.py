@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import run_simulation
+from tests.conftest import SYMBOL, DATE, INITIAL_CASH
+from utils.utils import periods_from_file
+
+GRIDS = sorted(name for name in dir(run_simulation)
+               if name.startswith("generate_") and name.endswith("_strats") and "generic" not in name)
+
+
+# MACD holds None until its signal line starts. Its values are differences of averages close to zero, hence the
+# absolute tolerance next to the relative one below
+def as_floats(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+
+# Batch mode replays series computed by convolutions and filters over the whole day instead of the rolling updates,
+# so the values round differently but have to stay within float noise of the per period ones after every period.
+# Trades can differ where two averages tie to the last bits, test_grid_signals compares the trades of the grid
+# with batch mode, which replays the same series
+@pytest.mark.parametrize("grid", GRIDS)
+def test_batch_indicators_match_per_period_updates(sim_data_dir, grid):
+    strategy_gen_function = getattr(run_simulation, grid)
+    _, _, per_period = strategy_gen_function(SYMBOL, INITIAL_CASH)
+    _, _, batch = strategy_gen_function(SYMBOL, INITIAL_CASH)
+
+    num_values = 0
+    for period_size in per_period.get_period_sizes():
+        periods = periods_from_file(run_simulation.periods_file_name(SYMBOL, DATE, period_size))
+        batch.precompute_series(period_size, periods)
+
+        for period in periods:
+            per_period.process_period(period)
+            batch.process_period(period)
+
+            for expected, analyzer in zip(per_period.analyzers[period_size], batch.analyzers[period_size]):
+                for field in analyzer.history_fields:
+                    values = as_floats(getattr(analyzer, field))
+                    expected_values = as_floats(getattr(expected, field))
+                    assert len(values) == len(expected_values)
+                    assert np.allclose(values, expected_values, rtol=1e-9, atol=1e-9, equal_nan=True)
+                    num_values += len(values)
+
+    assert num_values > 0
@@ -0,0 +1,47 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from brokerages.batch_simulated_brokerage import BatchSimulatedBrokerage
+from brokerages.simulated_brokerage import SimulatedBrokerage
+from exceptions import PositionAlreadyExistsError, TooManyPositionsError
+from tests.conftest import SYMBOL, INITIAL_CASH
+
+TIMESTAMP = datetime(2021, 12, 1, 14, 30)
+
+
+# Positions are sized as SimulatedBrokerage sizes them, by the cash over the positions left to open
+@pytest.mark.parametrize("num_stocks", [1, 2, 3])
+def test_buy_sizes_positions_like_simulated_brokerage(sim_data_dir, num_stocks):
+    brokerage = SimulatedBrokerage(INITIAL_CASH, num_stocks)
+    batch_brokerage = BatchSimulatedBrokerage(SYMBOL, 2, INITIAL_CASH, num_stocks)
+    for b in [brokerage, batch_brokerage.get_brokerage(0)]:
+        b.update_value(SYMBOL, 150.37, TIMESTAMP)
+        b.buy_stock(SYMBOL)
+
+    batch_brokerage.buy_stocks(np.array([1]))
+
+    expected_quantity = brokerage.get_position(SYMBOL)["quantity"]
+    assert batch_brokerage.quantities.tolist() == [expected_quantity, expected_quantity]
+    assert batch_brokerage.get_brokerage(0).get_equity() == brokerage.get_equity()
+    assert batch_brokerage.cash[0] == pytest.approx(float(brokerage.cash))
+
+
+def test_buy_raises_like_simulated_brokerage(sim_data_dir):
+    batch_brokerage = BatchSimulatedBrokerage(SYMBOL, 2, INITIAL_CASH)
+    batch_brokerage.update_value(SYMBOL, 150.37, TIMESTAMP)
+    batch_brokerage.buy_stock(0, SYMBOL)
+
+    with pytest.raises(PositionAlreadyExistsError):
+        batch_brokerage.buy_stock(0, SYMBOL)
+    with pytest.raises(PositionAlreadyExistsError):
+        batch_brokerage.buy_stocks(np.array([0, 1]))
+    # The open position uses up the only stock configured
+    with pytest.raises(TooManyPositionsError):
+        batch_brokerage.buy_stock(0, "MSFT")
+
+    no_stocks = BatchSimulatedBrokerage(SYMBOL, 1, INITIAL_CASH, num_stocks=0)
+    no_stocks.update_value(SYMBOL, 150.37, TIMESTAMP)
+    with pytest.raises(TooManyPositionsError):
+        no_stocks.buy_stock(0, SYMBOL)
+    with pytest.raises(TooManyPositionsError):
+        no_stocks.buy_stocks(np.array([0]))
@@ -0,0 +1,33 @@
+import os
+from utils.binary_store import convert_periods_file, has_binary_file, binary_file_name
+
+PERIODS_CSV = """timeframe,start_time,end_time,open,close,high,low,volume
+5,2021-12-01T14:30:00.000000,2021-12-01T14:30:05.000000,150.0,150.01,150.02,149.99,10
+"""
+
+
+def write_csv(file_name):
+    with open(file_name, "w") as csv_file:
+        csv_file.write(PERIODS_CSV)
+
+
+def test_binary_file_older_than_its_csv_is_stale(tmp_path):
+    csv_file_name = str(tmp_path / "periods.csv")
+    write_csv(csv_file_name)
+    assert not has_binary_file(csv_file_name)
+
+    convert_periods_file(csv_file_name)
+    assert has_binary_file(csv_file_name)
+
+    binary_mtime = os.path.getmtime(binary_file_name(csv_file_name))
+    os.utime(csv_file_name, (binary_mtime + 10, binary_mtime + 10))
+    assert not has_binary_file(csv_file_name)
+
+
+def test_binary_file_without_csv_is_used(tmp_path):
+    csv_file_name = str(tmp_path / "periods.csv")
+    write_csv(csv_file_name)
+    convert_periods_file(csv_file_name)
+    os.remove(csv_file_name)
+
+    assert has_binary_file(csv_file_name)
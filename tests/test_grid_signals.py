@@ -0,0 +1,18 @@
+import pytest
+import run_simulation
+from tests.conftest import SYMBOL, DATE, INITIAL_CASH
+from tests.test_batch_indicators import GRIDS
+
+
+# The GridEvaluator decides every strategy of a grid at once from the precomputed series, it has to make exactly
+# the same trades and profits as the strategy objects deciding one by one from the same series in batch mode
+@pytest.mark.parametrize("grid", GRIDS)
+def test_grid_signals_match_strategy_objects(sim_data_dir, grid):
+    strategy_gen_function = getattr(run_simulation, grid)
+    per_object = run_simulation.sim_date_from_periods(SYMBOL, DATE, strategy_gen_function, True, INITIAL_CASH,
+                                                      batch_indicators=True)
+    grid_signals = run_simulation.sim_date_from_periods(SYMBOL, DATE, strategy_gen_function, True, INITIAL_CASH,
+                                                        batch_indicators=True, grid_signals=True)
+
+    assert sum(stats["num_buys"] for stats in per_object.values()) > 0
+    assert grid_signals == per_object
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import timedelta
+from time import perf_counter
+from live_trader.listener_shards import ShardedPeriodReader, shard_symbols
+from tests.test_shared_period_ring import START, period_message
+from utils.quote import Quote
+from utils.shared_period_ring import WAKE_UP_TIMEOUT
+
+SHARDS = [["AAPL"], ["MSFT"]]
+
+
+def quote_at(i, timeframe=5):
+    return Quote(START + timedelta(seconds=timeframe * (i + 1)), 150.01, 1, 150.0, 1)
+
+
+def end_times(messages):
+    return [(m["symbol"], m["period"].end_time) for m in messages]
+
+
+def test_shard_symbols_round_robin():
+    assert shard_symbols(["A", "B", "C", "D", "E"], 2) == [["A", "C", "E"], ["B", "D"]]
+    assert shard_symbols(["A"], 3) == [["A"]]
+
+
+# Periods of both shards come out in end time order, each once every shard's watermark has passed its end time
+def test_periods_are_released_in_end_time_order_once_the_watermark_passes():
+    reader = ShardedPeriodReader(SHARDS, max_merge_delay=60)
+    aapl, msft = reader.rings
+    try:
+        # AAPL's shard is ahead, its second period has to wait for MSFT's shard to catch up
+        for i in [0, 2]:
+            aapl.put(period_message(i, "AAPL"))
+        aapl.record_quote("AAPL", quote_at(2), 0)
+        msft.put(period_message(1, "MSFT"))
+        msft.record_quote("MSFT", quote_at(1), 0)
+
+        first = asyncio.run(reader.get_batch())
+        assert end_times(first) == end_times([period_message(0, "AAPL"), period_message(1, "MSFT")])
+        assert reader.get_stats()["held"] == 1
+
+        msft.put(period_message(3, "MSFT"))
+        msft.record_quote("MSFT", quote_at(3), 0)
+        assert end_times(asyncio.run(reader.get_batch())) == end_times([period_message(2, "AAPL")])
+
+        aapl.record_quote("AAPL", quote_at(3), 0)
+        assert end_times(asyncio.run(reader.get_batch())) == end_times([period_message(3, "MSFT")])
+
+        stats = reader.get_stats()
+        assert stats["held"] == 0
+        assert stats["late"] == 0
+        assert stats["dropped"] == 0
+    finally:
+        reader.close()
+
+
+# A shard without quotes holds the other's periods back for max_merge_delay only
+def test_quiet_shard_releases_after_max_merge_delay():
+    max_merge_delay = 0.1
+    reader = ShardedPeriodReader(SHARDS, max_merge_delay=max_merge_delay)
+    aapl, _ = reader.rings
+    try:
+        aapl.put(period_message(0, "AAPL"))
+        aapl.record_quote("AAPL", quote_at(0), 0)
+
+        start = perf_counter()
+        batch = asyncio.run(asyncio.wait_for(reader.get_batch(), WAKE_UP_TIMEOUT / 2))
+        waited = perf_counter() - start
+
+        assert end_times(batch) == end_times([period_message(0, "AAPL")])
+        assert waited >= max_merge_delay * 0.9
+        assert reader.get_stats()["held"] == 0
+    finally:
+        reader.close()
+
+
+def test_stop_reading_releases_held_periods_and_ends_with_none():
+    reader = ShardedPeriodReader(SHARDS, max_merge_delay=60)
+    aapl, _ = reader.rings
+    try:
+        aapl.put(period_message(0, "AAPL"))
+        reader.stop_reading()
+
+        batch = asyncio.run(reader.get_batch())
+        assert end_times(batch[:-1]) == end_times([period_message(0, "AAPL")])
+        assert batch[-1] is None
+    finally:
+        reader.close()
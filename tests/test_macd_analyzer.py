@@ -0,0 +1,31 @@
+import pytest
+from analyzers.exponential_ma_analyzer import EMAAnalyzer
+from analyzers.macd_analyzer import MACDAnalyzer
+from benchmarks.synthetic import synthetic_periods
+from utils.period_aggregator import PeriodAggregator
+
+
+def run_macd(macd, shared_emas):
+    period_aggregator = PeriodAggregator(5)
+    for period in synthetic_periods(5, 300, 0):
+        period_aggregator.process_period(period)
+        for ema in shared_emas:
+            ema.update_values(period_aggregator)
+        macd.update_values(period_aggregator)
+    return list(macd.macd_values), list(macd.signal_values)
+
+
+# A shared EMA is reused and only the missing one is created, either way the values match a MACD of its own EMAs
+@pytest.mark.parametrize("shared", ["fast", "slow", "both"])
+def test_macd_reuses_the_emas_it_is_given(shared):
+    fast_ema = EMAAnalyzer(12) if shared in ["fast", "both"] else None
+    slow_ema = EMAAnalyzer(26) if shared in ["slow", "both"] else None
+    macd = MACDAnalyzer(12, 26, 9, fast_ema=fast_ema, slow_ema=slow_ema)
+    shared_emas = [ema for ema in [fast_ema, slow_ema] if ema is not None]
+
+    if fast_ema is not None:
+        assert macd.fast_ema is fast_ema
+    if slow_ema is not None:
+        assert macd.slow_ema is slow_ema
+    assert len(macd.owned_emas) == 2 - len(shared_emas)
+    assert run_macd(macd, shared_emas) == run_macd(MACDAnalyzer(12, 26, 9), [])
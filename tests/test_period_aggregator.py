@@ -0,0 +1,44 @@
+import numpy as np
+from benchmarks.synthetic import synthetic_quotes
+from tests.conftest import NUM_QUOTES, WINDOW_SIZES
+from utils.period_aggregator import Period, PeriodAggregator, MultiTimeframeAggregator
+
+# Quotes between the checks of the current periods, prime so the checks land at every point of the periods
+CHECK_INTERVAL = 997
+
+
+def period_fields(period):
+    return tuple(getattr(period, field) for field in Period.__slots__)
+
+
+def assert_same_aggregators(period_aggregator, expected):
+    assert period_aggregator.size == expected.size
+    for source, column in expected.get_columns().items():
+        assert np.array_equal(period_aggregator.get_columns()[source], column)
+    assert [period_fields(p) for p in period_aggregator.get_periods()] == \
+           [period_fields(p) for p in expected.get_periods()]
+    assert period_fields(period_aggregator.cur_period) == period_fields(expected.cur_period)
+
+
+# The bucketed MultiTimeframeAggregator has to close the same periods on the same quotes as an independent
+# PeriodAggregator per window size, and after a flush its current periods have to match theirs as well
+def test_multi_timeframe_aggregator_matches_independent_aggregators():
+    quotes = synthetic_quotes(NUM_QUOTES)
+    independent = {n: PeriodAggregator(n) for n in WINDOW_SIZES}
+    period_aggregators = {n: PeriodAggregator(n) for n in WINDOW_SIZES}
+    multi_timeframe_aggregator = MultiTimeframeAggregator(period_aggregators)
+
+    for i, quote in enumerate(quotes):
+        closed = multi_timeframe_aggregator.process_quote(quote)
+        assert closed == [n for n, per_agg in independent.items() if per_agg.process_quote(quote)]
+
+        if i % CHECK_INTERVAL == 0:
+            multi_timeframe_aggregator.flush()
+            for n in WINDOW_SIZES:
+                assert period_fields(period_aggregators[n].cur_period) == period_fields(independent[n].cur_period)
+
+    # The tail of the day is still in the bucket until the flush
+    multi_timeframe_aggregator.flush()
+    for n in WINDOW_SIZES:
+        assert period_aggregators[n].size > 0
+        assert_same_aggregators(period_aggregators[n], independent[n])
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from analyzers.least_squares_ma_analyzer import LSMAAnalyzer
+from analyzers.rolling_sums import RollingSum, RollingLinearSum, RESYNC_INTERVAL
+from analyzers.simple_ma_analyzer import SMAAnalyzer
+from analyzers.weighted_volume_ma_analyzer import VWMAAnalyzer
+from utils.period_aggregator import Period, PeriodAggregator
+
+LENGTHS = [5, 25, 45]
+# Long enough to cross several resyncs
+NUM_PERIODS = 3 * RESYNC_INTERVAL + 100
+
+
+# Cent tick closes
+def cent_closes(num_periods, seed=0):
+    rng = np.random.default_rng(seed)
+    cents = 15_000 + np.cumsum(rng.choice([-1, 0, 1], size=num_periods, p=[0.3, 0.4, 0.3]))
+    return (cents / 100).tolist()
+
+
+def make_periods(closes, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime(2021, 12, 1, 14, 30)
+    periods = []
+    for i, close in enumerate(closes):
+        open_price = closes[i - 1] if i > 0 else close
+        start_time = start + timedelta(seconds=5 * i)
+        periods.append(Period(5, start_time, start_time + timedelta(seconds=5), open_price, close,
+                              max(open_price, close) + 0.01, min(open_price, close) - 0.01,
+                              int(rng.integers(1, 1000))))
+    return periods
+
+
+def run_analyzer(analyzer, periods):
+    period_aggregator = PeriodAggregator(5)
+    for period in periods:
+        period_aggregator.process_period(period)
+        analyzer.update_values(period_aggregator)
+    return list(analyzer.averages)
+
+
+def sma_formula(closes, length):
+    return [sum(closes[i - length:i]) / length for i in range(length, len(closes) + 1)]
+
+
+def vwma_formula(periods, length, source):
+    averages = []
+    for i in range(length, len(periods) + 1):
+        window = periods[i - length:i]
+        averages.append(sum(p.get_value(source) * p.volume for p in window) / sum(p.volume for p in window))
+    return averages
+
+
+# The equations of least_squares_ma_analyzer with every sum taken over the full window, x is 1 for the newest close
+def lsma_formula(closes, length):
+    c = sum(range(1, length + 1))
+    e = sum(x * x for x in range(1, length + 1))
+    n = length
+    averages = []
+    for i in range(length, len(closes) + 1):
+        window = closes[i - length:i]
+        d = sum(window)
+        f = sum(x * y for x, y in zip(range(length, 0, -1), window))
+        a = ((f * n) - (c * d)) / ((n * e) - (c * c))
+        averages.append((d - (a * c)) / n)
+    return averages
+
+
+@pytest.mark.parametrize("length", LENGTHS)
+@pytest.mark.parametrize("resync_interval", [RESYNC_INTERVAL, 7])
+def test_rolling_sums_match_full_window(length, resync_interval):
+    values = np.array(cent_closes(NUM_PERIODS))
+    volumes = np.random.default_rng(1).integers(1, 1000, size=NUM_PERIODS).astype(float)
+    rolling_sum = RollingSum(length, resync_interval)
+    rolling_linear_sum = RollingLinearSum(length, resync_interval)
+    rolling_product_sum = RollingSum(length, resync_interval)
+
+    sums, linear_sums, weighted_sums, product_sums = [], [], [], []
+    expected_sums, expected_weighted_sums, expected_product_sums = [], [], []
+    for num_periods in range(length, NUM_PERIODS + 1):
+        trailing = slice(max(num_periods - length - 1, 0), num_periods)
+        window = values[num_periods - length:num_periods]
+        window_volumes = volumes[num_periods - length:num_periods]
+
+        sums.append(rolling_sum.update(num_periods, values[trailing]))
+        rolling_linear_sum.update(num_periods, values[trailing])
+        linear_sums.append(rolling_linear_sum.total)
+        weighted_sums.append(rolling_linear_sum.weighted_total)
+        product_sums.append(rolling_product_sum.update(num_periods, values[trailing], volumes[trailing]))
+
+        expected_sums.append(window.sum())
+        expected_weighted_sums.append(window.dot(np.arange(length, 0, -1)))
+        expected_product_sums.append((window * window_volumes).sum())
+
+    assert np.allclose(sums, expected_sums, rtol=1e-12, atol=0)
+    assert np.allclose(linear_sums, expected_sums, rtol=1e-12, atol=0)
+    assert np.allclose(weighted_sums, expected_weighted_sums, rtol=1e-12, atol=0)
+    assert np.allclose(product_sums, expected_product_sums, rtol=1e-12, atol=0)
+
+
+# A resync recomputes the sum from the full window, dropping whatever rounding the slides had built up
+def test_resync_recomputes_from_the_window():
+    length = 5
+    values = np.array(cent_closes(NUM_PERIODS))
+    rolling_sum = RollingSum(length)
+    for num_periods in range(length, NUM_PERIODS + 1):
+        total = rolling_sum.update(num_periods, values[max(num_periods - length - 1, 0):num_periods])
+        if rolling_sum.updates_since_resync == 0:
+            assert total == values[num_periods - length:num_periods].sum()
+
+
+def test_rolling_sum_resyncs_after_missed_update():
+    values = np.array(cent_closes(100))
+    rolling_sum = RollingSum(5)
+    rolling_sum.update(10, values[4:10])
+    assert rolling_sum.update(12, values[6:12]) == values[7:12].sum()
+
+
+@pytest.mark.parametrize("length", LENGTHS)
+def test_analyzers_match_full_window_formulas(length):
+    closes = cent_closes(NUM_PERIODS)
+    periods = make_periods(closes)
+
+    assert np.allclose(run_analyzer(SMAAnalyzer(length), periods), sma_formula(closes, length), rtol=1e-12, atol=0)
+    assert np.allclose(run_analyzer(LSMAAnalyzer(length), periods), lsma_formula(closes, length), rtol=1e-9, atol=0)
+    for source in ["close", "hlc3"]:
+        assert np.allclose(run_analyzer(VWMAAnalyzer(length, source), periods), vwma_formula(periods, length, source),
+                           rtol=1e-12, atol=0)
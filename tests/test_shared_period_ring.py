@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from utils.period_aggregator import Period
+from utils.shared_period_ring import SharedPeriodRing, WAKE_UP_TIMEOUT
+
+SYMBOLS = ["AAPL", "MSFT"]
+START = datetime(2021, 12, 1, 14, 30)
+
+
+def period_message(i, symbol="AAPL", timeframe=5):
+    start_time = START + timedelta(seconds=timeframe * i)
+    period = Period(timeframe, start_time, start_time + timedelta(seconds=timeframe), 150.0 + i, 150.5 + i,
+                    151.0 + i, 149.0 + i, 100 + i)
+    return {"symbol": symbol, "period": period, "received": 1_638_369_000.0 + i}
+
+
+def message_fields(msg):
+    period = msg["period"]
+    return (msg["symbol"], period.timeframe, period.start_time, period.end_time, period.open, period.close,
+            period.high, period.low, period.volume, msg["received"])
+
+
+# Runs in a spawned process, so the ring reaches it through SharedPeriodRing.__reduce__
+def produce(ring, num_periods):
+    for i in range(num_periods):
+        ring.put(period_message(i, SYMBOLS[i % len(SYMBOLS)]))
+    ring.close()
+
+
+def test_ring_wraps_around_at_capacity():
+    ring = SharedPeriodRing(SYMBOLS, capacity=4)
+    try:
+        expected = [period_message(i, SYMBOLS[i % len(SYMBOLS)]) for i in range(11)]
+        read = []
+        # Three periods at a time, so the records wrap past the end of the buffer at different positions
+        for start in range(0, len(expected), 3):
+            for msg in expected[start:start + 3]:
+                assert ring.put(msg)
+            read += ring.get_all()
+
+        assert [message_fields(m) for m in read] == [message_fields(m) for m in expected]
+        assert ring.get_stats()["written"] == len(expected)
+        assert ring.get_stats()["pending"] == 0
+        assert ring.get_stats()["dropped"] == 0
+    finally:
+        ring.close()
+
+
+def test_full_ring_drops_and_counts_periods():
+    ring = SharedPeriodRing(SYMBOLS, capacity=4)
+    try:
+        results = [ring.put(period_message(i)) for i in range(7)]
+        assert results == [True] * 4 + [False] * 3
+        assert ring.get_stats()["dropped"] == 3
+
+        # The periods already in the ring are kept, the newest ones were dropped
+        assert [m["period"].open for m in ring.get_all()] == [150.0, 151.0, 152.0, 153.0]
+        assert ring.put(period_message(7))
+        assert [m["period"].open for m in ring.get_all()] == [157.0]
+        assert ring.get_stats()["dropped"] == 3
+    finally:
+        ring.close()
+
+
+def test_child_process_attaches_to_the_ring():
+    num_periods = 10
+    ring = SharedPeriodRing(SYMBOLS, capacity=16)
+    try:
+        process = get_context("spawn").Process(target=produce, args=(ring, num_periods))
+        process.start()
+
+        async def read_all():
+            messages = []
+            while len(messages) < num_periods:
+                messages += await asyncio.wait_for(ring.get_batch(), 30)
+            return messages
+
+        messages = asyncio.run(read_all())
+        process.join(30)
+
+        assert process.exitcode == 0
+        assert [message_fields(m) for m in messages] == \
+               [message_fields(period_message(i, SYMBOLS[i % len(SYMBOLS)])) for i in range(num_periods)]
+    finally:
+        ring.close()
+
+
+# A period put while the consumer waits wakes it right away rather than after the timeout
+def test_put_wakes_waiting_consumer():
+    ring = SharedPeriodRing(SYMBOLS)
+    try:
+        async def wait_for_period():
+            batch = asyncio.ensure_future(ring.get_batch())
+            await asyncio.sleep(0.05)
+            ring.put(period_message(0))
+            return await asyncio.wait_for(batch, WAKE_UP_TIMEOUT / 2)
+
+        assert [message_fields(m) for m in asyncio.run(wait_for_period())] == [message_fields(period_message(0))]
+    finally:
+        ring.close()
+
+
+def test_stop_reading_ends_the_batch_with_none():
+    ring = SharedPeriodRing(SYMBOLS)
+    try:
+        async def stop_waiting():
+            batch = asyncio.ensure_future(ring.get_batch())
+            await asyncio.sleep(0.05)
+            ring.stop_reading()
+            return await asyncio.wait_for(batch, WAKE_UP_TIMEOUT / 2)
+
+        assert asyncio.run(stop_waiting()) == [None]
+
+        # Periods still in the ring come before the None
+        ring.put(period_message(0))
+        batch = asyncio.run(ring.get_batch())
+        assert len(batch) == 2
+        assert message_fields(batch[0]) == message_fields(period_message(0))
+        assert batch[1] is None
+    finally:
+        ring.close()
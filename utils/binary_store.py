@@ -0,0 +1,86 @@
+import numpy as np
+import sys
+from csv import DictReader
+from os.path import exists, getmtime, splitext
+from utils.timestamps import parse_timestamps_ns
+
+# Binary copies of the quote and period CSV data sets. Each file is a .npy structured array next to
+# the CSV it was converted from, timestamps stored as int64 epoch nanoseconds. Loading memory maps the
+# file, so nothing is parsed per row. A copy older than its CSV is stale and the CSV is read instead.
+
+QUOTE_FIELDS = ['t', 'ap', 'as', 'bp', 'bs']
+QUOTE_DTYPE = np.dtype([
+    ("t", "<i8"),
+    ("ap", "<f8"),
+    ("as", "<i8"),
+    ("bp", "<f8"),
+    ("bs", "<i8"),
+])
+
+PERIOD_FIELDS = ['timeframe', 'start_time', 'end_time', 'open', 'close', 'high', 'low', 'volume']
+PERIOD_DTYPE = np.dtype([
+    ("timeframe", "<i8"),
+    ("start_time", "<i8"),
+    ("end_time", "<i8"),
+    ("open", "<f8"),
+    ("close", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("volume", "<i8"),
+])
+TIMESTAMP_FIELDS = ['t', 'start_time', 'end_time']
+
+
+def binary_file_name(csv_file_name):
+    return splitext(csv_file_name)[0] + ".npy"
+
+
+# A binary file without a CSV, like the benchmarks' synthetic data sets, is always used
+def has_binary_file(csv_file_name):
+    file_name = binary_file_name(csv_file_name)
+    if not exists(file_name):
+        return False
+    return not exists(csv_file_name) or getmtime(file_name) >= getmtime(csv_file_name)
+
+
+# datetime only goes down to microseconds, so the nanoseconds are truncated here
+def ns_to_datetimes(ns_timestamps):
+    return np.asarray(ns_timestamps).astype("datetime64[ns]").astype("datetime64[us]").tolist()
+
+
+def convert_file(csv_file_name, fieldnames, dtype, has_header):
+    with open(csv_file_name, newline='') as csvfile:
+        reader = DictReader(csvfile, fieldnames=fieldnames)
+        if has_header:
+            next(reader)
+        rows = list(reader)
+
+    out = np.empty(len(rows), dtype=dtype)
+    for field in fieldnames:
+        values = [row[field] for row in rows]
+        out[field] = parse_timestamps_ns(values) if field in TIMESTAMP_FIELDS else values
+
+    np.save(binary_file_name(csv_file_name), out)
+    return out
+
+
+def convert_quotes_file(csv_file_name):
+    return convert_file(csv_file_name, QUOTE_FIELDS, QUOTE_DTYPE, has_header=False)
+
+
+def convert_periods_file(csv_file_name):
+    return convert_file(csv_file_name, PERIOD_FIELDS, PERIOD_DTYPE, has_header=True)
+
+
+# Returns a read only memory mapped structured array, index it by field name to get a column
+def load_columns(csv_file_name):
+    return np.load(binary_file_name(csv_file_name), mmap_mode="r")
+
+
+if __name__ == '__main__':
+    # python -m utils.binary_store quotes|periods file.csv [file.csv ...]
+    converters = {"quotes": convert_quotes_file, "periods": convert_periods_file}
+    converter = converters[sys.argv[1]]
+    for file_name in sys.argv[2:]:
+        converted = converter(file_name)
+        print(f"Wrote {len(converted)} rows to {binary_file_name(file_name)}")
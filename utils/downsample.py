@@ -0,0 +1,23 @@
+import numpy as np
+
+
+# Min/max decimation, the indices of the smallest and largest value in each of num_buckets equal runs of values,
+# in order. A line through them keeps every spike a line through all of the values would show, in at most
+# 2 * num_buckets points. Values that need no downsampling are all kept, nan values are otherwise never picked
+def minmax_indices(values, num_buckets):
+    values = np.asarray(values, dtype=float)
+    if len(values) <= 2 * num_buckets:
+        return np.arange(len(values))
+
+    bucket_size = -(-len(values) // num_buckets)
+    buckets = np.full(bucket_size * num_buckets, np.nan)
+    buckets[:len(values)] = values
+    buckets = buckets.reshape(num_buckets, bucket_size)
+
+    missing = np.isnan(buckets)
+    lows = np.where(missing, np.inf, buckets).argmin(axis=1)
+    highs = np.where(missing, -np.inf, buckets).argmax(axis=1)
+    offsets = np.arange(num_buckets) * bucket_size
+
+    has_values = ~missing.all(axis=1)
+    return np.unique(np.concatenate([(offsets + lows)[has_values], (offsets + highs)[has_values]]))
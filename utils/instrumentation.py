@@ -0,0 +1,122 @@
+import numpy as np
+from utils.latency_histogram import LatencyHistogram, NUM_BUCKETS, get_row_stats
+
+# Spans of a period's way from the quote that closes it to the order it leads to, each recorded per symbol
+# Market time of a quote to the listener receiving it, by the wall clock
+QUOTE_RECEIVE = "quote_receive"
+# Listener receiving the quote that closes a period to the period being published
+PERIOD_CLOSE = "period_close"
+# Listener receiving the quote that closes a period to the trade manager processing the period, through the queue
+# or period ring and any merge of the listener shards
+QUEUE_TRANSIT = "queue_transit"
+# Trade manager adding the period to its aggregator and updating the strategy's analyzers
+ANALYZER_UPDATE = "analyzer_update"
+SIGNAL = "signal"
+# Request that submits an order, timed by the brokerage around only that request
+ORDER_SUBMIT = "order_submit"
+# Order submitted to its fill arriving on the trade update stream
+FILL = "fill"
+# Listener receiving the quote that closes a period to the order it led to being submitted
+QUOTE_TO_ORDER = "quote_to_order"
+
+# Recorded by the stream listener, in the listener processes' period rings unless it runs in the trade manager
+LISTENER_SPANS = [QUOTE_RECEIVE, PERIOD_CLOSE]
+MANAGER_SPANS = [QUEUE_TRANSIT, ANALYZER_UPDATE, SIGNAL, ORDER_SUBMIT, FILL, QUOTE_TO_ORDER]
+SPANS = LISTENER_SPANS + MANAGER_SPANS
+
+
+# Bytes of buffer an Instrumentation needs
+def instrumentation_size(num_symbols, num_spans):
+    return (num_spans * num_symbols * NUM_BUCKETS + 2 * num_symbols) * 8
+
+
+# A LatencyHistogram for every span of every symbol, and counts of every symbol's quotes and of its periods dropped
+# because the period ring was full. The counts can live in a
+# buffer such as shared memory, so the trade manager can read what a listener process records. Recording only
+# ever increments counts, so a reader sees counts that are at most a few records behind
+class Instrumentation:
+    def __init__(self, symbols, spans, buffer=None, offset=0):
+        self.symbols = list(symbols)
+        self.symbol_ids = {s: i for i, s in enumerate(self.symbols)}
+        self.spans = list(spans)
+
+        shape = (len(self.spans), len(self.symbols), NUM_BUCKETS)
+        if buffer is None:
+            self.counts = np.zeros(shape, dtype=np.int64)
+            self.quote_counts = np.zeros(len(self.symbols), dtype=np.int64)
+            self.dropped_counts = np.zeros(len(self.symbols), dtype=np.int64)
+        else:
+            self.counts = np.ndarray(shape, dtype=np.int64, buffer=buffer, offset=offset)
+            quotes_offset = offset + self.counts.nbytes
+            self.quote_counts = np.ndarray(len(self.symbols), dtype=np.int64, buffer=buffer, offset=quotes_offset)
+            dropped_offset = quotes_offset + self.quote_counts.nbytes
+            self.dropped_counts = np.ndarray(len(self.symbols), dtype=np.int64, buffer=buffer, offset=dropped_offset)
+        self.quote_cells = memoryview(self.quote_counts)
+
+        # {
+        #   span: {
+        #     symbol: LatencyHistogram
+        #   }
+        # }
+        self.histograms = {
+            span: {symbol: LatencyHistogram(self.counts[i, j]) for j, symbol in enumerate(self.symbols)}
+            for i, span in enumerate(self.spans)
+        }
+
+    def record(self, span, symbol, seconds):
+        self.histograms[span][symbol].record(seconds)
+
+    def count_quote(self, symbol):
+        self.quote_cells[self.symbol_ids[symbol]] += 1
+
+    def count_dropped(self, symbol):
+        self.dropped_counts[self.symbol_ids[symbol]] += 1
+
+    # Adds the counts of another instrumentation, of any of the same spans and symbols
+    def add(self, other):
+        shared = [i for i, symbol in enumerate(other.symbols) if symbol in self.symbol_ids]
+        rows = [self.symbol_ids[other.symbols[i]] for i in shared]
+        for i, span in enumerate(other.spans):
+            if span in self.spans:
+                self.counts[self.spans.index(span), rows] += other.counts[i, shared]
+
+        self.quote_counts[rows] += other.quote_counts[shared]
+        self.dropped_counts[rows] += other.dropped_counts[shared]
+
+    def get_quote_counts(self):
+        return dict(zip(self.symbols, self.quote_counts.tolist()))
+
+    def get_dropped_counts(self):
+        return dict(zip(self.symbols, self.dropped_counts.tolist()))
+
+    # Stats of every span across all symbols and for each symbol, with the recorded buckets of the spans across
+    # all symbols if buckets is set
+    # {
+    #   span: {
+    #     all: {count: int, mean_ms: float, p50_ms: float, ..., max_ms: float, buckets: [[us, count]]},
+    #     symbol: {count: int, mean_ms: float, ...},
+    #     ...
+    #   }
+    # }
+    def get_span_stats(self, buckets=False):
+        span_stats = {}
+        for i, span in enumerate(self.spans):
+            # The histogram across all symbols, then every symbol's
+            counts = np.vstack([self.counts[i].sum(axis=0), self.counts[i]])
+            stats = get_row_stats(counts)
+            span_stats[span] = {"all": stats[0]}
+            if buckets:
+                span_stats[span]["all"]["buckets"] = LatencyHistogram(counts[0]).get_buckets()
+            span_stats[span].update(zip(self.symbols, stats[1:]))
+
+        return span_stats
+
+
+# One instrumentation of every span and symbol recorded by any of them
+def combine_instrumentations(instrumentations):
+    symbols = list(dict.fromkeys(s for instrumentation in instrumentations for s in instrumentation.symbols))
+    spans = [span for span in SPANS if any(span in instrumentation.spans for instrumentation in instrumentations)]
+    combined = Instrumentation(symbols, spans)
+    for instrumentation in instrumentations:
+        combined.add(instrumentation)
+    return combined
@@ -0,0 +1,106 @@
+import numpy as np
+
+# Log-linear buckets of microseconds, the layout of an HDR histogram. Values below SUB_BUCKETS each have their
+# own bucket, above that every power of two is split into SUB_BUCKETS / 2 buckets, so a recorded value is within
+# 1/64 of the value reported for its bucket whatever its magnitude. Values past the last bucket, about 38 hours,
+# are counted in it. Recording is an index computation and one increment into a flat array of counts, which can
+# be a view of shared memory so another process can read the histogram while it is recorded into.
+# The increment goes through a memoryview of the counts, which costs a fraction of indexing the numpy array
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS // 2
+MAX_EXPONENT = 30
+NUM_BUCKETS = SUB_BUCKETS + MAX_EXPONENT * HALF_SUB_BUCKETS
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+
+    exponent = value.bit_length() - SUB_BUCKET_BITS
+    if exponent > MAX_EXPONENT:
+        return NUM_BUCKETS - 1
+    return SUB_BUCKETS + (exponent - 1) * HALF_SUB_BUCKETS + (value >> exponent) - HALF_SUB_BUCKETS
+
+
+# The smallest value of every bucket and how many values it covers
+def bucket_bounds():
+    indices = np.arange(NUM_BUCKETS)
+    exponents = np.maximum((indices - SUB_BUCKETS) // HALF_SUB_BUCKETS + 1, 0)
+    lows = np.where(indices < SUB_BUCKETS, indices,
+                    ((indices - SUB_BUCKETS) % HALF_SUB_BUCKETS + HALF_SUB_BUCKETS) << exponents)
+    return lows, 1 << exponents
+
+
+BUCKET_LOWS, BUCKET_WIDTHS = bucket_bounds()
+# Like an HDR histogram, percentiles are reported as the highest value their bucket covers
+BUCKET_HIGHS = BUCKET_LOWS + BUCKET_WIDTHS - 1
+BUCKET_MIDDLES = BUCKET_LOWS + (BUCKET_WIDTHS - 1) / 2
+
+
+class LatencyHistogram:
+    def __init__(self, counts=None):
+        self.counts = counts if counts is not None else np.zeros(NUM_BUCKETS, dtype=np.int64)
+        self.cells = memoryview(self.counts)
+
+    def record(self, seconds):
+        value = int(seconds * 1_000_000)
+        self.cells[bucket_index(value if value > 0 else 0)] += 1
+
+    def add(self, other):
+        self.counts += other.counts
+
+    def get_count(self):
+        return int(self.counts.sum())
+
+    # In microseconds, None if nothing was recorded
+    def get_percentile(self, percentile):
+        cumulative = np.cumsum(self.counts)
+        if cumulative[-1] == 0:
+            return None
+        rank = max(int(np.ceil(percentile / 100 * cumulative[-1])), 1)
+        return int(BUCKET_HIGHS[np.searchsorted(cumulative, rank)])
+
+    # Count, mean, percentiles and max in milliseconds
+    def get_stats(self):
+        return get_row_stats(self.counts[np.newaxis])[0]
+
+    # [highest value in microseconds, count] of every bucket that has been recorded into
+    def get_buckets(self):
+        recorded = np.flatnonzero(self.counts)
+        return [[int(BUCKET_HIGHS[i]), int(self.counts[i])] for i in recorded]
+
+
+# get_stats of every row of a 2D array of histogram counts, from one cumulative sum of all of them, so a snapshot
+# of many histograms doesn't cost a pass over the buckets per histogram and percentile
+def get_row_stats(counts):
+    # Buckets past the highest recorded one of every row change nothing
+    recorded = np.flatnonzero(counts.any(axis=0))
+    counts = counts[:, :recorded[-1] + 1 if len(recorded) > 0 else 1]
+    cumulative = np.cumsum(counts, axis=1)
+    totals = cumulative[:, -1]
+    sums = counts @ BUCKET_MIDDLES[:counts.shape[1]]
+    # The bucket of a rank is the first whose cumulative count reaches it
+    percentiles = {}
+    for p in PERCENTILES:
+        ranks = np.maximum(np.ceil(p / 100 * totals), 1)
+        indices = np.minimum((cumulative < ranks[:, np.newaxis]).sum(axis=1), counts.shape[1] - 1)
+        percentiles[p] = BUCKET_HIGHS[indices].tolist()
+    maxes = BUCKET_HIGHS[counts.shape[1] - 1 - np.argmax(counts[:, ::-1] > 0, axis=1)].tolist()
+
+    row_stats = []
+    for i, count in enumerate(totals.tolist()):
+        stats = {"count": count}
+        if count == 0:
+            stats["mean_ms"] = None
+            stats.update({f"p{p}_ms": None for p in PERCENTILES})
+            stats["max_ms"] = None
+        else:
+            stats["mean_ms"] = float(sums[i]) / count / 1000
+            stats.update({f"p{p}_ms": percentiles[p][i] / 1000 for p in PERCENTILES})
+            stats["max_ms"] = maxes[i] / 1000
+        row_stats.append(stats)
+
+    return row_stats
@@ -1,7 +1,14 @@
 from datetime import datetime, timedelta
+import numpy as np
+
+# Columns stored by the aggregator, every value a Period exposes through get_value
+SOURCES = ["open", "close", "high", "low", "volume", "hl2", "oc2", "hlc3", "ohlc4", "hlcc4"]
 
 
 class Period:
+    __slots__ = ("timeframe", "start_time", "end_time", "open", "close", "high", "low", "volume",
+                 "hl2", "oc2", "hlc3", "ohlc4", "hlcc4")
+
     def __init__(self, timeframe, start_time, end_time, open, close, high, low, volume):
         self.timeframe = timeframe
         self.start_time = start_time
@@ -29,10 +36,23 @@ class Period:
 
 
 class PeriodAggregator:
-    def __init__(self, timeframe):
+    def __init__(self, timeframe, initial_capacity=1024):
         self.timeframe = timeframe
-        self.periods = []
         self.cur_period = None
+        self.last_period = None
+        self.size = 0
+        self.capacity = initial_capacity
+        # Number of latest periods kept, None keeps everything. num_periods still counts the dropped ones
+        self.max_periods = None
+        self.num_dropped = 0
+
+        # Closed periods are stored column-wise so analyzers can read trailing windows as views
+        # {
+        #   source: np.array(capacity)
+        # }
+        self.columns = {s: np.empty(self.capacity) for s in SOURCES}
+        self.start_times = np.empty(self.capacity, dtype="datetime64[us]")
+        self.end_times = np.empty(self.capacity, dtype="datetime64[us]")
 
     def parse_timestamp(self, quote):
         try:
@@ -48,54 +68,173 @@ class PeriodAggregator:
             print(quote.t)
             raise e
 
-    def initialize_period(self, quote, parsed_ts):
+    def initialize_period(self, parsed_ts, price, low, high, volume):
         return Period(
                 self.timeframe,
                 parsed_ts,
                 parsed_ts + timedelta(seconds=self.timeframe),
-                quote.bp,  # TODO current aggregated data sets don't support opens
-                quote.bp,
-                quote.max_bp if hasattr(quote, "max_bp") else quote.bp,
-                quote.min_bp if hasattr(quote, "min_bp") else quote.bp,
-                quote.bs
+                price,  # TODO current aggregated data sets don't support opens
+                price,
+                high,
+                low,
+                volume
             )
 
-    def update_cur_period(self, quote):
-        self.cur_period.close = quote.bp
-
-        low_val = quote.min_bp if hasattr(quote, "min_bp") else quote.bp
-        self.cur_period.low = min(self.cur_period.low, low_val)
-
-        high_val = quote.max_bp if hasattr(quote, "max_bp") else quote.bp
-        self.cur_period.high = max(self.cur_period.high, high_val)
+    def update_cur_period(self, price, low, high, volume):
+        self.cur_period.close = price
+        self.cur_period.low = min(self.cur_period.low, low)
+        self.cur_period.high = max(self.cur_period.high, high)
+        self.cur_period.volume += volume
+
+    def grow(self):
+        self.capacity *= 2
+        for source, column in self.columns.items():
+            self.columns[source] = np.resize(column, self.capacity)
+        self.start_times = np.resize(self.start_times, self.capacity)
+        self.end_times = np.resize(self.end_times, self.capacity)
+
+    # Keeps only the latest num_periods periods, consumers call this with the longest trailing window they read.
+    # The retention only ever grows, so an aggregator can be shared between consumers
+    def retain(self, num_periods):
+        self.max_periods = max(num_periods, self.max_periods or 0)
+
+    # Moves the retained periods to the front of the columns. The buffer is kept at least twice the retention,
+    # so this copies max_periods rows once every max_periods appends and trailing windows stay contiguous views
+    def drop_old_periods(self):
+        start = self.size - self.max_periods
+        for column in self.columns.values():
+            column[:self.max_periods] = column[start:self.size]
+        self.start_times[:self.max_periods] = self.start_times[start:self.size]
+        self.end_times[:self.max_periods] = self.end_times[start:self.size]
+        self.num_dropped += start
+        self.size = self.max_periods
+
+    def append_period(self, period):
+        if self.size == self.capacity:
+            if self.max_periods is not None and self.capacity >= 2 * self.max_periods:
+                self.drop_old_periods()
+            else:
+                self.grow()
 
-        self.cur_period.volume += quote.bs
+        for source, column in self.columns.items():
+            column[self.size] = period.get_value(source)
+        self.start_times[self.size] = period.start_time
+        self.end_times[self.size] = period.end_time
+        self.size += 1
+        self.last_period = period
 
     def process_quote(self, quote):
         # dt = self.parse_timestamp(quote)
-        dt = quote.t
+        return self.process_values(quote.t, *quote_values(quote))
 
+    # process_quote with the quote's fields already pulled out
+    def process_values(self, dt, price, low, high, volume):
         if self.cur_period is None:
-            self.cur_period = self.initialize_period(quote, dt)
+            self.cur_period = self.initialize_period(dt, price, low, high, volume)
         elif dt > self.cur_period.end_time:
             self.cur_period.close_period()
-            self.periods.append(self.cur_period)
-            self.cur_period = self.initialize_period(quote, dt)
+            self.append_period(self.cur_period)
+            self.cur_period = self.initialize_period(dt, price, low, high, volume)
             return True
         else:
-            self.update_cur_period(quote)
+            self.update_cur_period(price, low, high, volume)
 
         return False
 
     def process_period(self, period):
         period.close_period()
-        self.periods.append(period)
+        self.append_period(period)
 
     def num_periods(self):
-        return len(self.periods)
+        return self.num_dropped + self.size
 
     def get_last_value(self, source):
-        return self.periods[-1].get_value(source)
+        return self.columns[source][self.size - 1]
 
+    # Returns a view into the column, only valid until the next period is appended
     def get_last_values(self, source, num_values):
-        return [p.get_value(source) for p in self.periods[-num_values:]]
+        return self.columns[source][max(self.size - num_values, 0):self.size]
+
+    def get_last_close(self):
+        return self.get_last_value("close")
+
+    def get_last_closes(self, num_values):
+        return self.get_last_values("close", num_values)
+
+    def get_columns(self):
+        return {source: column[:self.size] for source, column in self.columns.items()}
+
+    def get_periods(self):
+        starts = self.start_times[:self.size].astype(datetime)
+        ends = self.end_times[:self.size].astype(datetime)
+        opens, closes, highs, lows, volumes = [self.columns[s][:self.size].tolist() for s in SOURCES[:5]]
+        for i in range(self.size):
+            period = Period(self.timeframe, starts[i], ends[i], opens[i], closes[i], highs[i], lows[i], int(volumes[i]))
+            period.close_period()
+            yield period
+
+
+# Feeds quotes into several timeframes at once. Quotes that can't close a period in any timeframe are
+# collected into a single bucket, which is only rolled up into every timeframe's current period when the
+# earliest period end is passed, so most quotes cost one update rather than one per timeframe
+class MultiTimeframeAggregator:
+    def __init__(self, period_aggregators):
+        # {
+        #    window_size: aggregator
+        # }
+        self.period_aggregators = period_aggregators
+        self.bucket = None
+        self.next_end_time = None
+
+    # Returns the window sizes which finished a period on this quote
+    def process_quote(self, quote):
+        dt = quote.t
+        price, low, high, volume = quote_values(quote)
+
+        if self.next_end_time is not None and dt <= self.next_end_time:
+            self.add_to_bucket(price, low, high, volume)
+            return []
+
+        self.flush()
+        finished = [size for size, per_agg in self.period_aggregators.items()
+                    if per_agg.process_values(dt, price, low, high, volume)]
+        self.next_end_time = min(per_agg.cur_period.end_time for per_agg in self.period_aggregators.values())
+        return finished
+
+    def add_to_bucket(self, price, low, high, volume):
+        if self.bucket is None:
+            self.bucket = [price, low, high, volume]
+        else:
+            self.bucket[0] = price
+            self.bucket[1] = min(self.bucket[1], low)
+            self.bucket[2] = max(self.bucket[2], high)
+            self.bucket[3] += volume
+
+    # Brings every timeframe's current period up to date, call before reading cur_period
+    def flush(self):
+        if self.bucket is None:
+            return
+
+        for per_agg in self.period_aggregators.values():
+            per_agg.update_cur_period(*self.bucket)
+        self.bucket = None
+
+
+# A day of periods as the columns get_columns returns, without appending them one at a time. The derived sources
+# are the arithmetic of Period.close_period on whole columns, so the values are the same
+def period_columns(periods):
+    opens, closes, highs, lows, volumes = [np.array([getattr(p, s) for p in periods], dtype=float) for s in SOURCES[:5]]
+    return {
+        "open": opens, "close": closes, "high": highs, "low": lows, "volume": volumes,
+        "hl2": (highs + lows) / 2,
+        "oc2": (opens + closes) / 2,
+        "hlc3": (highs + lows + closes) / 3,
+        "ohlc4": (opens + highs + lows + closes) / 4,
+        "hlcc4": (highs + lows + closes + closes) / 4
+    }
+
+
+def quote_values(quote):
+    low = quote.min_bp if hasattr(quote, "min_bp") else quote.bp
+    high = quote.max_bp if hasattr(quote, "max_bp") else quote.bp
+    return quote.bp, low, high, quote.bs
@@ -1,4 +1,7 @@
+# Slotted so that the millions of quotes in a day's data set don't each carry a __dict__
 class Quote:
+    __slots__ = ("t", "ap", "as_", "bp", "bs")
+
     def __init__(self, t, ap, as_, bp, bs):
         self.t = t
         self.ap = ap
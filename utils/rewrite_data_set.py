@@ -1,40 +1,12 @@
-from csv import DictReader, DictWriter
-# from run_simulation import Quote
-from datetime import datetime, timedelta
+from contextlib import closing
+from csv import DictWriter
 from tqdm import tqdm
-from utils import parse_timestamp
-from period_aggregator import PeriodAggregator
+from utils.utils import iter_quotes_from_file
+from utils.period_aggregator import PeriodAggregator, MultiTimeframeAggregator
 from pathlib import Path
 
-
-class Quote:
-    def __init__(self, t, ap, as_, bp, bs):
-        self.t = t
-        self.ap = ap
-        self.as_ = as_
-        self.bp = bp
-        self.bs = bs
-        self.min_bp = bp
-        self.max_bp = bp
-        self.min_ap = ap
-        self.max_ap = ap
-        self.num_quotes = 0
-
-
-def get_timestamp(quote):
-    return datetime.strptime(quote.t.split('.')[0].replace('Z', ''), '%Y-%m-%dT%H:%M:%S')
-
-
-def quotes_from_file(filename):
-    out = []
-    with open(filename, newline='') as csvfile:
-        reader = DictReader(csvfile, fieldnames=['t', 'ap', 'as', 'bp', 'bs'])
-        for row in reader:
-            dt = parse_timestamp(row['t'])
-            q = Quote(dt, float(row['ap']), int(row['as']), float(row['bp']), int(row['bs']))
-            out.append(q)
-
-    return out
+# Aggregates the raw quote data sets into period data sets of every size, paths are relative to the repository root
+# python -m utils.rewrite_data_set
 
 
 def write_csv_dict(csv_file_name, fieldnames, dict_rows):
@@ -53,21 +25,22 @@ def rewrite_into_periods(symbol, data_source, dates):
 
     for date in dates:
         # input_file_name = f"data_sets/2021-12/{symbol}/{data_source}/AAPL_{date}T14:30:00_{date}T21:00:00.csv"
-        input_file_name = f"../data_sets/2021-12/{symbol}/{data_source}/AAPL_{date}_with_premarket.csv"
+        input_file_name = f"data_sets/2021-12/{symbol}/{data_source}/AAPL_{date}_with_premarket.csv"
 
-        hist_quotes = quotes_from_file(input_file_name)
         period_aggs = {ps: PeriodAggregator(ps) for ps in period_sizes}
+        multi_timeframe_aggregator = MultiTimeframeAggregator(period_aggs)
+
+        with closing(iter_quotes_from_file(input_file_name)) as hist_quotes:
+            for quote in tqdm(hist_quotes):
+                multi_timeframe_aggregator.process_quote(quote)
 
-        for quote in tqdm(hist_quotes):
-            for per_agg in period_aggs.values():
-                per_agg.process_quote(quote)
+        multi_timeframe_aggregator.flush()
 
         for size, per_agg in period_aggs.items():
-            per_agg.cur_period.close_period()
-            per_agg._periods.append(per_agg.cur_period)
+            per_agg.process_period(per_agg.cur_period)
 
             rows = []
-            for period in per_agg._periods:
+            for period in per_agg.get_periods():
                 rows.append({
                     "timeframe": size,
                     "start_time": format_datetime(period.start_time),
@@ -79,9 +52,9 @@ def rewrite_into_periods(symbol, data_source, dates):
                     "volume": period.volume
                 })
 
-            Path.mkdir(Path.joinpath(Path.cwd(), '..', 'data_sets', '2021-12', symbol, 'periods', str(size)),
+            Path.mkdir(Path.joinpath(Path.cwd(), 'data_sets', '2021-12', symbol, 'periods', str(size)),
                        parents=True, exist_ok=True)
-            file_name = f"../data_sets/2021-12/{symbol}/periods/{str(size)}/{date}_periods_{size}.csv"
+            file_name = f"data_sets/2021-12/{symbol}/periods/{str(size)}/{date}_periods_{size}.csv"
             headers = rows[0].keys()
             write_csv_dict(file_name, headers, rows)
 
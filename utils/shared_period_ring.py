@@ -0,0 +1,239 @@
+import asyncio
+import numpy as np
+from datetime import timedelta
+from time import time_ns
+from multiprocessing import Pipe, shared_memory
+from utils.binary_store import ns_to_datetimes
+from utils.instrumentation import Instrumentation, LISTENER_SPANS, instrumentation_size
+from utils.period_aggregator import Period
+from utils.timestamps import EPOCH
+
+# Single producer, single consumer ring buffer of finished periods in shared memory. The listener process
+# writes fixed width records, the trade manager reads them back, so periods are never pickled or sent
+# through a pipe. Only the producer moves the write index and only the consumer moves the read index,
+# so no lock is needed: a record is written before the write index is published.
+# When the ring is full the period is dropped and counted rather than blocking the stream.
+# A waiting consumer sets a flag in the header and sleeps on a pipe, the producer only writes to the pipe
+# when the flag is set, so periods arriving while the consumer is busy cost no system call. The consumer sets the
+# flag before reading the ring a last time and the producer reads it after publishing the period, so one of the two
+# always sees the other. Python has no memory fences though, so a CPU may still order each read before the write
+# preceding it, both processes then miss the other and the consumer sleeps until WAKE_UP_TIMEOUT.
+# Rings of several listener shards can share one wake up pipe, so their consumer can wait on all of them at once.
+# The latest bid of every symbol is kept after the header, for the brokerage's account cache, and the listener's
+# instrumentation after the records, for the trade manager's metrics
+
+PERIOD_RECORD_DTYPE = np.dtype([
+    ("symbol_id", "<i4"),
+    ("timeframe", "<i4"),
+    ("start_time", "<i8"),
+    ("end_time", "<i8"),
+    ("open", "<f8"),
+    ("close", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("volume", "<i8"),
+    ("received", "<f8"),
+])
+
+# Header of int64 counters, the indexes are on separate cache lines since each is written by a different process
+HEADER_SIZE = 16
+WRITE_INDEX = 0
+DROPPED = 1
+# Quotes seen by the producer, the timestamp of the latest one in ns and how far behind the market it was received
+QUOTES = 2
+WATERMARK = 3
+LAG = 4
+READ_INDEX = 8
+WAITING = 9
+# Watermark at which the consumer wants to be woken, 0 if it doesn't
+WAKE_AT = 10
+
+DEFAULT_CAPACITY = 4096
+# Longest a waiting consumer sleeps before checking the ring again, the accepted worst case delay of a period whose
+# wake up was missed as above. Writing to the pipe whenever a period is put into an empty ring wouldn't avoid it:
+# the consumer publishes its read index after reading the write index, so the producer can still see the ring as
+# not empty while the consumer goes to sleep on it
+WAKE_UP_TIMEOUT = 1.0
+
+
+class SharedPeriodRing:
+    # wake_pipe is a (reader, writer) pair of connections, a new pipe is created if it isn't given
+    def __init__(self, symbols, capacity=DEFAULT_CAPACITY, name=None, wake_pipe=None):
+        self.symbols = list(symbols)
+        self.symbol_ids = {s: i for i, s in enumerate(self.symbols)}
+        self.capacity = capacity
+        records_offset = (HEADER_SIZE + len(self.symbols)) * 8
+        instrumentation_offset = records_offset + capacity * PERIOD_RECORD_DTYPE.itemsize
+        size = instrumentation_offset + instrumentation_size(len(self.symbols), len(LISTENER_SPANS))
+
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=self.shm.buf)
+        self.bids = np.ndarray(len(self.symbols), dtype=np.float64, buffer=self.shm.buf, offset=HEADER_SIZE * 8)
+        self.records = np.ndarray(capacity, dtype=PERIOD_RECORD_DTYPE, buffer=self.shm.buf, offset=records_offset)
+        self.instrumentation = Instrumentation(self.symbols, LISTENER_SPANS, self.shm.buf, instrumentation_offset)
+        if self.owner:
+            self.header[:] = 0
+            self.bids[:] = 0
+            self.instrumentation.counts[:] = 0
+            self.instrumentation.quote_counts[:] = 0
+            self.instrumentation.dropped_counts[:] = 0
+
+        self.owns_pipe = wake_pipe is None
+        self.wake_reader, self.wake_writer = Pipe(duplex=False) if self.owns_pipe else wake_pipe
+
+        # Local to the consumer, cleared by stop_reading to stop get_batch
+        self.reading = True
+
+    # The producer process attaches to the same shared memory, it only needs the writing end of the pipe
+    def __reduce__(self):
+        return SharedPeriodRing, (self.symbols, self.capacity, self.shm.name, (None, self.wake_writer))
+
+    # Producer side, takes a period message from the StreamListener. Returns False if the ring was full
+    def put(self, msg):
+        write_index = int(self.header[WRITE_INDEX])
+        if write_index - int(self.header[READ_INDEX]) >= self.capacity:
+            self.header[DROPPED] += 1
+            return False
+
+        period = msg["period"]
+        self.records[write_index % self.capacity] = (
+            self.symbol_ids[msg["symbol"]],
+            period.timeframe,
+            to_ns(period.start_time),
+            to_ns(period.end_time),
+            period.open,
+            period.close,
+            period.high,
+            period.low,
+            period.volume,
+            msg["received"]
+        )
+        self.header[WRITE_INDEX] = write_index + 1
+
+        if self.header[WAITING]:
+            self.header[WAITING] = 0
+            self.wake_writer.send_bytes(b"")
+        return True
+
+    # Producer side, called after any period the quote closed has been put, so once the consumer sees the
+    # watermark it has every period of this ring that ended before it
+    def record_quote(self, symbol, quote, timestamp):
+        self.bids[self.symbol_ids[symbol]] = quote.bp
+        watermark = to_ns(quote.t)
+        self.header[QUOTES] += 1
+        self.header[WATERMARK] = watermark
+        self.header[LAG] = time_ns() - int(timestamp * 1e9)
+
+        wake_at = self.header[WAKE_AT]
+        if 0 < wake_at <= watermark:
+            self.header[WAKE_AT] = 0
+            self.wake_writer.send_bytes(b"")
+
+    # None until the symbol has had a quote
+    def get_latest_bid(self, symbol):
+        bid = float(self.bids[self.symbol_ids[symbol]])
+        return bid if bid > 0 else None
+
+    def get_watermark(self):
+        return int(self.header[WATERMARK])
+
+    # Consumer side, returns every period message written since the last call
+    def get_all(self):
+        read_index = int(self.header[READ_INDEX])
+        write_index = int(self.header[WRITE_INDEX])
+        if write_index == read_index:
+            return []
+
+        positions = np.arange(read_index, write_index) % self.capacity
+        records = self.records[positions]
+        self.header[READ_INDEX] = write_index
+
+        starts = ns_to_datetimes(records["start_time"])
+        ends = ns_to_datetimes(records["end_time"])
+        messages = []
+        for i, (symbol_id, timeframe, _, _, open, close, high, low, volume, received) in enumerate(records.tolist()):
+            messages.append({
+                "symbol": self.symbols[symbol_id],
+                "period": Period(timeframe, starts[i], ends[i], open, close, high, low, volume),
+                "received": received
+            })
+
+        return messages
+
+    # Waits for periods without blocking the event loop. Once stop_reading is called the batch ends with a None,
+    # the same way a queue reader is stopped
+    async def get_batch(self):
+        while self.reading:
+            messages = self.get_all()
+            if len(messages) > 0:
+                return messages
+
+            # Checked again after setting the flag, in case a period was written just before it was set
+            self.set_waiting(True)
+            messages = self.get_all()
+            if len(messages) > 0:
+                self.set_waiting(False)
+                return messages
+
+            await wait_for_wake_up(self.wake_reader, WAKE_UP_TIMEOUT)
+            self.set_waiting(False)
+
+        return self.get_all() + [None]
+
+    def set_waiting(self, waiting):
+        self.header[WAITING] = int(waiting)
+
+    def set_wake_at(self, watermark):
+        self.header[WAKE_AT] = watermark
+
+    def stop_reading(self):
+        self.reading = False
+        self.wake_writer.send_bytes(b"")
+
+    def get_stats(self):
+        write_index = int(self.header[WRITE_INDEX])
+        read_index = int(self.header[READ_INDEX])
+        return {
+            "written": write_index,
+            "read": read_index,
+            "pending": write_index - read_index,
+            "dropped": int(self.header[DROPPED]),
+            "capacity": self.capacity,
+            "quotes": int(self.header[QUOTES]),
+            "lag_ms": int(self.header[LAG]) / 1e6
+        }
+
+    def close(self):
+        # The arrays are views of the shared memory, which can't be closed while they exist
+        self.header = None
+        self.bids = None
+        self.records = None
+        self.instrumentation = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        if self.owns_pipe:
+            self.wake_reader.close()
+            self.wake_writer.close()
+
+
+# Waits until a producer writes to the pipe or timeout seconds pass, without blocking the event loop
+async def wait_for_wake_up(wake_reader, timeout):
+    loop = asyncio.get_running_loop()
+    woken = loop.create_future()
+    fd = wake_reader.fileno()
+    loop.add_reader(fd, lambda: woken.done() or woken.set_result(None))
+    try:
+        await asyncio.wait_for(woken, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        loop.remove_reader(fd)
+
+    while wake_reader.poll():
+        wake_reader.recv_bytes()
+
+
+def to_ns(dt):
+    return ((dt - EPOCH) // timedelta(microseconds=1)) * 1000
@@ -0,0 +1,64 @@
+import numpy as np
+from datetime import datetime
+
+# Parsers for the fixed Alpaca timestamp layout, e.g. 2021-12-01T14:30:00.123456789Z
+# The fraction can have anywhere from 0 to 9 digits and the Z is optional.
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def is_alpaca_layout(ts):
+    return len(ts) >= 19 and ts[4] == '-' and ts[7] == '-' and ts[10] == 'T' and ts[13] == ':' and ts[16] == ':'
+
+
+def fraction_digits(ts):
+    if len(ts) > 20 and ts[19] == '.':
+        return ts[20:].replace('Z', '')
+    return ''
+
+
+# Generic fallback for anything that isn't in the Alpaca layout
+def parse_timestamp_strptime(ts):
+    try:
+        pieces = ts.split('.')
+        if len(pieces) > 1:
+            pieces[1] = pieces[1][:6].replace('Z', '')
+            dt = datetime.strptime('.'.join(pieces), '%Y-%m-%dT%H:%M:%S.%f')
+        else:
+            dt = datetime.strptime(pieces[0].replace('Z', ''), '%Y-%m-%dT%H:%M:%S')
+
+        return dt
+    except Exception as e:
+        print(ts)
+        raise e
+
+
+# datetime only goes down to microseconds, use parse_timestamp_ns to keep the full precision
+def parse_timestamp(ts):
+    if not is_alpaca_layout(ts):
+        return parse_timestamp_strptime(ts)
+
+    return datetime(
+        int(ts[0:4]),
+        int(ts[5:7]),
+        int(ts[8:10]),
+        int(ts[11:13]),
+        int(ts[14:16]),
+        int(ts[17:19]),
+        int(fraction_digits(ts)[:6].ljust(6, '0'))
+    )
+
+
+# Epoch nanoseconds
+def parse_timestamp_ns(ts):
+    if not is_alpaca_layout(ts):
+        return int(np.datetime64(ts.replace('Z', ''), "ns").astype(np.int64))
+
+    delta = datetime(int(ts[0:4]), int(ts[5:7]), int(ts[8:10]), int(ts[11:13]), int(ts[14:16]), int(ts[17:19])) - EPOCH
+    seconds = (delta.days * 86400) + delta.seconds
+    return (seconds * 1_000_000_000) + int(fraction_digits(ts)[:9].ljust(9, '0'))
+
+
+# Vectorized version for a whole column, returns an int64 array of epoch nanoseconds
+def parse_timestamps_ns(timestamps):
+    return np.array([ts.replace('Z', '') for ts in timestamps], dtype="datetime64[ns]").astype(np.int64)
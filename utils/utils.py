@@ -3,31 +3,167 @@ import os
 from alpaca_trade_api.rest import REST
 from alpaca_trade_api.stream import Stream
 from alpaca_trade_api.common import URL
+import atexit
 import logging
 import sys
-from datetime import datetime
-from queue import Empty
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing.util import Finalize, register_after_fork
+from queue import Empty, SimpleQueue
 from csv import DictReader
+from itertools import islice
 from utils.period_aggregator import Period
 from utils.quote import Quote
+from utils.binary_store import has_binary_file, load_columns, ns_to_datetimes
+from utils.timestamps import parse_timestamp, parse_timestamps_ns
+
+
+# Loggers only put their records on a queue, a listener thread per log file formats them and writes them to
+# stdout and the file, so logging never blocks the caller on I/O. Log with %-style arguments rather than f-strings,
+# the message is then only formatted if the record is written
+# {
+#   log_file_name: QueueHandler shared by the loggers writing to the file
+# }
+log_queue_handlers = {}
+# {
+#   log_file_name: LogListener
+# }
+log_listeners = {}
+# Set once the fork and exit hooks of the listeners are registered, when the first listener is started
+log_hooks_registered = False
+
+
+class DeferredQueueHandler(QueueHandler):
+    # QueueHandler formats the message before queueing it, in case the record is pickled. The queue never leaves
+    # the process, so formatting is left to the listener's thread
+    def prepare(self, record):
+        return record
+
+
+# Formats a record once and writes the line to every stream. The streams are only flushed when asked, the
+# listener does so once it has emptied its queue rather than after every record
+class StreamsHandler(logging.Handler):
+    def __init__(self, streams):
+        super().__init__()
+        self.streams = streams
+
+    def emit(self, record):
+        try:
+            line = self.format(record) + "\n"
+            for stream in self.streams:
+                stream.write(line)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        with self.lock:
+            for stream in self.streams:
+                # A stream may already be closed at exit, like logging.shutdown skip it
+                try:
+                    stream.flush()
+                except ValueError:
+                    pass
+
+
+class LogListener(QueueListener):
+    def dequeue(self, block):
+        try:
+            return self.queue.get(block=False)
+        except Empty:
+            self.flush()
+            return self.queue.get(block)
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    # Writes out everything still queued
+    def stop(self):
+        super().stop()
+        self.flush()
 
 
 def get_logger(name, log_file_name=f"logs/trade_manager.log"):
     log = logging.getLogger(name)
     if len(log.handlers) == 0:
         log.setLevel(logging.DEBUG)
-        formatter = logging.Formatter(fmt="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
-        ch = logging.StreamHandler(sys.stdout)
-        ch.setLevel(logging.DEBUG)
-        ch.setFormatter(formatter)
-        fh = logging.FileHandler(log_file_name, "a")
-        fh.setLevel(logging.DEBUG)
-        fh.setFormatter(formatter)
-        log.addHandler(ch)
-        log.addHandler(fh)
+        log.addHandler(get_log_queue_handler(log_file_name))
     return log
 
 
+def get_log_queue_handler(log_file_name):
+    if log_file_name not in log_queue_handlers:
+        formatter = logging.Formatter(fmt="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+        handler = StreamsHandler([sys.stdout, open(log_file_name, "a")])
+        handler.setFormatter(formatter)
+
+        queue = SimpleQueue()
+        log_queue_handlers[log_file_name] = DeferredQueueHandler(queue)
+        log_listeners[log_file_name] = LogListener(queue, handler)
+        log_listeners[log_file_name].start()
+        register_log_hooks()
+
+    return log_queue_handlers[log_file_name]
+
+
+# The log format only uses the time, level and message, so records can skip looking up the thread and process.
+# These are settings of the logging module for the whole process, so only the entry points opt in
+def reduce_log_record_overhead():
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+
+# Safe to call more than once
+def stop_log_listeners():
+    while len(log_listeners) > 0:
+        _, listener = log_listeners.popitem()
+        listener.stop()
+
+
+# Buffered lines would be written by both processes, so they are written out before forking and the listeners are
+# kept from writing more until the fork is done
+def hold_log_handlers():
+    for listener in log_listeners.values():
+        for handler in listener.handlers:
+            handler.acquire()
+            handler.flush()
+
+
+def release_log_handlers():
+    for listener in log_listeners.values():
+        for handler in listener.handlers:
+            handler.release()
+
+
+# A forked child doesn't get the listener threads, it gets its own, on a new queue so records the parent hadn't
+# written yet aren't written twice. The handlers' locks are reset by logging itself
+def restart_log_listeners():
+    for log_file_name, listener in log_listeners.items():
+        queue = SimpleQueue()
+        log_queue_handlers[log_file_name].queue = queue
+        log_listeners[log_file_name] = LogListener(queue, *listener.handlers)
+        log_listeners[log_file_name].start()
+
+
+# multiprocessing children exit without running atexit, and they clear the finalizers inherited from the parent
+# after the fork hooks have run, so the finalizer is registered from a multiprocessing after fork callback
+def finalize_at_exit(func):
+    Finalize(None, func, exitpriority=0)
+
+
+# Processes that never log don't need the hooks, so importing this module doesn't register them
+def register_log_hooks():
+    global log_hooks_registered
+    if log_hooks_registered:
+        return
+
+    atexit.register(stop_log_listeners)
+    os.register_at_fork(before=hold_log_handlers, after_in_parent=release_log_handlers,
+                        after_in_child=restart_log_listeners)
+    register_after_fork(stop_log_listeners, finalize_at_exit)
+    log_hooks_registered = True
+
+
 def get_credentials(account_type):
     if account_type == PAPER:
         key = os.environ[PAPER_KEY_ENV_VAR]
@@ -55,21 +191,6 @@ def format_datetime(date_time):
     return date_time.strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def parse_timestamp(ts):
-    try:
-        pieces = ts.split('.')
-        if len(pieces) > 1:
-            pieces[1] = pieces[1][:6].replace('Z', '')
-            dt = datetime.strptime('.'.join(pieces), '%Y-%m-%dT%H:%M:%S.%f')
-        else:
-            dt = datetime.strptime(pieces[0].replace('Z', ''), '%Y-%m-%dT%H:%M:%S')
-
-        return dt
-    except Exception as e:
-        print(ts)
-        raise e
-
-
 def get_queue_items(queue):
     while True:
         try:
@@ -79,19 +200,46 @@ def get_queue_items(queue):
             return
 
 
+QUOTE_CHUNK_SIZE = 50_000
+
+
 def quotes_from_file(filename):
-    out = []
+    return list(iter_quotes_from_file(filename))
+
+
+# Lazily reads quotes chunk_size rows at a time, so memory stays bounded by the chunk size rather than the file size.
+# Reading stops as soon as the consumer stops iterating
+def iter_quotes_from_file(filename, chunk_size=QUOTE_CHUNK_SIZE):
+    if has_binary_file(filename):
+        quotes = load_columns(filename)
+        for start in range(0, len(quotes), chunk_size):
+            yield from quotes_from_columns(quotes[start:start + chunk_size])
+        return
+
     with open(filename, newline='') as csvfile:
         reader = DictReader(csvfile, fieldnames=['t', 'ap', 'as', 'bp', 'bs'])
-        for row in reader:
-            dt = parse_timestamp(row['t'])
-            q = Quote(dt, float(row['ap']), int(row['as']), float(row['bp']), int(row['bs']))
-            out.append(q)
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if len(rows) == 0:
+                return
+            yield from quotes_from_rows(rows)
 
-    return out
+
+def quotes_from_rows(rows):
+    # Parsing the whole timestamp column at once is much faster than parsing row by row
+    timestamps = ns_to_datetimes(parse_timestamps_ns([row['t'] for row in rows]))
+    return [Quote(dt, float(row['ap']), int(row['as']), float(row['bp']), int(row['bs'])) for dt, row in zip(timestamps, rows)]
+
+
+def quotes_from_columns(quotes):
+    columns = [ns_to_datetimes(quotes['t'])] + [quotes[f].tolist() for f in ['ap', 'as', 'bp', 'bs']]
+    return [Quote(*row) for row in zip(*columns)]
 
 
 def periods_from_file(filename):
+    if has_binary_file(filename):
+        return periods_from_binary(filename)
+
     out = []
     with open(filename, newline='') as csvfile:
         reader = DictReader(csvfile, fieldnames=['timeframe', 'start_time', 'end_time', 'open', 'close', 'high', 'low', 'volume'])
@@ -111,3 +259,10 @@ def periods_from_file(filename):
             out.append(p)
 
     return out
+
+
+def periods_from_binary(filename):
+    periods = load_columns(filename)
+    columns = [periods['timeframe'].tolist(), ns_to_datetimes(periods['start_time']), ns_to_datetimes(periods['end_time'])] + \
+        [periods[f].tolist() for f in ['open', 'close', 'high', 'low', 'volume']]
+    return [Period(*row) for row in zip(*columns)]